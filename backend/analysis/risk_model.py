@@ -1,100 +1,208 @@
-import json
-import os
-import logging
 import numpy as np
-from shapely.geometry import shape
+import shapely
+from utils.restricted_layers import registry as restricted_registry, DEFAULT_LAYER, DEFAULT_LAYER_PATH
+from utils.projection import WGS84, transform_geometries, utm_epsg
+from utils.geometry import feature_geometries
+from utils.logging import log_error, log_info
+from utils.metrics import span, traced
 
-# Configure logging to match main.py and file_parser.py
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s %(levelname)s %(message)s',
-    handlers=[
-        logging.StreamHandler(),
-        logging.FileHandler('app.log')
-    ]
-)
+# Risk model weights: distance_risk = DISTANCE_WEIGHT * exp(-d / DISTANCE_SCALE),
+# slope_risk = SLOPE_WEIGHT * slope, combined score capped at MAX_RISK.
+# Distances are in metres; the scale is 0.01 degrees at the equator, the value
+# used when distances were measured in raw degrees.
+DISTANCE_WEIGHT = 100.0
+DISTANCE_SCALE = 1113.2
+SLOPE_WEIGHT = 10.0
+MAX_RISK = 100.0
+# Part of every stored result's key: bump it whenever a change to the scoring
+# code changes the scores, so results computed by the old code are not served.
+MODEL_VERSION = 2
 
-def log_error(message, extra=None):
-    logging.error(json.dumps({"error": message, **(extra or {})}))
+# Beyond this distance the exponential term is below 1e-12 and cannot change a
+# score rounded to two decimals, so the nearest-neighbour search stops there.
+DISTANCE_CUTOFF = DISTANCE_SCALE * np.log(DISTANCE_WEIGHT / 1e-12)
 
-def log_info(message, extra=None):
-    logging.info(json.dumps({"message": message, **(extra or {})}))
+def nearest_distances(geoms, tree, cutoff=DISTANCE_CUTOFF):
+    """
+    Distance from each geometry to its nearest indexed geometry.
+
+    Candidate pairs come from a single STRtree query with envelopes grown by
+    ``cutoff``. Pairs whose bounding boxes are further apart than ``cutoff``,
+    or than the farthest corners of another candidate, cannot be nearest and
+    are dropped. Exact distances are then measured in two vectorized passes:
+    first to each geometry's candidate with the closest bounding box, then
+    only to the candidates whose bounding-box distance is below that result,
+    which is usually a small fraction of them. Geometries with nothing within
+    ``cutoff`` (and missing geometries) get ``inf``.
+    """
+    distances = np.full(len(geoms), np.inf)
+    valid = np.flatnonzero(~shapely.is_missing(geoms) & ~shapely.is_empty(geoms))
+    if valid.size == 0 or len(tree) == 0:
+        return distances
+    bounds = shapely.bounds(geoms[valid])
+    envelopes = shapely.box(bounds[:, 0] - cutoff, bounds[:, 1] - cutoff,
+                            bounds[:, 2] + cutoff, bounds[:, 3] + cutoff)
+    input_idx, tree_idx = tree.query(envelopes)
+
+    # Bounding-box distance bounds per pair, squared to skip the square roots
+    tree_bounds = shapely.bounds(tree.geometries)
+    ax0, ay0, ax1, ay1 = (bounds[:, k][input_idx] for k in range(4))
+    bx0, by0, bx1, by1 = (tree_bounds[:, k][tree_idx] for k in range(4))
+    lower = (np.maximum(np.maximum(bx0 - ax1, ax0 - bx1), 0) ** 2
+             + np.maximum(np.maximum(by0 - ay1, ay0 - by1), 0) ** 2)
+    upper = np.maximum(bx1 - ax0, ax1 - bx0) ** 2 + np.maximum(by1 - ay0, ay1 - by0) ** 2
+    best_upper = np.full(len(valid), np.inf)
+    np.minimum.at(best_upper, input_idx, upper)
+    keep = (lower <= best_upper[input_idx]) & (lower <= cutoff ** 2)
+    input_idx, tree_idx, lower = input_idx[keep], tree_idx[keep], lower[keep]
+
+    # Candidates of each geometry, closest bounding box first
+    order = np.lexsort((lower, input_idx))
+    input_idx, tree_idx, lower = input_idx[order], tree_idx[order], lower[order]
+    first = np.ones(len(input_idx), dtype=bool)
+    first[1:] = input_idx[1:] != input_idx[:-1]
+    best = np.full(len(valid), np.inf)
+    best[input_idx[first]] = shapely.distance(geoms[valid[input_idx[first]]], tree.geometries[tree_idx[first]])
+    rest = ~first & (lower < best[input_idx] ** 2)
+    np.minimum.at(best, input_idx[rest],
+                  shapely.distance(geoms[valid[input_idx[rest]]], tree.geometries[tree_idx[rest]]))
+    distances[valid] = np.where(best > cutoff, np.inf, best)
+    return distances
+
+def feature_slopes(features):
+    """Read the ``slope`` property of each feature, defaulting to 0.0."""
+    slopes = np.zeros(len(features))
+    invalid = []
+    for i, feature in enumerate(features):
+        properties = feature.get("properties") or {}
+        slope = properties.get("slope", 0.0)
+        if not isinstance(slope, (int, float)):
+            invalid.append(properties.get("name", "Unnamed"))
+            slope = 0.0
+        slopes[i] = slope
+    if invalid:
+        log_error("Invalid slope value", {"count": len(invalid), "feature_names": invalid[:10]})
+    return slopes
+
+def combine_risk(distances, slopes):
+    """Combine distance and slope terms into capped scores rounded to 2 decimals."""
+    with np.errstate(over='ignore'):
+        distance_risk = np.where(np.isfinite(distances), DISTANCE_WEIGHT * np.exp(-distances / DISTANCE_SCALE), 0.0)
+    raw = distance_risk + SLOPE_WEIGHT * slopes
+    # Python's round() keeps results identical to the per-feature implementation
+    return [min(round(float(v), 2), MAX_RISK) for v in raw]
+
+def projected_distances(geoms, layer):
+    """
+    Metric distance from each WGS84 geometry to the nearest restricted area.
+
+    Geometries are grouped by the UTM zone of their bounding-box centre and
+    each group is projected in one batch and measured against the layer's
+    geometries pre-projected to the same zone.
+    """
+    distances = np.full(len(geoms), np.inf)
+    valid = np.flatnonzero(~shapely.is_missing(geoms) & ~shapely.is_empty(geoms))
+    if valid.size == 0:
+        return distances
+    bounds = shapely.bounds(geoms[valid])
+    zones = utm_epsg((bounds[:, 0] + bounds[:, 2]) / 2, (bounds[:, 1] + bounds[:, 3]) / 2)
+    for epsg in np.unique(zones):
+        idx = valid[zones == epsg]
+        projected = transform_geometries(geoms[idx], WGS84, f'EPSG:{epsg}')
+        distances[idx] = nearest_distances(projected, layer.projected_tree(int(epsg)))
+    return distances
+
+def score_features(features, layer):
+    """
+    Score a list of GeoJSON features against a RestrictedLayer.
+
+    Returns:
+        tuple: (scores, distances, slopes), one entry per feature. Distances
+        are in metres (inf beyond DISTANCE_CUTOFF). Features with an unusable
+        geometry score 0.0.
+    """
+    with span('risk.geometries'):
+        geoms = feature_geometries(features)
+    with span('risk.distances'):
+        distances = projected_distances(geoms, layer)
+    slopes = feature_slopes(features)
+    scores = combine_risk(distances, slopes)
+    for i in np.flatnonzero(shapely.is_missing(geoms)):
+        scores[i] = 0.0
+    return scores, distances, slopes
 
-def evaluate_risk(data, restricted_path="data/restricted_area.geojson"):
+def score_chunks(features, layer=DEFAULT_LAYER, chunk_size=5000):
+    """
+    Score an iterable of GeoJSON features in fixed-size chunks.
+
+    Only one chunk is held in memory at a time, so ``features`` can be a
+    generator over an arbitrarily large input.
+
+    Yields:
+        tuple: (features, scores, distances, slopes) for each chunk
+    """
+    restricted = restricted_registry.get(layer)
+    chunk = []
+    for feature in features:
+        chunk.append(feature)
+        if len(chunk) >= chunk_size:
+            yield (chunk, *score_features(chunk, restricted))
+            chunk = []
+    if chunk:
+        yield (chunk, *score_features(chunk, restricted))
+
+def model_params():
+    """Parameters that determine a risk score; results are cached under these."""
+    return {
+        "distance_weight": DISTANCE_WEIGHT,
+        "distance_scale": DISTANCE_SCALE,
+        "slope_weight": SLOPE_WEIGHT,
+        "max_risk": MAX_RISK,
+        "distance_unit": "m"
+    }
+
+@traced('risk.score')
+def risk_scores(data, restricted):
+    """
+    Risk scores for a GeoJSON FeatureCollection against a RestrictedLayer.
+
+    Unlike evaluate_risk, errors are raised rather than turned into zero scores.
+    """
+    if not isinstance(data, dict) or data.get("type") != "FeatureCollection":
+        log_error("Invalid input data", {"type": type(data).__name__})
+        raise ValueError("Input must be a GeoJSON FeatureCollection")
+
+    features = data.get("features", [])
+    scores, distances, _ = score_features(features, restricted)
+
+    if not scores:
+        log_info("No valid features processed", {"feature_count": len(features)})
+    else:
+        near = distances[np.isfinite(distances)]
+        log_info("Calculated risk", {
+            "feature_count": len(scores),
+            "max_risk": max(scores),
+            "mean_risk": round(sum(scores) / len(scores), 2),
+            "min_distance_m": round(float(near.min()), 1) if near.size else None
+        })
+    return scores
+
+def evaluate_risk(data, restricted_path=DEFAULT_LAYER_PATH, layer=None):
     """
     Evaluate risk for each feature in the input GeoJSON data based on proximity
     to restricted areas and terrain slope.
-    
+
     Args:
         data (dict): GeoJSON FeatureCollection
         restricted_path (str): Path to restricted area GeoJSON file
-    
+        layer (str): Name of a registered restricted layer; overrides restricted_path
+
     Returns:
         list: Risk scores for each feature (0-100)
     """
     try:
-        # Validate input data
-        if not isinstance(data, dict) or data.get("type") != "FeatureCollection":
-            log_error("Invalid input data", {"type": type(data).__name__})
-            raise ValueError("Input must be a GeoJSON FeatureCollection")
-
-        # Load restricted areas
-        if not os.path.exists(restricted_path):
-            log_error("Restricted area file not found", {"path": restricted_path})
-            raise FileNotFoundError(f"Restricted area file not found: {restricted_path}")
-        
-        with open(restricted_path, 'r', encoding='utf-8') as f:
-            restricted = json.load(f)
-        if restricted.get("type") != "FeatureCollection":
-            log_error("Invalid restricted area GeoJSON", {"path": restricted_path})
-            raise ValueError("Restricted area must be a GeoJSON FeatureCollection")
-        
-        restricted_shapes = []
-        for feature in restricted.get("features", []):
-            try:
-                restricted_shapes.append(shape(feature["geometry"]))
-            except Exception as e:
-                log_error("Invalid geometry in restricted area", {"path": restricted_path, "error": str(e)})
-                continue
-        
-        if not restricted_shapes:
-            log_error("No valid geometries in restricted area", {"path": restricted_path})
-            raise ValueError("No valid geometries found in restricted area")
-
-        scores = []
-        for feature in data.get("features", []):
-            try:
-                geom = shape(feature["geometry"])
-                # Calculate minimum distance to restricted areas
-                min_distance = min(geom.distance(r) for r in restricted_shapes) if restricted_shapes else float('inf')
-                # Risk based on proximity (higher risk if closer)
-                distance_risk = 100 * np.exp(-min_distance / 0.01) if min_distance != float('inf') else 0.0
-                # Incorporate slope (default to 0.0 if missing)
-                slope = feature.get("properties", {}).get("slope", 0.0)
-                if not isinstance(slope, (int, float)):
-                    log_error("Invalid slope value", {"feature_name": feature.get("properties", {}).get("name", "Unnamed"), "slope": slope})
-                    slope = 0.0
-                slope_risk = 10 * slope  # Adjust weight as needed
-                # Combine risks and cap at 100
-                risk = min(round(distance_risk + slope_risk, 2), 100.0)
-                scores.append(risk)
-                log_info("Calculated risk", {
-                    "feature_name": feature.get("properties", {}).get("name", "Unnamed"),
-                    "distance": round(min_distance, 4),
-                    "slope": slope,
-                    "risk": risk
-                })
-            except Exception as e:
-                log_error("Error processing feature", {
-                    "feature_name": feature.get("properties", {}).get("name", "Unnamed"),
-                    "error": str(e)
-                })
-                scores.append(0.0)
-        
-        if not scores:
-            log_info("No valid features processed", {"feature_count": len(data.get("features", []))})
-        return scores
-
+        restricted = restricted_registry.get(layer) if layer else restricted_registry.get_path(restricted_path)
+        return risk_scores(data, restricted)
     except Exception as e:
         log_error("Error in evaluate_risk", {"error": str(e)})
-        return [0.0] * len(data.get("features", []))
\ No newline at end of file
+        return [0.0] * len(data.get("features", []))
@@ -0,0 +1,220 @@
+import io
+import math
+import os
+from functools import lru_cache
+import numpy as np
+import shapely
+from analysis.risk_model import DISTANCE_WEIGHT, DISTANCE_SCALE, SLOPE_WEIGHT, MAX_RISK
+from utils.analysis import slope_degrees
+from utils.artifacts import atomic_path
+from utils.geometry import feature_geometries
+from utils.lazy import lazy_import, pyplot as plt
+from utils.restricted_layers import registry as restricted_registry, DEFAULT_LAYER
+from utils.logging import log_info
+from utils.metrics import traced
+from utils.projection import WGS84, get_transformer, transform_geometries
+
+rasterio = lazy_import('rasterio')
+rasterio_features = lazy_import('rasterio.features')
+rasterio_transform = lazy_import('rasterio.transform')
+rasterio_warp = lazy_import('rasterio.warp')
+rasterio_windows = lazy_import('rasterio.windows')
+ndimage = lazy_import('scipy.ndimage')
+
+SURFACE_NODATA = -9999.0
+TILE_SIZE = 256
+METERS_PER_DEGREE = 111320.0
+
+# Restricted cells further than this no longer move a cell's risk by more than
+# half the 0.01 display precision, so each processing tile only needs to see
+# restricted areas within this halo.
+SURFACE_CUTOFF = DISTANCE_SCALE * math.log(DISTANCE_WEIGHT / 0.005)
+# Halo limit in distance-grid cells. On DEMs finer than SURFACE_CUTOFF / MAX_HALO
+# (about 11 m) distances are computed on a grid coarsened by a whole factor and
+# expanded back, which keeps each block's transform to a few million cells at
+# an error below one coarse cell.
+MAX_HALO = 1024
+
+WEB_MERCATOR_EXTENT = 20037508.342789244
+
+
+@traced('risk.surface')
+def build_risk_surface(dem_path, out_path, layer=DEFAULT_LAYER, block_size=1024):
+    """
+    Write a continuous risk raster on the grid of ``dem_path``.
+
+    The DEM is processed in ``block_size`` blocks. For each block the restricted
+    areas within SURFACE_CUTOFF are rasterized onto a haloed grid and a
+    Euclidean distance transform gives the metric distance to the nearest
+    restricted cell (for geographic DEMs, pixel sizes are converted to metres
+    at the block's latitude; on fine DEMs the grid is coarsened, see MAX_HALO);
+    slope comes from the DEM block read with a one-pixel border, with the same
+    metric pixel sizes so elevation and spacing share a unit. Both are
+    combined with the risk model's weighting.
+
+    Returns:
+        str: Path of the written GeoTIFF
+    """
+    restricted = restricted_registry.get(layer)
+    with rasterio.open(dem_path) as src:
+        geometries = _restricted_in_crs(restricted.geometries, src.crs)
+        tree = shapely.STRtree(geometries)
+        nodata = src.nodata
+        max_step = 1
+
+        profile = src.profile.copy()
+        profile.update({
+            "driver": "GTiff",
+            "count": 1,
+            "dtype": "float32",
+            "nodata": SURFACE_NODATA,
+            "compress": "lzw",
+            "tiled": True,
+            "blockxsize": TILE_SIZE,
+            "blockysize": TILE_SIZE,
+            "BIGTIFF": "IF_SAFER"
+        })
+        with atomic_path(out_path) as tmp_path, rasterio.open(tmp_path, 'w', **profile) as dst:
+            for row_off in range(0, src.height, block_size):
+                for col_off in range(0, src.width, block_size):
+                    core = rasterio_windows.Window(col_off, row_off,
+                                                   min(block_size, src.width - col_off),
+                                                   min(block_size, src.height - row_off))
+                    pixel_x, pixel_y = _pixel_size(src, core)
+                    slope, invalid = _block_slope(src, core, nodata, pixel_x, pixel_y)
+                    step = _distance_step(pixel_x, pixel_y)
+                    max_step = max(max_step, step)
+                    distance = _block_distance(src, core, step, tree, geometries, pixel_x, pixel_y)
+                    risk = _combine_surface(distance, slope)
+                    risk[invalid] = SURFACE_NODATA
+                    dst.write(risk, 1, window=core)
+
+    log_info("Risk surface generated", {"dem_path": dem_path, "output_path": out_path, "layer": layer,
+                                         "distance_step": max_step})
+    return out_path
+
+def sample_risk_surface(surface_path, data):
+    """
+    Read per-feature risk scores from a risk surface.
+
+    Each feature is sampled at a point on its surface. Features that fall
+    outside the raster or on nodata cells score 0.0.
+    """
+    features = data.get("features", [])
+    geoms = feature_geometries(features)
+    scores = [0.0] * len(features)
+    valid = np.flatnonzero(~shapely.is_missing(geoms) & ~shapely.is_empty(geoms))
+    if valid.size == 0:
+        return scores
+    with rasterio.open(surface_path) as src:
+        points = shapely.point_on_surface(geoms[valid])
+        xs, ys = shapely.get_x(points), shapely.get_y(points)
+        if src.crs and not src.crs.is_geographic:
+            xs, ys = get_transformer(WGS84, src.crs.to_string()).transform(xs, ys)
+        for i, value in zip(valid, src.sample(zip(xs, ys), indexes=1, masked=True)):
+            if value.mask.any():
+                continue
+            scores[i] = round(float(value[0]), 2)
+    return scores
+
+def render_risk_tile(surface_path, z, x, y):
+    """Render the risk surface as a 256x256 Web Mercator PNG map tile."""
+    stat = os.stat(surface_path)
+    return _render_risk_tile(surface_path, stat.st_mtime_ns, z, x, y)
+
+@lru_cache(maxsize=512)
+def _render_risk_tile(surface_path, mtime_ns, z, x, y):
+    size = WEB_MERCATOR_EXTENT * 2 / (2 ** z)
+    left = -WEB_MERCATOR_EXTENT + x * size
+    top = WEB_MERCATOR_EXTENT - y * size
+    tile = np.full((TILE_SIZE, TILE_SIZE), SURFACE_NODATA, dtype='float32')
+    with rasterio.open(surface_path) as src:
+        rasterio_warp.reproject(
+            source=rasterio.band(src, 1),
+            destination=tile,
+            src_nodata=SURFACE_NODATA,
+            dst_transform=rasterio_transform.from_bounds(left, top - size, left + size, top, TILE_SIZE, TILE_SIZE),
+            dst_crs='EPSG:3857',
+            dst_nodata=SURFACE_NODATA,
+            resampling=rasterio_warp.Resampling.bilinear
+        )
+    colored = plt.get_cmap('RdYlGn_r')(np.clip(tile, 0, MAX_RISK) / MAX_RISK)
+    colored[..., 3] = np.where(tile == SURFACE_NODATA, 0.0, 0.7)
+    buffer = io.BytesIO()
+    plt.imsave(buffer, colored, format='png')
+    return buffer.getvalue()
+
+def _combine_surface(distance, slope):
+    with np.errstate(over='ignore'):
+        distance_risk = np.where(np.isfinite(distance), DISTANCE_WEIGHT * np.exp(-distance / DISTANCE_SCALE), 0.0)
+    return np.minimum(distance_risk + SLOPE_WEIGHT * slope, MAX_RISK).astype('float32')
+
+def _block_slope(src, core, nodata, pixel_x, pixel_y):
+    """Slope of ``core`` in degrees, computed on the block plus a one-pixel border so edges match a full read."""
+    outer = _expand(core, 1).intersection(rasterio_windows.Window(0, 0, src.width, src.height))
+    elevation = src.read(1, window=outer).astype('float64')
+    slope = slope_degrees(elevation, pixel_x, pixel_y)
+    r0, c0 = core.row_off - outer.row_off, core.col_off - outer.col_off
+    slope = slope[r0:r0 + core.height, c0:c0 + core.width]
+    block = elevation[r0:r0 + core.height, c0:c0 + core.width]
+    invalid = np.isnan(block) | ~np.isfinite(slope)
+    if nodata is not None:
+        invalid |= block == nodata
+    return slope, invalid
+
+def _distance_step(pixel_x, pixel_y):
+    """Whole number of DEM pixels per distance-grid cell that keeps the halo within MAX_HALO cells."""
+    return max(1, math.ceil(SURFACE_CUTOFF / min(pixel_x, pixel_y) / MAX_HALO))
+
+def _block_distance(src, core, step, tree, geometries, pixel_x, pixel_y):
+    """
+    Distance from each ``core`` cell to the nearest restricted cell within SURFACE_CUTOFF.
+
+    The transform runs on a grid of ``step`` x ``step`` DEM pixels aligned with
+    the block, and each grid cell's distance is used for the pixels it covers.
+    """
+    halo = int(math.ceil(SURFACE_CUTOFF / (min(pixel_x, pixel_y) * step)))
+    height, width = -(-core.height // step), -(-core.width // step)
+    transform = (src.window_transform(core) @ rasterio_transform.Affine.scale(step)
+                 @ rasterio_transform.Affine.translation(-halo, -halo))
+    left, top = transform @ (0, 0)
+    right, bottom = transform @ (width + 2 * halo, height + 2 * halo)
+    nearby = tree.query(shapely.box(min(left, right), min(top, bottom), max(left, right), max(top, bottom)))
+    if nearby.size == 0:
+        return np.full((core.height, core.width), np.inf)
+    restricted = rasterio_features.rasterize(
+        ((geom, 1) for geom in geometries[nearby]),
+        out_shape=(height + 2 * halo, width + 2 * halo),
+        transform=transform,
+        fill=0,
+        all_touched=True,
+        dtype='uint8'
+    ).astype(bool)
+    if not restricted.any():
+        return np.full((core.height, core.width), np.inf)
+    distance = ndimage.distance_transform_edt(~restricted, sampling=(pixel_y * step, pixel_x * step))
+    distance = distance[halo:halo + height, halo:halo + width]
+    if step > 1:
+        distance = np.repeat(np.repeat(distance, step, axis=0), step, axis=1)[:core.height, :core.width]
+    return distance
+
+def _expand(window, pixels):
+    return rasterio_windows.Window(window.col_off - pixels, window.row_off - pixels,
+                                   window.width + 2 * pixels, window.height + 2 * pixels)
+
+def _pixel_size(src, window):
+    """Pixel size of ``window`` in metres, the risk model's distance unit."""
+    res_x, res_y = src.res
+    if src.crs is None or src.crs.is_geographic:
+        _, lat = src.window_transform(window) @ (window.width / 2, window.height / 2)
+        # Use the block edge closest to a pole so the halo is never too small
+        lat = min(abs(lat) + window.height * res_y / 2, 89.0)
+        return res_x * METERS_PER_DEGREE * math.cos(math.radians(lat)), res_y * METERS_PER_DEGREE
+    factor = src.crs.linear_units_factor[1]
+    return res_x * factor, res_y * factor
+
+def _restricted_in_crs(geometries, crs):
+    if crs is None or crs.is_geographic:
+        return geometries
+    projected = transform_geometries(geometries, WGS84, crs.to_string())
+    return projected[~shapely.is_missing(projected)]
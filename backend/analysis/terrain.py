@@ -1,11 +1,15 @@
-import rasterio
 import numpy as np
-from rasterio.transform import xy
+from utils.lazy import lazy_import
 
-def calculate_slope(geo_data):
+rasterio = lazy_import('rasterio')
+
+# Example: Load a DEM raster (replace with your DEM file)
+DEM_PATH = "path/to/your/dem.tif"
+# Bump when calculate_slope changes its output; see results_store.result_key
+SLOPE_VERSION = 1
+
+def calculate_slope(geo_data, dem_path=DEM_PATH):
     try:
-        # Example: Load a DEM raster (replace with your DEM file)
-        dem_path = "path/to/your/dem.tif"
         with rasterio.open(dem_path) as dem:
             # Extract coordinates from GeoJSON
             features = geo_data.get("features", [])
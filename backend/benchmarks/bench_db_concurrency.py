@@ -0,0 +1,147 @@
+"""
+Read throughput of the feature store while writes are happening.
+
+Starts reader threads issuing R*Tree bbox queries (as /api/zones does) and
+writer threads storing datasets (as /api/terrain does) against a temporary
+database, then reports reads/s, writes/s and errors. ``--mode naive`` runs
+the same workload with a connect-per-operation, rollback-journal access
+pattern for comparison.
+
+Usage: python benchmarks/bench_db_concurrency.py [--mode pooled|naive] [--seconds 10]
+"""
+import argparse
+import json
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import db, feature_store  # noqa: E402
+
+
+def make_collection(n, rng):
+    features = []
+    for i in range(n):
+        x, y = rng.uniform(70, 80), rng.uniform(20, 30)
+        features.append({
+            "type": "Feature",
+            "properties": {"name": f"f{i}", "slope": rng.uniform(0, 5)},
+            "geometry": {"type": "Polygon", "coordinates": [[[x, y], [x + 0.01, y], [x + 0.01, y + 0.01], [x, y + 0.01], [x, y]]]}
+        })
+    return {"type": "FeatureCollection", "features": features}
+
+def naive_store(path, data):
+    conn = sqlite3.connect(path, timeout=5)
+    try:
+        conn.execute('PRAGMA journal_mode=DELETE')
+        feature_store._insert_dataset(conn, data)
+        conn.commit()
+    finally:
+        conn.close()
+
+BBOX_QUERY = '''SELECT f.geometry, f.properties FROM features_rtree r CROSS JOIN features f ON f.id = r.id
+                WHERE f.dataset_id = ? AND r.min_x <= ? AND r.max_x >= ? AND r.min_y <= ? AND r.max_y >= ?'''
+
+def bbox_query(conn, dataset_id, bbox):
+    return len(conn.execute(BBOX_QUERY, (dataset_id, bbox[2], bbox[0], bbox[3], bbox[1])).fetchall())
+
+def naive_query(path, dataset_id, bbox):
+    conn = sqlite3.connect(path, timeout=5)
+    try:
+        return bbox_query(conn, dataset_id, bbox)
+    finally:
+        conn.close()
+
+def run(mode, seconds, readers, writers, features_per_write, seed_features):
+    rng = random.Random(0)
+    workdir = tempfile.mkdtemp(prefix='bench_db_')
+    db.DB_PATH = os.path.join(workdir, 'bench.db')
+    if mode == 'naive':
+        conn = sqlite3.connect(db.DB_PATH)
+        for statement in feature_store.SCHEMA:
+            conn.execute(statement)
+        conn.commit()
+        conn.close()
+        naive_store(db.DB_PATH, make_collection(seed_features, rng))
+    else:
+        feature_store.init_store()
+        feature_store.store_dataset(make_collection(seed_features, rng))
+    dataset_id = 1
+
+    stop = threading.Event()
+    counts = {"reads": 0, "writes": 0, "read_errors": 0, "write_errors": 0}
+    lock = threading.Lock()
+
+    def reader(seed):
+        local_rng = random.Random(seed)
+        while not stop.is_set():
+            x, y = local_rng.uniform(70, 79), local_rng.uniform(20, 29)
+            bbox = (x, y, x + 1, y + 1)
+            try:
+                if mode == 'naive':
+                    naive_query(db.DB_PATH, dataset_id, bbox)
+                else:
+                    bbox_query(db.get_connection(), dataset_id, bbox)
+                key = "reads"
+            except sqlite3.OperationalError:
+                key = "read_errors"
+            with lock:
+                counts[key] += 1
+
+    def writer(seed):
+        local_rng = random.Random(seed)
+        while not stop.is_set():
+            data = make_collection(features_per_write, local_rng)
+            try:
+                if mode == 'naive':
+                    naive_store(db.DB_PATH, data)
+                else:
+                    feature_store.store_dataset(data)
+                key = "writes"
+            except sqlite3.OperationalError:
+                key = "write_errors"
+            with lock:
+                counts[key] += 1
+
+    threads = [threading.Thread(target=reader, args=(i,)) for i in range(readers)]
+    threads += [threading.Thread(target=writer, args=(1000 + i,)) for i in range(writers)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    time.sleep(seconds)
+    stop.set()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+
+    return {
+        "mode": mode,
+        "seconds": round(elapsed, 2),
+        "readers": readers,
+        "writers": writers,
+        "reads_per_s": round(counts["reads"] / elapsed, 1),
+        "writes_per_s": round(counts["writes"] / elapsed, 1),
+        "read_errors": counts["read_errors"],
+        "write_errors": counts["write_errors"]
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--mode', choices=('pooled', 'naive'), default='pooled')
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--readers', type=int, default=8)
+    parser.add_argument('--writers', type=int, default=4)
+    parser.add_argument('--features-per-write', type=int, default=200)
+    parser.add_argument('--seed-features', type=int, default=50000)
+    args = parser.parse_args()
+    result = run(args.mode, args.seconds, args.readers, args.writers, args.features_per_write, args.seed_features)
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+"""
+GeoJSON serialization time and payload size, before and after utils/geojson_writer.
+
+For the response shapes of /api/zones and /api/export (stored dataset),
+/api/parse (parsed FeatureCollection dict) and /api/visual-preview
+(simplified shapely geometries) it compares the previous encoding
+(``json.dumps`` of full-precision dicts, as ``jsonify`` does) with the
+writer at each ``--precision``, and reports the payload size raw and under
+each available content coding.
+
+Usage: python benchmarks/bench_geojson.py [--features 20000] [--vertices 64] [--precision 6 5]
+"""
+import argparse
+import json
+import math
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import shapely  # noqa: E402
+from shapely.geometry import mapping, shape  # noqa: E402
+from utils import db, exporters, feature_store, geojson_writer  # noqa: E402
+
+
+def make_collection(n, vertices, rng):
+    features = []
+    for i in range(n):
+        x, y, r = rng.uniform(70, 80), rng.uniform(20, 30), rng.uniform(0.001, 0.01)
+        ring = [[x + r * math.cos(2 * math.pi * k / vertices), y + r * math.sin(2 * math.pi * k / vertices)]
+                for k in range(vertices)]
+        features.append({
+            "type": "Feature",
+            "properties": {"name": f"zone {i}", "slope": rng.uniform(0, 45), "class": rng.choice(["a", "b", "c"]),
+                           "notes": "x" * rng.randint(0, 40)},
+            "geometry": {"type": "Polygon", "coordinates": [ring + [ring[0]]]}
+        })
+    return {"type": "FeatureCollection", "features": features}
+
+def timed(fn, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return result, best
+
+def sizes(payload):
+    result = {"raw": len(payload)}
+    for encoding in geojson_writer.available_encodings():
+        result[encoding] = len(geojson_writer.compress(payload, encoding))
+    return result
+
+def report(endpoint, variant, payload, seconds):
+    return {"endpoint": endpoint, "variant": variant, "ms": round(seconds * 1000, 1), "bytes": sizes(payload)}
+
+def run(n, vertices, precisions, repeat):
+    rng = random.Random(0)
+    data = make_collection(n, vertices, rng)
+    db.DB_PATH = os.path.join(tempfile.mkdtemp(prefix='bench_geojson_'), 'bench.db')
+    feature_store.init_store()
+    dataset_id = feature_store.store_dataset(data)
+    results = []
+
+    # /api/zones and /api/export: previously load_feature_collection + jsonify / json.dumps
+    payload, seconds = timed(lambda: json.dumps(feature_store.load_feature_collection(dataset_id)).encode(), repeat)
+    results.append(report('/api/zones', 'before', payload, seconds))
+    for precision in precisions:
+        payload, seconds = timed(lambda: b''.join(exporters.stream_geojson(dataset_id, precision=precision)), repeat)
+        results.append(report('/api/zones', f'precision={precision}', payload, seconds))
+    payload, seconds = timed(lambda: b''.join(exporters.stream_geojson(dataset_id, precision=6, keys=['name'])), repeat)
+    results.append(report('/api/zones', 'precision=6 properties=name', payload, seconds))
+
+    # /api/parse: a parsed FeatureCollection dict
+    payload, seconds = timed(lambda: json.dumps(data).encode(), repeat)
+    results.append(report('/api/parse', 'before', payload, seconds))
+    payload, seconds = timed(lambda: geojson_writer.encode_collection(data), repeat)
+    results.append(report('/api/parse', 'precision=full', payload, seconds))
+    for precision in precisions:
+        payload, seconds = timed(lambda: geojson_writer.encode_collection(data, precision=precision), repeat)
+        results.append(report('/api/parse', f'precision={precision}', payload, seconds))
+
+    # /api/visual-preview: simplified shapely geometries
+    simplified = [shape(f["geometry"]).simplify(0.0001) for f in data["features"]]
+    payload, seconds = timed(lambda: json.dumps({"type": "FeatureCollection", "features": [
+        {"type": "Feature", "geometry": mapping(g), "properties": {}} for g in simplified]}).encode(), repeat)
+    results.append(report('/api/visual-preview', 'before', payload, seconds))
+    geometries = shapely.from_geojson([json.dumps(mapping(g)) for g in simplified])
+    for precision in precisions:
+        payload, seconds = timed(lambda: geojson_writer.collection_start() + b','.join(
+            geojson_writer.encode_features(geometries, [None] * len(geometries), precision=precision)) + b']}', repeat)
+        results.append(report('/api/visual-preview', f'precision={precision}', payload, seconds))
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--features', type=int, default=20000)
+    parser.add_argument('--vertices', type=int, default=64)
+    parser.add_argument('--precision', type=int, nargs='+', default=[6, 5])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+    print(json.dumps(run(args.features, args.vertices, args.precision, args.repeat), indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,177 @@
+"""
+Synthetic, seeded inputs for the benchmarks: multi-tile DEMs and vector layers.
+
+Everything is generated locally from a seed, so runs are reproducible and
+need no network or sample data. DEM tiles are cut from one continuous
+surface (so merged tiles line up) and written as GeoTIFFs; vector layers are
+FeatureCollection dicts that can be written as GeoJSON, KML or a shapefile.
+"""
+import json
+import math
+import os
+import random
+import numpy as np
+import rasterio
+import shapefile
+from rasterio.transform import from_origin
+
+# Projected CRSs are in metres, geographic ones in degrees; origins fall inside the CRS's area of use
+CRS_ORIGINS = {
+    'EPSG:32643': (300000.0, 2500000.0, 30.0),    # UTM 43N, 30 m cells
+    'EPSG:3857': (8300000.0, 2900000.0, 30.0),    # Web Mercator
+    'EPSG:4326': (75.0, 25.0, 0.00025)            # WGS 84, ~30 m cells
+}
+NODATA = -9999.0
+NODATA_PATTERNS = ('none', 'border', 'holes', 'nan')
+GEOMETRY_KINDS = ('polygon', 'line', 'point')
+KML_NS = 'http://www.opengis.net/kml/2.2'
+
+
+def terrain(rows, cols, rng, row_offset=0, col_offset=0, total=None):
+    """
+    Elevation in metres for a window of a smooth synthetic surface.
+
+    The surface is a sum of sine waves with random phases over the whole
+    (rows, cols) ``total`` grid plus a little noise, so neighbouring windows
+    join without seams.
+    """
+    total_rows, total_cols = total or (rows, cols)
+    y = (np.arange(rows) + row_offset)[:, None] / total_rows
+    x = (np.arange(cols) + col_offset)[None, :] / total_cols
+    phases = rng.uniform(0, 2 * math.pi, size=(4, 2))
+    elevation = 800.0 + 50.0 * y
+    for octave, (px, py) in enumerate(phases, start=1):
+        amplitude = 400.0 / octave
+        elevation = elevation + amplitude * np.sin(2 * math.pi * octave * x + px) * np.cos(2 * math.pi * octave * y + py)
+    return elevation + rng.normal(0, 2.0, size=elevation.shape)
+
+def apply_nodata(elevation, pattern, rng):
+    """Mark cells as missing: a border frame, random square holes, or NaN holes."""
+    elevation = elevation.copy()
+    rows, cols = elevation.shape
+    if pattern == 'border':
+        width = max(1, min(rows, cols) // 20)
+        elevation[:width, :] = elevation[-width:, :] = NODATA
+        elevation[:, :width] = elevation[:, -width:] = NODATA
+    elif pattern in ('holes', 'nan'):
+        value = np.nan if pattern == 'nan' else NODATA
+        size = max(2, min(rows, cols) // 16)
+        for _ in range(8):
+            r, c = rng.integers(0, max(1, rows - size)), rng.integers(0, max(1, cols - size))
+            elevation[r:r + size, c:c + size] = value
+    elif pattern != 'none':
+        raise ValueError(f"Unknown nodata pattern: {pattern}")
+    return elevation
+
+def make_dem_tiles(folder, grid=(2, 2), tile_size=512, crs='EPSG:32643', nodata='none', seed=0):
+    """
+    Write a ``grid`` of ``tile_size`` square DEM tiles into ``<folder>/input``.
+
+    That is the layout merge_and_save_dem expects. Returns the tile paths.
+    """
+    rng = np.random.default_rng(seed)
+    west, north, cell = CRS_ORIGINS[crs]
+    tiles_y, tiles_x = grid
+    total = (tiles_y * tile_size, tiles_x * tile_size)
+    input_dir = os.path.join(folder, 'input')
+    os.makedirs(input_dir, exist_ok=True)
+    paths = []
+    for ty in range(tiles_y):
+        for tx in range(tiles_x):
+            elevation = terrain(tile_size, tile_size, np.random.default_rng(seed), ty * tile_size, tx * tile_size, total)
+            elevation = apply_nodata(elevation, nodata, rng).astype('float32')
+            path = os.path.join(input_dir, f'dem_{ty}_{tx}.tif')
+            transform = from_origin(west + tx * tile_size * cell, north - ty * tile_size * cell, cell, cell)
+            with rasterio.open(path, 'w', driver='GTiff', height=tile_size, width=tile_size, count=1,
+                               dtype='float32', crs=crs, transform=transform, nodata=NODATA) as dst:
+                dst.write(elevation, 1)
+            paths.append(path)
+    return paths
+
+def make_layer(features=1000, vertices=32, kind='polygon', bbox=(70.0, 20.0, 80.0, 30.0), size=0.01, seed=0):
+    """
+    FeatureCollection of ``features`` random geometries of ``kind`` inside ``bbox``.
+
+    Polygons are ``vertices``-gons and lines have ``vertices`` points, each
+    spanning about ``size`` degrees; every feature gets a name, a slope and
+    a class property.
+    """
+    if kind not in GEOMETRY_KINDS:
+        raise ValueError(f"Unknown geometry kind: {kind}")
+    rng = random.Random(seed)
+    angles = [2 * math.pi * k / vertices for k in range(vertices)]
+    collection = []
+    for i in range(features):
+        x, y = rng.uniform(bbox[0], bbox[2]), rng.uniform(bbox[1], bbox[3])
+        r = rng.uniform(size / 4, size)
+        if kind == 'polygon':
+            ring = [[x + r * math.cos(a) * rng.uniform(0.8, 1.0), y + r * math.sin(a) * rng.uniform(0.8, 1.0)]
+                    for a in angles]
+            geometry = {"type": "Polygon", "coordinates": [ring + [ring[0]]]}
+        elif kind == 'line':
+            step = 2 * r / max(1, vertices - 1)
+            geometry = {"type": "LineString",
+                        "coordinates": [[x + k * step, y + rng.uniform(-r, r) / 4] for k in range(vertices)]}
+        else:
+            geometry = {"type": "Point", "coordinates": [x, y]}
+        collection.append({
+            "type": "Feature",
+            "properties": {"name": f"feature {i}", "slope": round(rng.uniform(0, 5), 3),
+                           "class": rng.choice(["a", "b", "c"])},
+            "geometry": geometry
+        })
+    return {"type": "FeatureCollection", "features": collection}
+
+def write_geojson(data, path):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f)
+    return path
+
+def write_kml(data, path):
+    """Write Placemarks with ExtendedData, in the subset of KML that file_parser reads."""
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(f'<?xml version="1.0" encoding="UTF-8"?>\n<kml xmlns="{KML_NS}"><Document>\n')
+        for feature in data["features"]:
+            properties = feature["properties"]
+            f.write(f'<Placemark><name>{properties["name"]}</name><ExtendedData>')
+            for key, value in properties.items():
+                if key != "name":
+                    f.write(f'<Data name="{key}"><value>{value}</value></Data>')
+            f.write('</ExtendedData>' + _kml_geometry(feature["geometry"]) + '</Placemark>\n')
+        f.write('</Document></kml>\n')
+    return path
+
+def write_shapefile(data, folder):
+    """Write ``uploaded.shp/.shx/.dbf`` into ``folder``, the names parse_shapefile reads."""
+    os.makedirs(folder, exist_ok=True)
+    kind = data["features"][0]["geometry"]["type"] if data["features"] else "Point"
+    shape_type = {"Polygon": shapefile.POLYGON, "LineString": shapefile.POLYLINE}.get(kind, shapefile.POINT)
+    with shapefile.Writer(os.path.join(folder, 'uploaded'), shapeType=shape_type) as writer:
+        writer.field('name', 'C', size=40)
+        writer.field('slope', 'N', decimal=3)
+        writer.field('class', 'C', size=8)
+        for feature in data["features"]:
+            geometry = feature["geometry"]
+            if geometry["type"] == "Polygon":
+                # Shapefile exteriors run clockwise; the generated rings are counter-clockwise
+                writer.poly([ring[::-1] for ring in geometry["coordinates"]])
+            elif geometry["type"] == "LineString":
+                writer.line([geometry["coordinates"]])
+            else:
+                writer.point(*geometry["coordinates"])
+            properties = feature["properties"]
+            writer.record(properties["name"], properties["slope"], properties["class"])
+    return os.path.join(folder, 'uploaded.shp')
+
+def _kml_geometry(geometry):
+    if geometry["type"] == "Point":
+        x, y = geometry["coordinates"]
+        return f'<Point><coordinates>{x},{y},0</coordinates></Point>'
+    if geometry["type"] == "LineString":
+        return '<LineString><coordinates>' + _kml_coordinates(geometry["coordinates"]) + '</coordinates></LineString>'
+    return ('<Polygon><outerBoundaryIs><LinearRing><coordinates>' + _kml_coordinates(geometry["coordinates"][0])
+            + '</coordinates></LinearRing></outerBoundaryIs></Polygon>')
+
+def _kml_coordinates(coordinates):
+    # One position per line, as file_parser splits coordinates on newlines
+    return '\n'.join(f'{x},{y},0' for x, y in coordinates)
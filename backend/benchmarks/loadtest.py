@@ -0,0 +1,415 @@
+"""
+Latency, throughput and error rates of the HTTP API under concurrent load.
+
+Starts the app in a subprocess with a temporary working directory filled by
+generators.py: DEM tiles under Uploads/input, the restricted layer under
+data/, and GeoJSON and KML files to upload. A setup pass stores one dataset
+and merges the DEM once, so every endpoint has something to serve. Then
+``--concurrency`` client threads replay a weighted ``--mix`` of requests,
+each sending its next request as soon as the previous one returns.
+
+Per endpoint the report gives requests, error rate, throughput and client
+latency percentiles, plus the mean server-side time from /metrics. Per run it
+gives the server's CPU time, peak RSS and pipeline-stage CPU, from /metrics
+before and after. Endpoints that share a route (parse, parse.kml) share the
+server-side figures. ``--isolate`` runs each endpoint of the mix on its own,
+so the CPU and memory figures can be attributed to it. ``--url`` targets a
+server that is already running (e.g. under gunicorn) instead of starting
+one. ``--output`` and ``--compare`` work as in run.py. Server settings such
+as EXECUTOR_LIMITS or PRELOAD are passed through from the environment.
+
+Usage:
+  python benchmarks/loadtest.py --mix mixed --concurrency 16 --requests 500 --output load.json
+  python benchmarks/loadtest.py --mix zones=4,uploads=1 --isolate --compare load.json
+"""
+import argparse
+import itertools
+import json
+import os
+import platform
+import random
+import re
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+import uuid
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND)
+
+import generators  # noqa: E402
+
+# Mix names mapped to the Flask endpoint that labels their series in /metrics
+ENDPOINTS = {
+    'merge-dem': 'merge_dem',
+    'parse': 'parse_file',
+    'parse.kml': 'parse_file',
+    'analyze': 'analyze_risk',
+    'zones': 'get_zones',
+    'uploads': 'serve_uploaded_file'
+}
+MIXES = {
+    'read': {'zones': 4, 'analyze': 4, 'uploads': 2},
+    'write': {'parse': 3, 'parse.kml': 1, 'merge-dem': 1},
+    'mixed': {'zones': 4, 'analyze': 3, 'uploads': 3, 'parse': 2, 'parse.kml': 1, 'merge-dem': 1}
+}
+PROFILES = {
+    # Same shape as run.py's profiles; uploads stay under the server's 10 MB limit
+    'small': {"grid": (2, 2), "tile_size": 256, "features": 1000, "vertices": 16, "restricted": 50},
+    'medium': {"grid": (2, 2), "tile_size": 1024, "features": 5000, "vertices": 32, "restricted": 200}
+}
+PERCENTILES = (50, 90, 99)
+REQUEST_TIMEOUT = 300
+STARTUP_TIMEOUT = 120
+# Latency increases smaller than this are treated as noise
+MIN_DELTA_MS = 5.0
+MAX_ERROR_RATE_INCREASE = 0.01
+# One name="value" pair of a sample's labels in the exposition format
+LABEL = re.compile(r'(\w+)="((?:[^"\\]|\\.)*)"')
+
+
+class Workload:
+    """The files and URLs the requests of a run use, and how to build each request."""
+
+    def __init__(self, workdir, profile, args):
+        layer = generators.make_layer(profile["features"], profile["vertices"], kind=args.kind, seed=args.seed)
+        with open(generators.write_geojson(layer, os.path.join(workdir, 'layer.geojson')), 'rb') as f:
+            self.geojson = f.read()
+        with open(generators.write_kml(layer, os.path.join(workdir, 'layer.kml')), 'rb') as f:
+            self.kml = f.read()
+        self.dem_folder = args.dem_folder
+        self.cold_parse = args.cold_parse
+        self.artifacts = []
+        self._uploads = itertools.count()
+
+    def request(self, name, rng):
+        """(method, path, body, content type) for one request to ``name``."""
+        if name == 'merge-dem':
+            return 'POST', '/merge-dem', json.dumps({"folder_path": self.dem_folder} if self.dem_folder else {}).encode(), 'application/json'
+        if name in ('parse', 'parse.kml'):
+            content, filename = (self.kml, 'layer.kml') if name == 'parse.kml' else (self.geojson, 'layer.geojson')
+            if self.cold_parse:
+                # Unique bytes defeat the server's upload cache, so every request parses
+                n = next(self._uploads)
+                content += f'<!-- {n} -->'.encode() if name == 'parse.kml' else b' ' * (n + 1)
+            body, content_type = multipart('file', filename, content)
+            return 'POST', '/api/parse', body, content_type
+        if name == 'analyze':
+            return 'GET', '/api/analyze', None, None
+        if name == 'zones':
+            return 'GET', '/api/zones', None, None
+        if name == 'uploads':
+            return 'GET', rng.choice(self.artifacts), None, None
+        raise ValueError(f"Unknown endpoint: {name}")
+
+
+def multipart(field, filename, content):
+    boundary = uuid.uuid4().hex
+    head = (f'--{boundary}\r\nContent-Disposition: form-data; name="{field}"; filename="{filename}"\r\n'
+            'Content-Type: application/octet-stream\r\n\r\n').encode()
+    return head + content + f'\r\n--{boundary}--\r\n'.encode(), f'multipart/form-data; boundary={boundary}'
+
+def send(base_url, api_key, method, path, body=None, content_type=None):
+    """(status, seconds, response body) of one request; status 0 when no response arrived."""
+    headers = {'X-API-Key': api_key}
+    if content_type:
+        headers['Content-Type'] = content_type
+    req = urllib.request.Request(base_url + path, data=body, headers=headers, method=method)
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(req, timeout=REQUEST_TIMEOUT) as response:
+            data = response.read()
+            status = response.status
+    except urllib.error.HTTPError as e:
+        data, status = e.read(), e.code
+    except (urllib.error.URLError, OSError):
+        data, status = b'', 0
+    return status, time.perf_counter() - start, data
+
+def scrape(base_url):
+    """Samples of the server's /metrics as {(name, sorted label pairs): value}."""
+    with urllib.request.urlopen(base_url + '/metrics', timeout=REQUEST_TIMEOUT) as response:
+        text = response.read().decode()
+    samples = {}
+    for line in text.splitlines():
+        if not line or line.startswith('#'):
+            continue
+        series, _, value = line.rpartition(' ')
+        name, _, label_text = series.partition('{')
+        samples[(name, tuple(sorted(LABEL.findall(label_text))))] = float(value)
+    return samples
+
+def metric_delta(before, after, name, **labels):
+    """Increase of the samples of ``name`` whose labels include ``labels``, summed."""
+    total = 0.0
+    for (sample_name, sample_labels), value in after.items():
+        if sample_name == name and all(dict(sample_labels).get(k) == v for k, v in labels.items()):
+            total += value - before.get((sample_name, sample_labels), 0.0)
+    return total
+
+def prepare(base_url, api_key, workload):
+    """Store the layer as the latest dataset and merge the DEM once, keeping the published files' URLs."""
+    body, content_type = multipart('file', 'layer.geojson', workload.geojson)
+    status, _, data = send(base_url, api_key, 'POST', '/api/parse?store=true', body, content_type)
+    if status != 200:
+        raise RuntimeError(f"Storing the dataset failed with {status}: {data[:200]!r}")
+    status, _, data = send(base_url, api_key, *workload.request('merge-dem', None))
+    if status != 200:
+        raise RuntimeError(f"Merging the DEM failed with {status}: {data[:200]!r}")
+    result = json.loads(data)
+    workload.artifacts = [result[key] for key in ('preview', 'interactive', 'slope_map') if result.get(key)]
+
+def run_phase(base_url, api_key, workload, mix, args):
+    """Replay ``mix`` at the requested concurrency and summarize it per endpoint."""
+    names, weights = zip(*mix.items())
+    issued = itertools.count()
+    deadline = time.perf_counter() + args.duration if args.duration else None
+
+    def worker(index):
+        rng = random.Random(args.seed * 1000 + index)
+        results = []
+        while (time.perf_counter() < deadline) if deadline else next(issued) < args.requests:
+            name = rng.choices(names, weights)[0]
+            status, seconds, _ = send(base_url, api_key, *workload.request(name, rng))
+            results.append((name, status, seconds))
+        return results
+
+    before = scrape(base_url)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(args.concurrency) as pool:
+        results = list(itertools.chain.from_iterable(pool.map(worker, range(args.concurrency))))
+    elapsed = time.perf_counter() - start
+    after = scrape(base_url)
+    return summarize(results, elapsed, before, after)
+
+def summarize(results, elapsed, before, after):
+    by_endpoint = defaultdict(list)
+    for name, status, seconds in results:
+        by_endpoint[name].append((status, seconds))
+    endpoints = {}
+    for name, rows in sorted(by_endpoint.items()):
+        latencies = sorted(seconds * 1000 for _, seconds in rows)
+        statuses = Counter(status for status, _ in rows)
+        errors = sum(count for status, count in statuses.items() if status == 0 or status >= 400)
+        route = ENDPOINTS[name]
+        served = metric_delta(before, after, 'http_request_duration_seconds_count', endpoint=route)
+        server_seconds = metric_delta(before, after, 'http_request_duration_seconds_sum', endpoint=route)
+        endpoints[name] = {
+            "requests": len(rows),
+            "errors": errors,
+            "error_rate": round(errors / len(rows), 4),
+            "throughput": round(len(rows) / elapsed, 2),
+            **{f"p{q}_ms": round(percentile(latencies, q), 2) for q in PERCENTILES},
+            "max_ms": round(latencies[-1], 2),
+            "mean_ms": round(sum(latencies) / len(latencies), 2),
+            "server_mean_ms": round(server_seconds / served * 1000, 2) if served else None,
+            "statuses": {str(status): count for status, count in sorted(statuses.items())}
+        }
+    stages = {dict(labels)['stage']: round(value - before.get((name, labels), 0.0), 3)
+              for (name, labels), value in after.items() if name == 'pipeline_stage_cpu_seconds_total'}
+    peak = after.get(('process_peak_rss_bytes', ()))
+    return {
+        "seconds": round(elapsed, 3),
+        "requests": len(results),
+        "throughput": round(len(results) / elapsed, 2),
+        "server": {
+            "cpu_seconds": round(metric_delta(before, after, 'process_cpu_seconds_total'), 3),
+            "peak_rss_mb": round(peak / 1024 / 1024, 1) if peak is not None else None,
+            "stage_cpu_seconds": {stage: cpu for stage, cpu in sorted(stages.items()) if cpu}
+        },
+        "endpoints": endpoints
+    }
+
+def percentile(values, q):
+    """Linearly interpolated percentile of sorted ``values``."""
+    position = (len(values) - 1) * q / 100
+    low = int(position)
+    high = min(low + 1, len(values) - 1)
+    return values[low] + (values[high] - values[low]) * (position - low)
+
+def start_server(workdir, profile, args, api_key):
+    """Fill ``workdir`` with synthetic data, start the app there, and return (process, base URL)."""
+    generators.make_dem_tiles(os.path.join(workdir, 'Uploads'), grid=profile["grid"], tile_size=profile["tile_size"],
+                              crs=args.crs, seed=args.seed)
+    os.makedirs(os.path.join(workdir, 'data'))
+    restricted = generators.make_layer(profile["restricted"], 16, size=0.05, seed=args.seed + 1)
+    generators.write_geojson(restricted, os.path.join(workdir, 'data', 'restricted_area.geojson'))
+
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        port = s.getsockname()[1]
+    env = {**os.environ, 'API_KEY': api_key, 'DATABASE_PATH': os.path.join(workdir, 'data.db'),
+           'UPLOAD_FOLDER': os.path.join(workdir, 'Uploads'), 'LOG_FILE': os.path.join(workdir, 'app.log'),
+           'PYTHONPATH': os.pathsep.join(filter(None, [BACKEND, os.environ.get('PYTHONPATH')]))}
+    output = None if args.verbose else open(os.path.join(workdir, 'server.log'), 'wb')
+    process = subprocess.Popen([sys.executable, os.path.abspath(__file__), '--serve', str(port)], cwd=workdir,
+                               env=env, stdout=output, stderr=output)
+    base_url = f'http://127.0.0.1:{port}'
+    started = time.perf_counter()
+    while time.perf_counter() - started < STARTUP_TIMEOUT:
+        if process.poll() is not None:
+            raise RuntimeError(f"Server exited with status {process.returncode}; see {workdir}/server.log")
+        try:
+            scrape(base_url)
+            return process, base_url
+        except OSError:
+            time.sleep(0.2)
+    process.kill()
+    raise RuntimeError("Server did not start in time")
+
+def serve(port):
+    """Run the app on a threaded WSGI server; the parent sets the working directory and environment."""
+    from werkzeug.serving import make_server
+    import main
+    make_server('127.0.0.1', port, main.app, threaded=True).serve_forever()
+
+def parse_mix(value):
+    """A preset name from MIXES or ``endpoint=weight,...``."""
+    if value in MIXES:
+        return MIXES[value]
+    mix = {}
+    for part in value.split(','):
+        name, _, weight = part.partition('=')
+        if name not in ENDPOINTS:
+            raise argparse.ArgumentTypeError(f"unknown endpoint {name!r}; choose from {', '.join(ENDPOINTS)}")
+        mix[name] = float(weight or 1)
+    return mix
+
+def environment(args, mix):
+    return {
+        "profile": args.profile,
+        "parameters": {**PROFILES[args.profile], "mix": mix, "concurrency": args.concurrency,
+                       "requests": args.requests, "duration": args.duration, "isolate": args.isolate,
+                       "cold_parse": args.cold_parse, "crs": args.crs, "kind": args.kind, "seed": args.seed},
+        "target": args.url or "local",
+        "timestamp": time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count()
+    }
+
+def run(args, mix):
+    profile = PROFILES[args.profile]
+    workdir = tempfile.mkdtemp(prefix='bench_load_')
+    process = None
+    try:
+        api_key = args.api_key or (os.getenv('API_KEY') if args.url else uuid.uuid4().hex)
+        if args.url:
+            base_url = args.url.rstrip('/')
+        else:
+            process, base_url = start_server(workdir, profile, args, api_key)
+        workload = Workload(workdir, profile, args)
+        prepare(base_url, api_key, workload)
+        # One unmeasured request per endpoint, so first-use imports and caches are not in the figures
+        rng = random.Random(args.seed)
+        for name in mix:
+            send(base_url, api_key, *workload.request(name, rng))
+
+        phases = {name: {name: mix[name]} for name in mix} if args.isolate else {"mix": mix}
+        results = {}
+        for phase, phase_mix in phases.items():
+            results[phase] = run_phase(base_url, api_key, workload, phase_mix, args)
+            for name, row in results[phase]["endpoints"].items():
+                server = f"{row['server_mean_ms']:>9.1f}" if row['server_mean_ms'] is not None else f"{'-':>9}"
+                print(f"{name:<10} {row['requests']:>6} req {row['error_rate']:>6.1%} err "
+                      f"{row['throughput']:>8.1f}/s  p50 {row['p50_ms']:>9.1f}  p99 {row['p99_ms']:>9.1f}  "
+                      f"server {server} ms", file=sys.stderr)
+            server = results[phase]["server"]
+            print(f"{phase}: {results[phase]['throughput']:.1f} req/s, server CPU {server['cpu_seconds']:.2f} s, "
+                  f"peak RSS {server['peak_rss_mb']} MB", file=sys.stderr)
+    finally:
+        if process is not None:
+            process.terminate()
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        if args.keep:
+            print(f"kept {workdir}", file=sys.stderr)
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+    return {"meta": environment(args, mix), "phases": results}
+
+def compare(current, baseline, threshold):
+    """
+    Rows of (phase, endpoint, metric, baseline, current, ratio, regressed).
+
+    A percentile regresses when it is more than ``threshold`` (a fraction)
+    slower and the difference is above the noise floor; the error rate
+    regresses when it rises by more than MAX_ERROR_RATE_INCREASE.
+    """
+    rows = []
+    for phase, now in current["phases"].items():
+        before = baseline["phases"].get(phase, {}).get("endpoints", {})
+        for name, row in now["endpoints"].items():
+            old_row = before.get(name)
+            if old_row is None:
+                continue
+            for metric in (f"p{q}_ms" for q in (50, 99)):
+                old, new = old_row[metric], row[metric]
+                ratio = new / old if old else None
+                regressed = new - old > MIN_DELTA_MS and (ratio is None or ratio > 1 + threshold)
+                rows.append((phase, name, metric, old, new, ratio, regressed))
+            old, new = old_row["error_rate"], row["error_rate"]
+            rows.append((phase, name, "errors", old, new, None, new - old > MAX_ERROR_RATE_INCREASE))
+    return rows
+
+def main():
+    if len(sys.argv) == 3 and sys.argv[1] == '--serve':
+        return serve(int(sys.argv[2]))
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--mix', type=parse_mix, default='mixed',
+                        help=f"{', '.join(MIXES)} or endpoint=weight,... with endpoints {', '.join(ENDPOINTS)}")
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--requests', type=int, default=200, help="requests per phase")
+    parser.add_argument('--duration', type=float, help="seconds per phase, instead of --requests")
+    parser.add_argument('--isolate', action='store_true', help="run each endpoint of the mix on its own")
+    parser.add_argument('--cold-parse', action='store_true', help="make every upload unique so each one is parsed")
+    parser.add_argument('--profile', choices=sorted(PROFILES), default='small')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--crs', choices=sorted(generators.CRS_ORIGINS), default='EPSG:4326')
+    parser.add_argument('--kind', choices=generators.GEOMETRY_KINDS, default='polygon')
+    parser.add_argument('--url', help="load an already running server instead of starting one")
+    parser.add_argument('--api-key', help="X-API-Key for --url (default: $API_KEY)")
+    parser.add_argument('--dem-folder', help="server-side folder for /merge-dem (default: the server's upload folder)")
+    parser.add_argument('--output', help="write results as JSON to this path (default: stdout)")
+    parser.add_argument('--compare', metavar='BASELINE', help="results JSON to check this run against")
+    parser.add_argument('--threshold', type=float, default=0.25, help="allowed latency growth as a fraction")
+    parser.add_argument('--keep', action='store_true', help="keep the working directory and server log")
+    parser.add_argument('--verbose', action='store_true', help="show the server's logs")
+    args = parser.parse_args()
+    mix = args.mix
+
+    results = run(args, mix)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    elif not args.compare:
+        print(json.dumps(results, indent=2))
+    if not args.compare:
+        return 0
+
+    with open(args.compare) as f:
+        baseline = json.load(f)
+    if baseline["meta"].get("parameters") != results["meta"]["parameters"]:
+        print("warning: baseline was run with different parameters: "
+              f"{baseline['meta'].get('parameters')}", file=sys.stderr)
+    rows = compare(results, baseline, args.threshold)
+    print(f"{'phase':<10} {'endpoint':<10} {'metric':<7} {'baseline':>10} {'current':>10} {'ratio':>7}")
+    for phase, name, metric, old, new, ratio, regressed in rows:
+        print(f"{phase:<10} {name:<10} {metric:<7} {old:>10.4g} {new:>10.4g} "
+              f"{(f'{ratio:.2f}x' if ratio is not None else '-'):>7}{'  REGRESSION' if regressed else ''}")
+    regressions = [row for row in rows if row[6]]
+    print(f"{len(regressions)} regression(s) in {len({row[:2] for row in rows})} compared endpoints")
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
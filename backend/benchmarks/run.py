@@ -0,0 +1,262 @@
+"""
+Time and memory of every pipeline stage on synthetic data, with regression checks.
+
+Stages cover the DEM pipeline (merge, hillshade, static preview, slope map,
+elevation stats, Folium export), layer parsing (GeoJSON, KML, shapefile),
+risk scoring, dataset storage and exports. Inputs come from generators.py for
+a ``--profile`` and ``--seed``, so two runs of the same profile process the
+same bytes. Each stage is timed ``--repeat`` times (the median is reported)
+and run once more under tracemalloc for its peak Python/numpy allocation;
+memory allocated inside GDAL is not seen by tracemalloc.
+
+``--output`` writes the results as JSON. ``--compare baseline.json`` checks a
+run against stored results and exits with status 1 if any stage got slower
+(or used more memory) by more than ``--threshold``.
+
+Usage:
+  python benchmarks/run.py --profile small --output baseline.json
+  python benchmarks/run.py --profile small --compare baseline.json [--stages dem parse]
+"""
+import argparse
+import gc
+import json
+import logging
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np  # noqa: E402
+import rasterio  # noqa: E402
+import shapely  # noqa: E402
+import generators  # noqa: E402
+from analysis.risk_model import nearest_distances, risk_scores  # noqa: E402
+from utils import db, exporters, feature_store  # noqa: E402
+from utils.analysis import generate_slope_map  # noqa: E402
+from utils.file_parser import parse_geojson_sync, parse_shapefile, sync_parse_kml  # noqa: E402
+from utils.merge_and_plot_dem import (export_to_folium, extract_elevation_stats, generate_hillshade,  # noqa: E402
+                                      generate_static_preview, merge_and_save_dem)
+from utils.geometry import feature_geometries  # noqa: E402
+from utils.projection import WGS84, transform_geometries, utm_epsg  # noqa: E402
+from utils.restricted_layers import registry as restricted_registry  # noqa: E402
+
+PROFILES = {
+    # DEM tiles (rows, cols) of tile_size cells; vector layers of `features` shapes with `vertices` each;
+    # `risk_case` adds risk stages for (features, restricted polygons) beyond the other stages' layer
+    'small': {"grid": (2, 2), "tile_size": 256, "features": 1000, "vertices": 16, "restricted": 50},
+    'medium': {"grid": (2, 2), "tile_size": 1024, "features": 10000, "vertices": 32, "restricted": 200},
+    'large': {"grid": (3, 3), "tile_size": 2048, "features": 50000, "vertices": 64, "restricted": 500,
+              "risk_case": (100000, 3000)}
+}
+# Stage slowdowns smaller than this many seconds are treated as noise
+MIN_DELTA_SECONDS = 0.01
+MIN_DELTA_MB = 1.0
+
+
+def build_stages(workdir, profile, args):
+    """Generate the inputs once and return [(stage name, zero-argument callable)]."""
+    stages = []
+    dem_dir = os.path.join(workdir, 'dem')
+    out_dir = os.path.join(workdir, 'out')
+    os.makedirs(out_dir)
+    generators.make_dem_tiles(dem_dir, grid=profile["grid"], tile_size=profile["tile_size"], crs=args.crs,
+                              nodata=args.nodata, seed=args.seed)
+    # Downstream DEM stages read one merged DEM, produced here rather than by the timed merge
+    merged_dir = os.path.join(workdir, 'merged')
+    os.makedirs(merged_dir)
+    merged = merge_and_save_dem(dem_dir, workdir=merged_dir)
+    stages += [
+        ('dem.merge', lambda: merge_and_save_dem(dem_dir, workdir=out_dir)),
+        ('dem.hillshade', lambda: generate_hillshade(merged, out_path=None)),
+        ('dem.static_preview', lambda: generate_static_preview(merged, os.path.join(out_dir, 'preview.png'))),
+        ('dem.slope_map', lambda: generate_slope_map(merged, os.path.join(out_dir, 'slope.png'))),
+        ('dem.stats', lambda: extract_elevation_stats(merged)),
+        ('dem.folium', lambda: export_to_folium(merged, os.path.join(out_dir, 'map.html')))
+    ]
+
+    layer = generators.make_layer(profile["features"], profile["vertices"], kind=args.kind, seed=args.seed)
+    geojson_path = generators.write_geojson(layer, os.path.join(workdir, 'layer.geojson'))
+    kml_path = generators.write_kml(layer, os.path.join(workdir, 'layer.kml'))
+    shapefile_dir = os.path.join(workdir, 'shapefile')
+    generators.write_shapefile(layer, shapefile_dir)
+    stages += [
+        ('parse.geojson', lambda: parse_geojson_sync(geojson_path)),
+        ('parse.kml', lambda: sync_parse_kml(kml_path)),
+        ('parse.shapefile', lambda: parse_shapefile(shapefile_dir))
+    ]
+
+    restricted = generators.make_layer(profile["restricted"], 16, size=0.05, seed=args.seed + 1)
+    restricted_path = generators.write_geojson(restricted, os.path.join(workdir, 'restricted.geojson'))
+    restricted_layer = restricted_registry.get_path(restricted_path)
+    # Projected trees are built on first use and then cached, as in the server; time the steady state
+    risk_scores(layer, restricted_layer)
+    stages.append(('risk.score', lambda: risk_scores(layer, restricted_layer)))
+    if "risk_case" in profile:
+        stages += risk_case_stages(workdir, profile, args)
+
+    db.DB_PATH = os.path.join(workdir, 'bench.db')
+    feature_store.init_store()
+    dataset_id = feature_store.store_dataset(layer)
+    columns = [key for key, _ in feature_store.property_schema(dataset_id)]
+    schema = feature_store.property_schema(dataset_id)
+    stages += [
+        ('store.dataset', lambda: feature_store.store_dataset(layer)),
+        ('export.geojson', lambda: b''.join(exporters.stream_geojson(dataset_id))),
+        ('export.csv', lambda: ''.join(exporters.stream_csv(dataset_id, columns)))
+    ]
+    formats = exporters.export_formats()
+    if 'fgb' in formats:
+        stages.append(('export.fgb', lambda: os.remove(exporters.write_flatgeobuf(dataset_id, schema))))
+    if 'parquet' in formats:
+        stages.append(('export.parquet', lambda: os.remove(exporters.write_geoparquet(dataset_id, schema))))
+    return stages
+
+def risk_case_stages(workdir, profile, args):
+    """
+    Stages for the profile's larger ``risk_case``.
+
+    ``risk.score_case`` is risk_scores end to end: building geometries from
+    GeoJSON, projecting them to UTM and the nearest-distance search.
+    ``risk.nearest_case`` times the search alone on already projected geometries.
+    """
+    features, restricted = profile["risk_case"]
+    layer = generators.make_layer(features, profile["vertices"], kind=args.kind, seed=args.seed)
+    restricted_path = generators.write_geojson(generators.make_layer(restricted, 16, size=0.05, seed=args.seed + 1),
+                                               os.path.join(workdir, 'restricted_case.geojson'))
+    restricted_layer = restricted_registry.get_path(restricted_path)
+    risk_scores(layer, restricted_layer)
+    # The whole layer in the UTM zone of its centre, so the search runs once over every feature
+    geometries = feature_geometries(layer["features"])
+    west, south, east, north = shapely.total_bounds(geometries)
+    epsg = int(utm_epsg((west + east) / 2, (south + north) / 2))
+    projected = transform_geometries(geometries, WGS84, f'EPSG:{epsg}')
+    tree = restricted_layer.projected_tree(epsg)
+    return [
+        ('risk.nearest_case', lambda: nearest_distances(projected, tree)),
+        ('risk.score_case', lambda: risk_scores(layer, restricted_layer))
+    ]
+
+def measure(fn, repeat, memory=True):
+    runs = []
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        fn()
+        runs.append(time.perf_counter() - start)
+    result = {"seconds": round(statistics.median(runs), 4), "min": round(min(runs), 4), "max": round(max(runs), 4),
+              "repeat": repeat}
+    if memory:
+        gc.collect()
+        tracemalloc.start()
+        try:
+            fn()
+            result["peak_mb"] = round(tracemalloc.get_traced_memory()[1] / 1024 / 1024, 2)
+        finally:
+            tracemalloc.stop()
+    return result
+
+def run(args):
+    profile = PROFILES[args.profile]
+    workdir = tempfile.mkdtemp(prefix='bench_run_')
+    try:
+        stages = build_stages(workdir, profile, args)
+        results = {}
+        for name, fn in stages:
+            if args.stages and not any(name == s or name.startswith(s + '.') for s in args.stages):
+                continue
+            results[name] = measure(fn, args.repeat, memory=not args.no_memory)
+            print(f"{name:<20} {results[name]['seconds']:>9.4f} s"
+                  + (f" {results[name]['peak_mb']:>9.2f} MB" if 'peak_mb' in results[name] else ''), file=sys.stderr)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return {"meta": environment(args), "stages": results}
+
+def environment(args):
+    return {
+        "profile": args.profile,
+        "parameters": {**PROFILES[args.profile], "crs": args.crs, "nodata": args.nodata, "kind": args.kind,
+                       "seed": args.seed},
+        "timestamp": time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "numpy": np.__version__,
+        "shapely": shapely.__version__,
+        "rasterio": rasterio.__version__,
+        "gdal": rasterio.__gdal_version__
+    }
+
+def compare(current, baseline, threshold, memory_threshold):
+    """
+    Rows of (stage, metric, baseline, current, ratio, regressed) for stages in both runs.
+
+    A stage regresses when it is more than ``threshold`` (a fraction) slower,
+    or uses ``memory_threshold`` more peak memory, and the difference is above
+    the noise floor.
+    """
+    rows = []
+    for name, now in current["stages"].items():
+        before = baseline["stages"].get(name)
+        if before is None:
+            continue
+        checks = [("seconds", threshold, MIN_DELTA_SECONDS)]
+        if "peak_mb" in now and "peak_mb" in before:
+            checks.append(("peak_mb", memory_threshold, MIN_DELTA_MB))
+        for metric, limit, floor in checks:
+            old, new = before[metric], now[metric]
+            ratio = new / old if old else None
+            regressed = new - old > floor and (ratio is None or ratio > 1 + limit)
+            rows.append((name, metric, old, new, ratio, regressed))
+    return rows
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--profile', choices=sorted(PROFILES), default='small')
+    parser.add_argument('--stages', nargs='+', help="stage names or prefixes, e.g. dem parse.kml")
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--crs', choices=sorted(generators.CRS_ORIGINS), default='EPSG:32643')
+    parser.add_argument('--nodata', choices=generators.NODATA_PATTERNS, default='none')
+    parser.add_argument('--kind', choices=generators.GEOMETRY_KINDS, default='polygon')
+    parser.add_argument('--no-memory', action='store_true', help="skip the tracemalloc run of each stage")
+    parser.add_argument('--output', help="write results as JSON to this path (default: stdout)")
+    parser.add_argument('--compare', metavar='BASELINE', help="results JSON to check this run against")
+    parser.add_argument('--threshold', type=float, default=0.25, help="allowed slowdown as a fraction")
+    parser.add_argument('--memory-threshold', type=float, default=0.25, help="allowed peak memory growth")
+    parser.add_argument('--verbose', action='store_true', help="keep the pipeline's INFO logs")
+    args = parser.parse_args()
+    if not args.verbose:
+        logging.getLogger().setLevel(logging.WARNING)
+
+    results = run(args)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    elif not args.compare:
+        print(json.dumps(results, indent=2))
+    if not args.compare:
+        return 0
+
+    with open(args.compare) as f:
+        baseline = json.load(f)
+    if baseline["meta"].get("parameters") != results["meta"]["parameters"]:
+        print("warning: baseline was run with different parameters: "
+              f"{baseline['meta'].get('parameters')}", file=sys.stderr)
+    rows = compare(results, baseline, args.threshold, args.memory_threshold)
+    print(f"{'stage':<20} {'metric':<8} {'baseline':>10} {'current':>10} {'ratio':>7}")
+    for name, metric, old, new, ratio, regressed in rows:
+        print(f"{name:<20} {metric:<8} {old:>10.4f} {new:>10.4f} "
+              f"{(f'{ratio:.2f}x' if ratio is not None else '-'):>7}{'  REGRESSION' if regressed else ''}")
+    regressions = [row for row in rows if row[5]]
+    print(f"{len(regressions)} regression(s) in {len({row[0] for row in rows})} compared stages")
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
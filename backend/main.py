@@ -1,58 +1,88 @@
+import time
+# Start of the startup report's import timing; everything below is included
+IMPORT_STARTED = time.perf_counter()
+
 import json
 import os
-import logging
-import sqlite3
-import csv
 import glob
-import time  # Added import for time
-from io import StringIO  # Added import for StringIO
-import rasterio
+from io import BytesIO
+from itertools import chain
 import hashlib
-from functools import wraps, lru_cache
-import matplotlib.pyplot as plt
-from flask import Flask, request, jsonify, send_from_directory, Response, send_file
+import threading
+from functools import wraps
+from flask import Flask, g, request, jsonify, Response, send_file, stream_with_context
 from flask_cors import CORS
+from werkzeug.exceptions import RequestedRangeNotSatisfiable
 from werkzeug.utils import secure_filename
 from dotenv import load_dotenv
-from flasgger import Swagger
-from shapely.geometry import mapping, shape
-from shapely.ops import unary_union
-from utils.file_parser import parse_shapefile, parse_kml, parse_geojson
+
+# Load environment variables before the utils modules, which read their settings at import
+load_dotenv()
+
+from utils.file_parser import sync_parse_kml
 from utils.merge_and_plot_dem import merge_and_save_dem, generate_static_preview, export_to_folium
 from utils.analysis import extract_elevation_stats, generate_slope_map
-from analysis.risk_model import evaluate_risk
-from analysis.terrain import calculate_slope
+from analysis.risk_model import risk_scores, model_params, score_chunks, MODEL_VERSION as RISK_MODEL_VERSION
+from analysis.risk_surface import build_risk_surface, sample_risk_surface, render_risk_tile
+from analysis.terrain import calculate_slope, DEM_PATH as TERRAIN_DEM_PATH, SLOPE_VERSION
+from utils.restricted_layers import registry as restricted_registry, DEFAULT_LAYER
+from utils import (chunked_upload, db, executor, exporters, feature_store, geojson_writer, lazy, lod, metadata,
+                   metrics, preview_renderer, results_store, upload_registry, vector_tiles)
+from utils.artifacts import store as artifact_store, store_upload
+from utils.cache import LRUCache
+from utils.janitor import ArtifactJanitor
+from utils.http_cache import send_cached, precompress, precompress_tree
 from utils.folium_helper import add_legend_and_stats
+from utils.logging import log_error, log_info, stats as log_stats
+
+rasterio = lazy.lazy_import('rasterio')
 
 app = Flask(__name__)
-CORS(app, resources={r"/*": {"origins": ["http://localhost:5000", "http://localhost:5173"]}})
-app.config['UPLOAD_FOLDER'] = 'Uploads/input'
+CORS(app, resources={r"/*": {"origins": ["http://localhost:5000", "http://localhost:5173"]}},
+     expose_headers=['X-Upload-Handle', 'X-LOD-Tolerance'])
 app.config['ALLOWED_EXTENSIONS'] = {'tif', 'tiff', 'kml', 'geojson', 'shp', 'shx', 'dbf'}
-Swagger(app)
+# Interactive API docs at /apidocs; API_DOCS=0 leaves out flasgger and its jsonschema import
+if os.getenv('API_DOCS', '1') == '1':
+    from flasgger import Swagger
+    Swagger(app)
 
-# Load environment variables
-load_dotenv()
 API_KEY = os.getenv('API_KEY')
 if not API_KEY:
     raise ValueError("API_KEY not set in .env file")
 
 # Config
-UPLOAD_FOLDER = os.path.join(os.path.dirname(__file__), 'Uploads')
-MAX_FILE_SIZE = 10 * 1024 * 1024
-os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+# Set through the UPLOAD_FOLDER environment variable; all upload paths derive from it
+UPLOAD_FOLDER = artifact_store.root
+DIST_FOLDER = os.path.join(os.path.dirname(__file__), 'dist')
+RISK_SURFACE_PATH = os.path.join(UPLOAD_FOLDER, 'risk_surface.tif')
+SCORE_CHUNK_SIZE = 5000
+# Default /api/visual-preview simplification in degrees, used without zoom or tolerance;
+# precomputed as a level of its own
+PREVIEW_TOLERANCE = 0.0001
+app.config['UPLOAD_FOLDER'] = os.path.join(UPLOAD_FOLDER, 'input')
+os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 
-# Logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s %(levelname)s %(message)s',
-    handlers=[logging.StreamHandler(), logging.FileHandler('app.log')]
-)
+# Results of /merge-dem by input hash; the janitor keeps the files they reference
+merge_cache = LRUCache(max_entries=32)
+janitor = ArtifactJanitor(UPLOAD_FOLDER)
+_setup_pid = None
+_setup_lock = threading.Lock()
 
-def log_error(message, extra=None):
-    logging.error(json.dumps({"error": message, **(extra or {})}))
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
 
-def log_info(message, extra=None):
-    logging.info(json.dumps({"message": message, **(extra or {})}))
+@app.before_request
+def ensure_process_setup():
+    setup_process()
+
+@app.after_request
+def record_request_latency(response):
+    # Streamed responses are timed up to their first byte
+    started = g.pop('request_started', None)
+    if started is not None:
+        metrics.observe_request(request.endpoint, request.method, response.status_code, time.perf_counter() - started)
+    return response
 
 def require_api_key(f):
     @wraps(f)
@@ -63,22 +93,109 @@ def require_api_key(f):
         return f(*args, **kwargs)
     return decorated
 
+def with_workspace(prefix):
+    """Give the view a private upload directory as ``workdir``, removed after the response is built."""
+    def decorator(f):
+        @wraps(f)
+        def decorated(*args, **kwargs):
+            with artifact_store.workspace(prefix) as workdir:
+                return f(*args, workdir=workdir, **kwargs)
+        return decorated
+    return decorator
+
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in app.config['ALLOWED_EXTENSIONS']
 
 def init_db():
-    conn = sqlite3.connect('data.db')
-    c = conn.cursor()
-    c.execute('''CREATE TABLE IF NOT EXISTS parsed_data
-                 (id INTEGER PRIMARY KEY AUTOINCREMENT,
-                  data TEXT NOT NULL,
-                  timestamp DATETIME DEFAULT CURRENT_TIMESTAMP)''')
-    conn.commit()
-    conn.close()
+    with db.transaction(immediate=True) as conn:
+        conn.execute('''CREATE TABLE IF NOT EXISTS parsed_data
+                        (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                         data TEXT NOT NULL,
+                         timestamp DATETIME DEFAULT CURRENT_TIMESTAMP)''')
+    feature_store.init_store()
+    results_store.init_store()
+
+def setup_process():
+    """
+    Create the schema, precompress the static build and start the artifact janitor.
+
+    Runs when the app is imported, so under any WSGI server and not only
+    ``python main.py``, and again on the first request of a forked worker,
+    which does not inherit the janitor thread. Once per process.
+    """
+    global _setup_pid
+    if _setup_pid == os.getpid():
+        return
+    with _setup_lock:
+        if _setup_pid == os.getpid():
+            return
+        init_db()
+        precompress_tree(DIST_FOLDER)
+        janitor.start()
+        _setup_pid = os.getpid()
+
+def parse_bbox(value):
+    """Parse a ``min_x,min_y,max_x,max_y`` query parameter; raises ValueError if malformed."""
+    parts = [float(v) for v in value.split(',')]
+    if len(parts) != 4 or parts[0] > parts[2] or parts[1] > parts[3]:
+        raise ValueError("bbox must be min_x,min_y,max_x,max_y")
+    return tuple(parts)
+
+def requested_dataset_id():
+    """Dataset named by the ``dataset`` query parameter (id or content hash), else the latest one."""
+    ref = request.args.get('dataset')
+    return feature_store.resolve_dataset(ref) if ref else feature_store.latest_dataset_id()
+
+def terrain_slopes(geo_data):
+    """Per-feature slopes for ``geo_data``, served from the results store when the DEM is unchanged."""
+    if not os.path.exists(TERRAIN_DEM_PATH):
+        with metrics.span('terrain.slope'):
+            return calculate_slope(geo_data)
+    stat = os.stat(TERRAIN_DEM_PATH)
+    params = {"dem": TERRAIN_DEM_PATH, "mtime_ns": stat.st_mtime_ns, "size": stat.st_size}
+    key = results_store.result_key('terrain', SLOPE_VERSION, feature_store.content_hash(geo_data), None, params)
+    slopes = results_store.get_result(key)
+    if slopes is None:
+        with metrics.span('terrain.slope'):
+            slopes = calculate_slope(geo_data)
+        results_store.store_result(key, params, slopes)
+    return slopes
+
+def requested_upload(workdir):
+    """
+    Parsed layer named by the ``handle`` form or query value, else the one uploaded with the request.
+
+    Uploads are parsed once per content; see upload_registry.
+    """
+    handle = request.values.get('handle')
+    if handle:
+        return upload_registry.registry.get(handle)
+    return upload_registry.registry.register(request.files, workdir)
+
+def upload_error(e):
+    """Response for a failed requested_upload."""
+    if isinstance(e, upload_registry.UnknownUpload):
+        return jsonify({'error': str(e)}), 404
+    if isinstance(e, upload_registry.UploadTooLarge):
+        return jsonify({'error': str(e)}), 413
+    return jsonify({'error': str(e)}), 400
+
+def busy_response(e):
+    """503 for work refused because its executor queue is full."""
+    log_error("Executor queue full", {"kind": e.kind, "endpoint": request.endpoint})
+    response = jsonify({'error': str(e)})
+    response.status_code = 503
+    response.headers['Retry-After'] = '5'
+    return response
+
+def with_handle(response, upload):
+    response.headers['X-Upload-Handle'] = upload.handle
+    return response
 
 def hash_files(folder_path):
     """Generate a hash of all .tif files in the folder for caching."""
-    tif_files = sorted([f for f in glob.glob(os.path.join(folder_path, "*.tif")) if not f.endswith("merged_dem.tif")])
+    tif_files = sorted([f for f in glob.glob(os.path.join(folder_path, "*.tif"))
+                        if not f.endswith("merged_dem.tif") and not f.endswith("_small.tif")])
     if not tif_files:
         return None
     hasher = hashlib.sha256()
@@ -100,18 +217,20 @@ def upload_tif():
             return jsonify({"status": "error", "message": "No selected file"}), 400
         if file and allowed_file(file.filename):
             filename = secure_filename(file.filename)
-            file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-            file.save(file_path)
-            try:
-                with rasterio.open(file_path) as src:
-                    if src.count < 1 or src.dtypes[0] not in ('int16', 'float32', 'float64'):
-                        os.remove(file_path)
-                        log_error("Invalid GeoTIFF file", {"filename": filename})
-                        return jsonify({"status": "error", "message": "Invalid GeoTIFF: Must contain valid elevation data"}), 400
-            except rasterio.errors.RasterioIOError as e:
-                os.remove(file_path)
-                log_error("Failed to validate GeoTIFF", {"filename": filename, "error": str(e)})
-                return jsonify({"status": "error", "message": f"Invalid GeoTIFF: {str(e)}"}), 400
+            # Validated in a private workspace; only complete, valid tiles reach the input folder
+            with artifact_store.workspace('upload') as workdir:
+                file_path = os.path.join(workdir, filename)
+                file.save(file_path)
+                try:
+                    with rasterio.open(file_path) as src:
+                        if src.count < 1 or src.dtypes[0] not in ('int16', 'float32', 'float64'):
+                            log_error("Invalid GeoTIFF file", {"filename": filename})
+                            return jsonify({"status": "error", "message": "Invalid GeoTIFF: Must contain valid elevation data"}), 400
+                except rasterio.errors.RasterioIOError as e:
+                    log_error("Failed to validate GeoTIFF", {"filename": filename, "error": str(e)})
+                    return jsonify({"status": "error", "message": f"Invalid GeoTIFF: {str(e)}"}), 400
+                file_path = store_upload(file_path, app.config['UPLOAD_FOLDER'], filename)
+            filename = os.path.basename(file_path)
             log_info("File uploaded successfully", {"filename": filename, "path": file_path})
             return jsonify({"status": "success", "filename": filename}), 200
         else:
@@ -121,28 +240,160 @@ def upload_tif():
         log_error("Failed to upload file", {"error": str(e)})
         return jsonify({"status": "error", "message": f"Upload failed: {str(e)}"}), 500
 
-@lru_cache(maxsize=32)
+@app.route('/upload-tif/uploads', methods=['POST'])
+@require_api_key
+def initiate_tif_upload():
+    """
+    Start a chunked, resumable GeoTIFF upload.
+
+    Body: {"filename", "size", "sha256" (optional), "part_size" (optional)}.
+    Parts are then sent with PUT /upload-tif/uploads/<id>/parts/<index> as raw
+    bytes, and POST /upload-tif/uploads/<id>/complete verifies and stores the file.
+    """
+    try:
+        body = request.get_json(silent=True) or {}
+        filename = secure_filename(body.get('filename') or '')
+        if not filename or not allowed_file(filename) or filename.rsplit('.', 1)[1].lower() not in ('tif', 'tiff'):
+            log_error("Invalid file extension", {"filename": body.get('filename')})
+            return jsonify({"status": "error", "message": "Invalid file extension: Only .tif or .tiff allowed"}), 400
+        upload = chunked_upload.initiate_upload(app.config['UPLOAD_FOLDER'], filename, body.get('size'),
+                                                sha256=body.get('sha256'), part_size=body.get('part_size'))
+        return jsonify({"status": "success", **upload}), 201
+    except chunked_upload.UploadError as e:
+        log_error("Invalid upload request", {"error": str(e)})
+        return jsonify({"status": "error", "message": str(e)}), 400
+    except Exception as e:
+        log_error("Failed to initiate upload", {"error": str(e)})
+        return jsonify({"status": "error", "message": f"Upload failed: {str(e)}"}), 500
+
+@app.route('/upload-tif/uploads/<upload_id>', methods=['GET'])
+@require_api_key
+def tif_upload_status(upload_id):
+    try:
+        return jsonify({"status": "success", **chunked_upload.upload_status(app.config['UPLOAD_FOLDER'], upload_id)})
+    except chunked_upload.UploadNotFound:
+        return jsonify({"status": "error", "message": "Upload not found"}), 404
+
+@app.route('/upload-tif/uploads/<upload_id>', methods=['DELETE'])
+@require_api_key
+def abort_tif_upload(upload_id):
+    try:
+        chunked_upload.abort_upload(app.config['UPLOAD_FOLDER'], upload_id)
+        return jsonify({"status": "success"})
+    except chunked_upload.UploadNotFound:
+        return jsonify({"status": "error", "message": "Upload not found"}), 404
+
+@app.route('/upload-tif/uploads/<upload_id>/parts/<int:index>', methods=['PUT'])
+@require_api_key
+def upload_tif_part(upload_id, index):
+    try:
+        digest = chunked_upload.write_part(app.config['UPLOAD_FOLDER'], upload_id, index, request.stream)
+        return jsonify({"status": "success", "part": index, "sha256": digest})
+    except chunked_upload.UploadNotFound:
+        return jsonify({"status": "error", "message": "Upload not found"}), 404
+    except chunked_upload.UploadError as e:
+        log_error("Rejected upload part", {"upload_id": upload_id, "part": index, "error": str(e)})
+        return jsonify({"status": "error", "message": str(e)}), 400
+    except Exception as e:
+        log_error("Failed to write upload part", {"upload_id": upload_id, "part": index, "error": str(e)})
+        return jsonify({"status": "error", "message": f"Upload failed: {str(e)}"}), 500
+
+@app.route('/upload-tif/uploads/<upload_id>/complete', methods=['POST'])
+@require_api_key
+def complete_tif_upload(upload_id):
+    try:
+        path, digest = chunked_upload.complete_upload(app.config['UPLOAD_FOLDER'], upload_id, app.config['UPLOAD_FOLDER'])
+        return jsonify({"status": "success", "filename": os.path.basename(path), "sha256": digest}), 200
+    except chunked_upload.UploadNotFound:
+        return jsonify({"status": "error", "message": "Upload not found"}), 404
+    except chunked_upload.UploadError as e:
+        log_error("Failed to complete upload", {"upload_id": upload_id, "error": str(e)})
+        return jsonify({"status": "error", "message": str(e)}), 400
+    except Exception as e:
+        log_error("Failed to complete upload", {"upload_id": upload_id, "error": str(e)})
+        return jsonify({"status": "error", "message": f"Upload failed: {str(e)}"}), 500
+
+def publish_artifact(path):
+    """Publish a job output, precompress it if it is text, and return its URL."""
+    published = artifact_store.publish(path)
+    try:
+        precompress(published)
+    except OSError as e:
+        # Clients fall back to the uncompressed file
+        log_error("Failed to precompress artifact", {"file": published, "error": str(e)})
+    return artifact_store.url(published)
+
+def installed_dem_path(folder_path):
+    """Where /merge-dem installs the merged DEM of ``folder_path``."""
+    base_path = folder_path if folder_path.endswith('input') else os.path.join(folder_path, 'input')
+    return os.path.join(base_path, 'merged_dem.tif')
+
+def merge_artifacts(result, folder_path):
+    """Files referenced by the /merge-dem result of ``folder_path``, including its installed merged_dem.tif."""
+    paths = [result['merged_dem'], installed_dem_path(folder_path)]
+    paths += [artifact_store.path_for_url(result[key]) for key in ('preview', 'interactive', 'slope_map')]
+    return paths
+
+def pinned_artifacts():
+    return [path for (_, folder_path), result in merge_cache.items() for path in merge_artifacts(result, folder_path)]
+
+janitor.add_pin_source(pinned_artifacts)
+
+for cache_name, cache in {'merge_dem': merge_cache, 'uploads': upload_registry.registry.cache, 'lod': lod.lod_cache,
+                          'preview': preview_renderer.preview_cache, 'vector_tiles': vector_tiles.tile_cache}.items():
+    metrics.register_cache(cache_name, cache)
+metrics.register_stats('executor', 'kind', executor.stats, help='Bounded executor statistics',
+                       counters=('completed', 'failed', 'rejected', 'queue_seconds_total', 'run_seconds_total'))
+metrics.register_stats('log', 'handler', lambda: {'queue': log_stats()}, help='Asynchronous log handler statistics',
+                       counters=('dropped', 'suppressed'))
+metrics.register_stats('db_pool', 'kind', lambda: {'connections': db.pool.stats()},
+                       help='SQLite connection pool statistics', counters=('opened', 'reused'))
+
 def cached_merge_dem(folder_hash, folder_path):
-    """Cached DEM processing based on folder hash."""
+    """DEM processing cached by folder hash; only successful results whose files still exist are reused."""
+    key = (folder_hash, folder_path)
+    result = merge_cache.get(key)
+    if result is not None and all(os.path.exists(path) for path in merge_artifacts(result, folder_path)):
+        return result
+    result = process_dem(folder_path)
+    if result['status'] == 'success':
+        merge_cache.put(key, result)
+        # Before another worker's janitor could count the new files as unpinned
+        janitor.publish_pins()
+    return result
+
+def process_dem(folder_path):
+    """
+    Merge the DEMs of ``folder_path`` and render its previews in a private
+    workspace, then publish every output under a content-addressed URL.
+
+    The merged DEM is also installed atomically as ``merged_dem.tif`` in the
+    folder, the default input of /api/risk-surface.
+    """
     try:
-        log_info("Starting DEM merge", {"folder_path": folder_path})
-        merged_tif_path = merge_and_save_dem(folder_path)
-        log_info("Generating static preview", {"merged_tif_path": merged_tif_path})
-        preview_img = generate_static_preview(merged_tif_path)
-        log_info("Generating folium map", {"merged_tif_path": merged_tif_path})
-        interactive_map = export_to_folium(merged_tif_path)
-        log_info("Extracting elevation stats", {"merged_tif_path": merged_tif_path})
-        stats = extract_elevation_stats(merged_tif_path)
-        log_info("Generating slope map", {"merged_tif_path": merged_tif_path})
-        slope_map = generate_slope_map(merged_tif_path)
-        return {
-            'status': 'success',
-            'merged_dem': merged_tif_path.replace("\\", "/"),
-            'preview': f"/Uploads/{os.path.basename(preview_img)}",
-            'interactive': f"/Uploads/{os.path.basename(interactive_map)}",
-            'slope_map': f"/Uploads/{os.path.basename(slope_map)}",
-            'elevation_stats': stats
-        }
+        with artifact_store.workspace('merge') as workdir, metrics.span('dem.total', folder_path=folder_path):
+            with metrics.span('dem.merge', folder_path=folder_path):
+                merged_tif_path = merge_and_save_dem(folder_path, workdir=workdir)
+            with metrics.span('dem.static_preview'):
+                preview_img = generate_static_preview(merged_tif_path, os.path.join(workdir, 'merged_dem_with_hillshade.png'))
+            with metrics.span('dem.folium'):
+                interactive_map = export_to_folium(merged_tif_path, os.path.join(workdir, 'interactive_map.html'))
+            with metrics.span('dem.stats'):
+                stats = extract_elevation_stats(merged_tif_path)
+            with metrics.span('dem.slope_map'):
+                slope_map = generate_slope_map(merged_tif_path, os.path.join(workdir, 'slope_map_colored.png'))
+
+            with metrics.span('dem.publish'):
+                merged_dem = artifact_store.publish(merged_tif_path)
+                artifact_store.install(merged_dem, installed_dem_path(folder_path))
+                return {
+                    'status': 'success',
+                    'merged_dem': merged_dem.replace("\\", "/"),
+                    'preview': publish_artifact(preview_img),
+                    'interactive': publish_artifact(interactive_map),
+                    'slope_map': publish_artifact(slope_map),
+                    'elevation_stats': stats
+                }
     except FileNotFoundError as e:
         log_error("No .tif files found", {"folder_path": folder_path, "error": str(e)})
         return {"status": "error", "message": "No valid .tif files found in the specified folder"}
@@ -158,7 +409,7 @@ def cached_merge_dem(folder_hash, folder_path):
 def merge_dem():
     try:
         data = request.get_json()
-        folder_path = data.get('folder_path', 'Uploads/input')
+        folder_path = data.get('folder_path', app.config['UPLOAD_FOLDER'])
         log_info("Received merge-dem request", {"folder_path": folder_path})
         
         # Validate folder
@@ -179,34 +430,59 @@ def merge_dem():
             return jsonify({"status": "error", "message": "No .tif files found for processing"}), 400
         
         # Process DEM with caching
-        result = cached_merge_dem(folder_hash, folder_path)
+        result = executor.run('dem', cached_merge_dem, folder_hash, folder_path)
         return jsonify(result), 200 if result['status'] == 'success' else 500
+    except executor.ExecutorBusy as e:
+        return busy_response(e)
     except Exception as e:
         log_error("Unexpected error in merge-dem", {"error": str(e)})
         return jsonify({"status": "error", "message": f"Unexpected error: {str(e)}"}), 500
 
-@app.after_request
-def cleanup(response):
-    for file in glob.glob(os.path.join(app.config['UPLOAD_FOLDER'], '*_small.tif')):
-        if os.path.isfile(file) and time.time() - os.path.getmtime(file) > 3600:
-            try:
-                os.remove(file)
-            except OSError as e:
-                log_error("Failed to remove file during cleanup", {"file": file, "error": str(e)})
-    return response
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """Request latencies, pipeline stage timings, cache and executor statistics in Prometheus text format."""
+    return Response(metrics.render(), content_type=metrics.CONTENT_TYPE)
+
+@app.route('/api/executor', methods=['GET'])
+@require_api_key
+def executor_stats():
+    """Workers, queue depth and queue/run times of each class of CPU-heavy work."""
+    return jsonify({"executor": executor.stats()})
+
+@app.route('/api/startup', methods=['GET'])
+@require_api_key
+def startup_stats():
+    """How long the worker took to import and warm up, and which heavy modules it has loaded since."""
+    return jsonify({"startup": startup, "modules": lazy.stats()})
+
+@app.route('/api/artifacts', methods=['GET'])
+@require_api_key
+def artifact_stats():
+    try:
+        return jsonify({"artifacts": janitor.stats(), "caches": {"merge_dem": merge_cache.stats(),
+                                                                   "uploads": upload_registry.registry.cache.stats()}})
+    except Exception as e:
+        log_error("Error reading artifact stats", {"error": str(e)})
+        return jsonify({'error': 'Failed to read artifact stats'}), 500
+
+def render_dem_views(folder):
+    """Merge the DEMs of ``folder`` and publish a static and an interactive view of the result."""
+    with artifact_store.workspace('view') as workdir:
+        merged_tif = merge_and_save_dem(folder, workdir=workdir)
+        static_image_path = generate_static_preview(merged_tif, os.path.join(workdir, 'merged_dem_with_hillshade.png'))
+        interactive_map_path = export_to_folium(merged_tif, os.path.join(workdir, 'interactive_map.html'))
+        return {
+            "static_image_url": publish_artifact(static_image_path),
+            "interactive_map_url": publish_artifact(interactive_map_path)
+        }
 
 @app.route('/view-dem')
 @require_api_key
 def view_dem():
     try:
-        folder = "Uploads/input"
-        merged_tif = merge_and_save_dem(folder)
-        static_image_path = generate_static_preview(merged_tif)
-        interactive_map_path = export_to_folium(merged_tif)
-        return jsonify({
-            "static_image_url": f"/Uploads/{os.path.basename(static_image_path)}",
-            "interactive_map_url": f"/Uploads/{os.path.basename(interactive_map_path)}"
-        })
+        return jsonify(executor.run('dem', render_dem_views, app.config['UPLOAD_FOLDER']))
+    except executor.ExecutorBusy as e:
+        return busy_response(e)
     except Exception as e:
         log_error("Failed to process DEM", {"error": str(e)})
         return jsonify({'error': str(e)}), 500
@@ -216,7 +492,7 @@ def view_dem():
 def get_sample_kml():
     try:
         data_path = os.path.join('data', 'sample_zones.kml')
-        features = parse_kml(data_path)
+        features = executor.run('parse', sync_parse_kml, data_path)
         log_info("Sample KML retrieved", {"path": data_path, "features": len(features.get("features", []))})
         return jsonify(features)
     except Exception as e:
@@ -231,130 +507,341 @@ def analyze_terrain():
         if not geo_data or 'features' not in geo_data:
             log_error("Invalid GeoJSON data", {"endpoint": "terrain"})
             return jsonify({'error': 'Invalid GeoJSON data'}), 400
-        slopes = calculate_slope(geo_data)
+        slopes = executor.run('raster', terrain_slopes, geo_data)
         for i, feature in enumerate(geo_data.get("features", [])):
             feature["properties"]["slope"] = slopes[i]
-        conn = sqlite3.connect('data.db')
-        c = conn.cursor()
-        c.execute("INSERT INTO parsed_data (data) VALUES (?)", (json.dumps(geo_data),))
-        conn.commit()
-        conn.close()
+        dataset = feature_store.get_dataset(feature_store.store_dataset(geo_data))
         log_info("Terrain analysis completed", {"features": len(geo_data.get("features", [])), "slopes": slopes})
-        return jsonify({"slopes": slopes, "geojson": geo_data})
+        return jsonify({"slopes": slopes, "geojson": geo_data,
+                        "dataset": {"id": dataset["id"], "content_hash": dataset["content_hash"]}})
+    except executor.ExecutorBusy as e:
+        return busy_response(e)
     except Exception as e:
         log_error("Error in terrain analysis", {"error": str(e)})
         return jsonify({'error': 'Failed to analyze terrain'}), 500
 
+@app.route('/api/datasets', methods=['GET'])
+@require_api_key
+def list_datasets():
+    try:
+        return jsonify({"datasets": feature_store.list_datasets()})
+    except Exception as e:
+        log_error("Error listing datasets", {"error": str(e)})
+        return jsonify({'error': 'Failed to list datasets'}), 500
+
 @app.route('/api/analyze', methods=['GET'])
 @require_api_key
 def analyze_risk():
+    """
+    Risk scores for a stored dataset, named by id or content hash (default: latest).
+
+    Scores are kept in the results store under (model version, dataset hash,
+    restricted-layer hash, model parameters), and the response ETag is derived
+    from that key, so repeated polls are one keyed lookup or a 304.
+    """
     try:
-        conn = sqlite3.connect('data.db')
-        c = conn.cursor()
-        c.execute("SELECT data FROM parsed_data ORDER BY timestamp DESC LIMIT 1")
-        row = c.fetchone()
-        conn.close()
-        data = json.loads(row[0]) if row else {"features": []}
-        scores = evaluate_risk(data)
-        log_info("Risk analysis completed", {"features": len(data.get("features", [])), "scores": scores})
-        return jsonify({"scores": scores})
+        dataset_id = requested_dataset_id()
+        dataset = feature_store.get_dataset(dataset_id) if dataset_id is not None else None
+        if dataset is None:
+            if request.args.get('dataset'):
+                return jsonify({'error': 'Dataset not found'}), 404
+            return jsonify({"scores": []})
+        surface_path = risk_surface_path(request.args.get('surface'))
+        if request.args.get('source') == 'surface' and surface_path is not None:
+            scores = executor.run('raster', sample_risk_surface, surface_path,
+                                  feature_store.load_feature_collection(dataset_id))
+            log_info("Risk analysis completed", {"dataset_id": dataset_id, "source": "surface"})
+            return jsonify({"scores": scores})
+
+        layer_name = request.args.get('layer', DEFAULT_LAYER)
+        layer = restricted_registry.get(layer_name)
+        params = model_params()
+        key = results_store.result_key('risk', RISK_MODEL_VERSION, dataset["content_hash"], layer.content_hash,
+                                       params)
+        scores = results_store.get_result(key)
+        cached = scores is not None
+        if not cached:
+            scores = executor.run('geometry', risk_scores, feature_store.load_feature_collection(dataset_id), layer)
+            results_store.store_result(key, params, scores)
+        log_info("Risk analysis completed", {"dataset_id": dataset_id, "layer": layer_name,
+                                             "features": len(scores), "cached": cached})
+        response = jsonify({"scores": scores,
+                            "dataset": {"id": dataset_id, "content_hash": dataset["content_hash"]}})
+        response.set_etag(results_store.result_etag(key))
+        response.headers['Cache-Control'] = 'no-cache'
+        response.headers['X-Cache'] = 'HIT' if cached else 'MISS'
+        return response.make_conditional(request)
+    except KeyError as e:
+        log_error("Unknown restricted layer", {"error": str(e)})
+        return jsonify({'error': str(e).strip("'")}), 404
+    except executor.ExecutorBusy as e:
+        return busy_response(e)
     except Exception as e:
         log_error("Error in risk analysis", {"error": str(e)})
         return jsonify({'error': 'Failed to analyze risk'}), 500
 
+@app.route('/api/score', methods=['POST'])
+@require_api_key
+def score_stream():
+    """
+    Stream risk scores as NDJSON, one line per feature, flushed per chunk.
+
+    Accepts an NDJSON body of GeoJSON Features (application/x-ndjson), a
+    FeatureCollection, or {"dataset_ids": [...]} naming stored datasets.
+    """
+    try:
+        layer = request.args.get('layer', DEFAULT_LAYER)
+        chunk_size = max(1, min(request.args.get('chunk_size', SCORE_CHUNK_SIZE, type=int), 100000))
+        if request.mimetype in ('application/x-ndjson', 'application/geo+json-seq'):
+            features = _ndjson_features(request.stream)
+        else:
+            payload = request.get_json(silent=True)
+            if isinstance(payload, dict) and payload.get('type') == 'FeatureCollection':
+                features = iter(payload.get('features', []))
+            elif isinstance(payload, dict) and isinstance(payload.get('dataset_ids'), list):
+                features = _dataset_features(payload['dataset_ids'])
+            else:
+                log_error("Invalid scoring request", {"content_type": request.mimetype})
+                return jsonify({'error': 'Expected NDJSON features, a FeatureCollection or dataset_ids'}), 400
+    except Exception as e:
+        log_error("Error in score request", {"error": str(e)})
+        return jsonify({'error': 'Failed to score features'}), 500
+
+    def generate():
+        index = 0
+        try:
+            for chunk, scores, distances, slopes in score_chunks(features, layer=layer, chunk_size=chunk_size):
+                lines = []
+                for feature, score, distance, slope in zip(chunk, scores, distances, slopes):
+                    lines.append(json.dumps({
+                        "id": _feature_id(feature, index),
+                        "score": score,
+                        "distance": float(distance) if distance != float('inf') else None,
+                        "slope": float(slope)
+                    }))
+                    index += 1
+                yield '\n'.join(lines) + '\n'
+            log_info("Streamed risk scores", {"features": index, "layer": layer})
+        except Exception as e:
+            log_error("Error while streaming scores", {"error": str(e), "scored": index})
+            yield json.dumps({"error": "Scoring failed", "scored": index}) + '\n'
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+def _ndjson_features(stream):
+    for line in iter(stream.readline, b''):
+        line = line.strip()
+        if line:
+            yield json.loads(line)
+
+def _dataset_features(dataset_ids):
+    for dataset_id in dataset_ids:
+        yield from feature_store.iter_features(dataset_id)
+
+def _feature_id(feature, index):
+    if feature.get("id") is not None:
+        return feature["id"]
+    properties = feature.get("properties") or {}
+    return properties.get("id", properties.get("name", index))
+
+def publish_risk_surface(dem_path, layer):
+    """
+    Build a risk surface in a private workspace and publish it under its content hash.
+
+    The latest surface is also installed as RISK_SURFACE_PATH, which the
+    unversioned tile URL and /api/analyze?source=surface read.
+    """
+    with artifact_store.workspace('surface') as workdir:
+        surface_path = artifact_store.publish(build_risk_surface(dem_path, os.path.join(workdir, 'risk_surface.tif'),
+                                                                 layer=layer))
+    artifact_store.install(surface_path, RISK_SURFACE_PATH)
+    return surface_path
+
+def risk_surface_path(surface_id):
+    """The published surface ``surface_id`` (its SHA-256), or the latest one; None if it does not exist."""
+    if surface_id is None:
+        path = RISK_SURFACE_PATH
+    elif len(surface_id) == 64 and all(ch in '0123456789abcdef' for ch in surface_id):
+        path = os.path.join(artifact_store.cas_dir, surface_id[:2], f'{surface_id}.tif')
+    else:
+        return None
+    return path if os.path.exists(path) else None
+
+@app.route('/api/risk-surface', methods=['POST'])
+@require_api_key
+def generate_risk_surface():
+    try:
+        data = request.get_json(silent=True) or {}
+        dem_path = data.get('dem_path', os.path.join(app.config['UPLOAD_FOLDER'], 'merged_dem.tif'))
+        layer = data.get('layer', DEFAULT_LAYER)
+        if not os.path.exists(dem_path):
+            log_error("DEM not found for risk surface", {"dem_path": dem_path})
+            return jsonify({"status": "error", "message": "Merged DEM not found. Run /merge-dem first"}), 400
+        surface_path = executor.run('raster', publish_risk_surface, dem_path, layer)
+        surface_id = os.path.splitext(os.path.basename(surface_path))[0]
+        return jsonify({
+            "status": "success",
+            "surface": surface_id,
+            "geotiff": artifact_store.url(surface_path),
+            "tiles": f"/api/risk-surface/{surface_id}/tiles/{{z}}/{{x}}/{{y}}.png"
+        }), 200
+    except KeyError as e:
+        log_error("Unknown restricted layer", {"error": str(e)})
+        return jsonify({"status": "error", "message": str(e)}), 404
+    except executor.ExecutorBusy as e:
+        return busy_response(e)
+    except Exception as e:
+        log_error("Error generating risk surface", {"error": str(e)})
+        return jsonify({"status": "error", "message": f"Risk surface generation failed: {str(e)}"}), 500
+
+@app.route('/api/risk-surface/tiles/<int:z>/<int:x>/<int:y>.png', methods=['GET'])
+@app.route('/api/risk-surface/<surface_id>/tiles/<int:z>/<int:x>/<int:y>.png', methods=['GET'])
+def risk_surface_tile(z, x, y, surface_id=None):
+    surface_path = risk_surface_path(surface_id)
+    if surface_path is None:
+        return jsonify({"status": "error", "message": "Risk surface has not been generated"}), 404
+    if z < 0 or z > 22 or not (0 <= x < 2 ** z and 0 <= y < 2 ** z):
+        return jsonify({"status": "error", "message": "Invalid tile coordinates"}), 400
+    try:
+        janitor.touch(surface_path)
+        return Response(executor.run('tiles', render_risk_tile, surface_path, z, x, y), mimetype='image/png')
+    except executor.ExecutorBusy as e:
+        return busy_response(e)
+    except Exception as e:
+        log_error("Failed to render risk tile", {"z": z, "x": x, "y": y, "error": str(e)})
+        return jsonify({"status": "error", "message": "Failed to render tile"}), 500
+
+@app.route('/vt/<dataset>/<int:z>/<int:x>/<int:y>.pbf', methods=['GET'])
+@require_api_key
+def vector_tile(dataset, z, x, y):
+    """
+    Mapbox Vector Tile of a stored dataset, addressed by id or content hash.
+
+    Tiles are cut from the R*Tree-selected features on first request and
+    cached per dataset version; hash-addressed URLs are cacheable forever.
+    """
+    if z < 0 or z > vector_tiles.MAX_ZOOM or not (0 <= x < 2 ** z and 0 <= y < 2 ** z):
+        return jsonify({"status": "error", "message": "Invalid tile coordinates"}), 400
+    try:
+        dataset_id = feature_store.resolve_dataset(dataset)
+        record = feature_store.get_dataset(dataset_id) if dataset_id is not None else None
+        if record is None:
+            return jsonify({"status": "error", "message": "Dataset not found"}), 404
+        tile = executor.run('tiles', vector_tiles.get_tile, record, z, x, y)
+        response = geojson_writer.compressed_response(tile, 'application/vnd.mapbox-vector-tile')
+        encoding = response.headers.get('Content-Encoding')
+        response.set_etag(f"{record['content_hash'] or record['id']}-{z}-{x}-{y}" + (f'-{encoding}' if encoding else ''))
+        # A full content hash always names the same data; ids and prefixes are resolved per request
+        immutable = dataset.lower() == record['content_hash']
+        response.headers['Cache-Control'] = 'public, max-age=31536000, immutable' if immutable else 'no-cache'
+        return response.make_conditional(request)
+    except executor.ExecutorBusy as e:
+        return busy_response(e)
+    except Exception as e:
+        log_error("Failed to render vector tile", {"dataset": dataset, "z": z, "x": x, "y": y, "error": str(e)})
+        return jsonify({"status": "error", "message": "Failed to render tile"}), 500
+
 @app.route('/api/layers', methods=['GET'])
 @require_api_key
 def get_uploaded_layer():
+    return get_restricted_layer(DEFAULT_LAYER)
+
+@app.route('/api/layers/<name>', methods=['GET'])
+@require_api_key
+def get_restricted_layer(name):
     try:
-        data_path = os.path.join('data', 'restricted_area.geojson')
-        data = parse_geojson(data_path)
-        log_info("Retrieved restricted area", {"path": data_path})
-        return jsonify({"geojson": data})
+        layer = restricted_registry.get(name)
+        response = Response(layer.body, mimetype='application/json')
+        response.set_etag(layer.etag)
+        response.headers['Cache-Control'] = 'no-cache'
+        log_info("Retrieved restricted area", {"layer": name, "path": layer.path})
+        return response.make_conditional(request)
+    except KeyError:
+        log_error("Unknown restricted layer", {"layer": name})
+        return jsonify({'error': f'Unknown restricted layer: {name}'}), 404
     except Exception as e:
-        log_error("Error retrieving restricted area", {"path": data_path, "error": str(e)})
+        log_error("Error retrieving restricted area", {"layer": name, "error": str(e)})
         return jsonify({'error': 'Failed to retrieve restricted area'}), 500
 
 @app.route('/api/restricted', methods=['GET'])
 @require_api_key
 def get_restricted_area():
-    return get_uploaded_layer()
+    return get_restricted_layer(DEFAULT_LAYER)
 
 @app.route('/api/zones', methods=['GET'])
 @require_api_key
 def get_zones():
     try:
-        conn = sqlite3.connect('data.db')
-        c = conn.cursor()
-        c.execute("SELECT data FROM parsed_data ORDER BY timestamp DESC LIMIT 1")
-        row = c.fetchone()
-        conn.close()
-        data = json.loads(row[0]) if row else {"type": "FeatureCollection", "features": []}
-        log_info("Retrieved zones", {"features": len(data.get("features", []))})
-        return jsonify(data)
+        try:
+            bbox = parse_bbox(request.args['bbox']) if request.args.get('bbox') else None
+            limit = request.args.get('limit', type=int)
+            offset = request.args.get('offset', 0, type=int)
+            if (limit is not None and limit < 0) or offset < 0:
+                raise ValueError("limit and offset must be non-negative")
+            precision, keys = geojson_writer.request_options()
+        except ValueError as e:
+            log_error("Invalid zones query", {"error": str(e)})
+            return jsonify({'error': str(e)}), 400
+        dataset_id = requested_dataset_id()
+        payload = b''.join(exporters.stream_geojson(dataset_id, bbox=bbox, limit=limit, offset=offset,
+                                                    precision=precision, keys=keys))
+        log_info("Retrieved zones", {"dataset_id": dataset_id, "bytes": len(payload), "bbox": bbox, "precision": precision})
+        return geojson_writer.json_response(payload)
     except Exception as e:
         log_error("Error retrieving zones", {"error": str(e)})
         return jsonify({'error': 'Failed to retrieve zones'}), 500
 
 @app.route('/api/parse', methods=['POST'])
 @require_api_key
-def parse_file():
+@with_workspace('parse')
+def parse_file(workdir):
     try:
-        if 'file' not in request.files:
+        if 'file' not in request.files and not request.values.get('handle'):
             log_error("No file part in the request")
             return jsonify({'error': 'No file uploaded'}), 400
-        file = request.files['file']
-        if not file or file.filename == '':
-            log_error("Empty filename")
-            return jsonify({'error': 'No selected file'}), 400
-        filename = secure_filename(file.filename)
-        if not allowed_file(filename):
-            log_error("Invalid file extension", {"filename": filename})
-            return jsonify({'error': 'Invalid file type'}), 400
-        file.seek(0, os.SEEK_END)
-        file_size = file.tell()
-        file.seek(0)
-        if file_size > MAX_FILE_SIZE:
-            log_error("File too large", {"filename": filename, "size": file_size})
-            return jsonify({'error': 'File too large. Max 10MB allowed'}), 400
-        file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(file_path)
-        log_info("File uploaded", {"filename": filename, "size": file_size})
-        data = None
-        if filename.endswith('.kml'):
-            data = parse_kml(file_path)
-        elif filename.endswith('.geojson'):
-            data = parse_geojson(file_path)
-        elif filename.endswith('.shp'):
-            data = parse_shapefile(file_path)
-        if data and isinstance(data, dict):
-            features = data.get("features", [])
-            total_features = len(features)
-            geometry_types = {}
-            for f in features:
-                geom_type = f.get("geometry", {}).get("type", "Unknown")
-                geometry_types[geom_type] = geometry_types.get(geom_type, 0) + 1
-            data["metadata"] = {
-                "total_features": total_features,
-                "geometry_types": geometry_types
-            }
-        if request.args.get('store', 'false').lower() == 'true' and data:
+        file = request.files.get('file')
+        if file is not None:
+            if file.filename == '':
+                log_error("Empty filename")
+                return jsonify({'error': 'No selected file'}), 400
+            filename = secure_filename(file.filename)
+            if not allowed_file(filename):
+                log_error("Invalid file extension", {"filename": filename})
+                return jsonify({'error': 'Invalid file type'}), 400
+        try:
+            upload = requested_upload(workdir)
+        except (upload_registry.UploadError, upload_registry.UnknownUpload) as e:
+            log_error("Upload not parsed", {"error": str(e)})
+            return upload_error(e)
+        except executor.ExecutorBusy as e:
+            return busy_response(e)
+        log_info("File parsed", {"filename": upload.filename, "handle": upload.handle})
+        data = upload.data()
+        features = data.get("features", [])
+        geometry_types = {}
+        for f in features:
+            geom_type = (f.get("geometry") or {}).get("type", "Unknown")
+            geometry_types[geom_type] = geometry_types.get(geom_type, 0) + 1
+        data["metadata"] = {
+            "total_features": len(features),
+            "geometry_types": geometry_types
+        }
+        data["handle"] = upload.handle
+        try:
+            precision, keys = geojson_writer.request_options()
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        if request.args.get('store', 'false').lower() == 'true':
             try:
-                conn = sqlite3.connect('data.db')
-                c = conn.cursor()
-                c.execute("INSERT INTO parsed_data (data) VALUES (?)", (json.dumps(data),))
-                conn.commit()
-                conn.close()
-                log_info("Data stored in DB", {"filename": filename})
+                dataset_id = feature_store.store_dataset(upload.data(), name=upload.filename)
+                log_info("Data stored in DB", {"filename": upload.filename, "dataset_id": dataset_id})
             except Exception as db_err:
                 log_error("Database insert failed", {"error": str(db_err)})
-        return jsonify(data), 200
+        response = geojson_writer.json_response(geojson_writer.encode_collection(data, precision=precision, keys=keys))
+        return with_handle(response, upload)
     except Exception as e:
         log_error("Unhandled exception in file parsing", {"error": str(e)})
         return jsonify({'error': 'Failed to parse the file. Ensure valid format and structure.'}), 500
-    finally:
-        if 'file_path' in locals() and os.path.exists(file_path):
-            os.remove(file_path)
-            log_info("Temporary file removed", {"file_path": file_path})
 
 @app.route('/upload', methods=['POST'])
 def upload_file():
@@ -374,274 +861,203 @@ def upload_file():
         description: Parsed data
       400:
         description: Upload or parsing error
+      413:
+        description: File or parsed layer too large
     """
     return parse_file()
 
 @app.route('/api/export', methods=['GET'])
 @require_api_key
 def export_data():
+    """
+    Export a stored dataset as GeoJSON, CSV, FlatGeobuf or GeoParquet.
+
+    The response is streamed, so server memory does not grow with the dataset.
+    Supports the same dataset/bbox/limit/offset selection as /api/zones.
+    """
     format = request.args.get('format', 'json')
     try:
-        conn = sqlite3.connect('data.db')
-        c = conn.cursor()
-        c.execute("SELECT data FROM parsed_data ORDER BY id DESC LIMIT 1")
-        row = c.fetchone()
-        conn.close()
-        if not row:
+        formats = exporters.export_formats()
+        if format not in formats:
+            log_error("Unsupported export format", {"format": format})
+            return jsonify({'error': f"Unsupported export format: {format}", 'formats': sorted(formats)}), 400
+        try:
+            bbox = parse_bbox(request.args['bbox']) if request.args.get('bbox') else None
+            limit = request.args.get('limit', type=int)
+            offset = request.args.get('offset', 0, type=int)
+            if (limit is not None and limit < 0) or offset < 0:
+                raise ValueError("limit and offset must be non-negative")
+            # Exports keep full precision unless asked otherwise
+            precision, keys = geojson_writer.request_options(default_precision=None)
+        except ValueError as e:
+            log_error("Invalid export query", {"error": str(e)})
+            return jsonify({'error': str(e)}), 400
+        dataset_id = requested_dataset_id()
+        if dataset_id is None or feature_store.get_dataset(dataset_id) is None:
             return jsonify({'error': 'No parsed data found'}), 404
-        parsed_data = json.loads(row[0])
-        if format == 'csv':
-            if not parsed_data.get('features') or not parsed_data['features'][0].get('properties'):
-                return jsonify({'error': 'No valid feature properties found for CSV export'}), 400
-            output = StringIO()
-            fields = list(parsed_data['features'][0]['properties'].keys())
-            writer = csv.DictWriter(output, fieldnames=fields)
-            writer.writeheader()
-            for feature in parsed_data['features']:
-                writer.writerow(feature.get('properties', {}))
-            response = Response(output.getvalue(), mimetype='text/csv')
-            response.headers.set('Content-Disposition', 'attachment', filename='parsed_data.csv')
-            return response
-        return Response(json.dumps(parsed_data), mimetype='application/json',
-                       headers={"Content-Disposition": "attachment;filename=parsed_data.json"})
+        page = {"bbox": bbox, "limit": limit, "offset": offset}
+
+        if format == 'json':
+            chunks = exporters.stream_geojson(dataset_id, precision=precision, keys=keys, **page)
+        else:
+            schema = feature_store.property_schema(dataset_id)
+            if format == 'csv':
+                if not schema:
+                    return jsonify({'error': 'No valid feature properties found for CSV export'}), 400
+                chunks = exporters.stream_csv(dataset_id, [key for key, _ in schema], **page)
+            elif format == 'fgb':
+                chunks = exporters.stream_file(exporters.write_flatgeobuf(dataset_id, schema, **page))
+            else:
+                chunks = exporters.stream_file(exporters.write_geoparquet(dataset_id, schema, **page))
+
+        mimetype, extension = formats[format]
+        log_info("Exporting dataset", {"dataset_id": dataset_id, "format": format, "bbox": bbox})
+        if format in ('json', 'csv'):
+            response = geojson_writer.streamed_response(chunks, mimetype=mimetype)
+        else:
+            response = Response(stream_with_context(chunks), mimetype=mimetype)
+        response.headers.set('Content-Disposition', 'attachment', filename=f'parsed_data.{extension}')
+        return response
     except Exception as e:
+        log_error("Export failed", {"format": format, "error": str(e)})
         return jsonify({'error': 'Export failed', 'details': str(e)}), 500
 
 @app.route('/api/metadata', methods=['POST'])
 @require_api_key
-def extract_metadata():
+@with_workspace('metadata')
+def extract_metadata(workdir):
     try:
-        if not request.files:
-            return jsonify({'error': 'No file uploaded'}), 400
-        filenames = {}
-        for ext in ('shp', 'shx', 'dbf'):
-            if f'{ext}' in request.files:
-                uploaded_file = request.files[ext]
-                new_name = f"uploaded.{ext}"
-                path = os.path.join(app.config['UPLOAD_FOLDER'], new_name)
-                uploaded_file.save(path)
-                filenames[ext] = path
-        if 'file' in request.files:
-            file = request.files['file']
-            filename = secure_filename(file.filename)
-            if not allowed_file(filename):
-                return jsonify({'error': 'Invalid file type'}), 400
-            file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-            file.save(file_path)
-            ext = filename.split('.')[-1].lower()
-            if ext == 'kml':
-                data = parse_kml(file_path)
-            elif ext == 'geojson':
-                data = parse_geojson(file_path)
-            elif ext == 'shp':
-                data = parse_shapefile(filenames.get('shp', 'uploaded.shp'))
-            else:
-                return jsonify({'error': 'Unsupported file type'}), 400
-        elif 'shp' in filenames:
-            data = parse_shapefile(filenames['shp'])
-        else:
-            return jsonify({'error': 'No valid GIS file provided'}), 400
-        metadata = {}
-        geometries = []
-        if data and isinstance(data, dict):
-            features = data.get("features", [])
-            total_features = len(features)
-            geometry_types = {}
-            for f in features:
-                geom = f.get("geometry")
-                if geom:
-                    try:
-                        shp = shape(geom)
-                        geometries.append(shp)
-                        geom_type = geom.get("type", "Unknown")
-                        geometry_types[geom_type] = geometry_types.get(geom_type, 0) + 1
-                    except Exception:
-                        pass
-            combined = unary_union(geometries) if geometries else None
-            bbox = combined.bounds if combined else None
-            centroid = list(combined.centroid.coords)[0] if combined else None
-            metadata = {
-                "total_features": total_features,
-                "geometry_types": geometry_types,
-                "bounding_box": bbox,
-                "centroid": centroid
-            }
-        return jsonify({"metadata": metadata}), 200
+        try:
+            upload = requested_upload(workdir)
+        except (upload_registry.UploadError, upload_registry.UnknownUpload) as e:
+            return upload_error(e)
+        summary = executor.run('geometry', metadata.summarize, upload.data().get("features", []))
+        return with_handle(jsonify({"metadata": summary, "handle": upload.handle}), upload), 200
+    except executor.ExecutorBusy as e:
+        return busy_response(e)
     except Exception as e:
         return jsonify({'error': f'Metadata extraction failed: {str(e)}'}), 500
-    finally:
-        for f in os.listdir(app.config['UPLOAD_FOLDER']):
-            if f.startswith("uploaded.") or f == filename:
-                try:
-                    os.remove(os.path.join(app.config['UPLOAD_FOLDER'], f))
-                except:
-                    pass
 
 @app.route('/api/metadata/csv', methods=['POST'])
 @require_api_key
-def export_metadata_csv():
+@with_workspace('metadata')
+def export_metadata_csv(workdir):
     try:
-        if 'file' not in request.files:
-            return jsonify({'error': 'No file uploaded'}), 400
-        file = request.files['file']
-        filename = secure_filename(file.filename)
-        if not allowed_file(filename):
-            return jsonify({'error': 'Invalid file type'}), 400
-        file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(file_path)
-        if filename.endswith('.kml'):
-            data = parse_kml(file_path)
-        elif filename.endswith('.geojson'):
-            data = parse_geojson(file_path)
-        elif filename.endswith('.shp'):
-            data = parse_shapefile(file_path)
-        else:
-            return jsonify({'error': 'Unsupported file type'}), 400
-        if not data or not isinstance(data, dict) or not data.get('features'):
+        try:
+            upload = requested_upload(workdir)
+        except (upload_registry.UploadError, upload_registry.UnknownUpload) as e:
+            return upload_error(e)
+        data = upload.data()
+        if not data.get('features'):
             return jsonify({'error': 'Invalid or empty GeoJSON data'}), 400
-        geometries = []
-        rows = []
-        for idx, f in enumerate(data.get("features", []), 1):
-            geom = f.get("geometry")
-            if geom:
-                try:
-                    shp = shape(geom)
-                    geometries.append(shp)
-                    rows.append({
-                        "feature_id": idx,
-                        "geometry_type": geom.get("type", "Unknown"),
-                        "centroid": list(shp.centroid.coords)[0] if shp.centroid.coords else None,
-                        "bbox": shp.bounds if shp.bounds else None
-                    })
-                except Exception as e:
-                    log_error("Failed to process geometry", {"feature_id": idx, "error": str(e)})
-        if not rows:
+        row_batches = (rows for rows in metadata.feature_rows(data["features"]) if rows)
+        first = next(row_batches, None)
+        if first is None:
             return jsonify({'error': 'No valid geometries found for CSV export'}), 400
-        output = StringIO()
-        writer = csv.DictWriter(output, fieldnames=["feature_id", "geometry_type", "centroid", "bbox"])
-        writer.writeheader()
-        for row in rows:
-            writer.writerow(row)
-        output.seek(0)
-        return send_file(output, mimetype='text/csv', as_attachment=True, download_name='metadata.csv')
+        response = geojson_writer.streamed_response(metadata.stream_csv(chain([first], row_batches)), mimetype='text/csv')
+        response.headers.set('Content-Disposition', 'attachment', filename='metadata.csv')
+        return with_handle(response, upload)
+    except executor.ExecutorBusy as e:
+        return busy_response(e)
     except Exception as e:
         return jsonify({'error': f'CSV metadata export failed: {str(e)}'}), 500
-    finally:
-        if 'file_path' in locals() and os.path.exists(file_path):
-            os.remove(file_path)
 
 @app.route('/api/preview/image', methods=['POST'])
 @require_api_key
-def generate_map_preview():
+@with_workspace('preview')
+def generate_map_preview(workdir):
     try:
-        if 'file' not in request.files:
-            return jsonify({'error': 'No file uploaded'}), 400
-        file = request.files['file']
-        filename = secure_filename(file.filename)
-        if not allowed_file(filename):
-            return jsonify({'error': 'Invalid file type'}), 400
-        file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(file_path)
-        if filename.endswith('.kml'):
-            data = parse_kml(file_path)
-        elif filename.endswith('.geojson'):
-            data = parse_geojson(file_path)
-        elif filename.endswith('.shp'):
-            data = parse_shapefile(file_path)
-        else:
-            return jsonify({'error': 'Unsupported file type'}), 400
-        geometries = []
-        if data and isinstance(data, dict):
-            for f in data.get("features", []):
-                geom = f.get("geometry")
-                if geom:
-                    try:
-                        shp = shape(geom)
-                        geometries.append(shp)
-                    except:
-                        continue
-        fig, ax = plt.subplots(figsize=(6, 6))
-        for geom in geometries:
-            x, y = geom.exterior.xy if hasattr(geom, "exterior") else geom.xy
-            ax.plot(x, y, linewidth=1)
-        ax.set_title("Geospatial Feature Preview")
-        ax.axis("equal")
-        ax.axis("off")
-        preview_path = os.path.join(app.config['UPLOAD_FOLDER'], 'preview.png')
-        fig.savefig(preview_path, bbox_inches='tight')
-        plt.close(fig)
-        return send_file(preview_path, mimetype='image/png', as_attachment=True, download_name='preview.png')
+        try:
+            width, height = preview_renderer.requested_size(request.args)
+            upload = requested_upload(workdir)
+        except (upload_registry.UploadError, upload_registry.UnknownUpload) as e:
+            return upload_error(e)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        png = executor.run('render', preview_renderer.cached_preview, upload.handle, upload.geometries, width, height)
+        buffer = BytesIO(png)
+        response = send_file(buffer, mimetype='image/png', as_attachment=True, download_name='preview.png')
+        return with_handle(response, upload)
+    except executor.ExecutorBusy as e:
+        return busy_response(e)
     except Exception as e:
         return jsonify({'error': f'Preview image generation failed: {str(e)}'}), 500
-    finally:
-        if 'file_path' in locals() and os.path.exists(file_path):
-            os.remove(file_path)
-        preview_path = os.path.join(app.config['UPLOAD_FOLDER'], 'preview.png')
-        if os.path.exists(preview_path):
-            os.remove(preview_path)
 
 @app.route('/api/visual-preview', methods=['POST'])
 @require_api_key
-def visual_preview():
+@with_workspace('preview')
+def visual_preview(workdir):
     try:
-        if 'file' not in request.files:
-            return jsonify({'error': 'No file uploaded'}), 400
-        file = request.files['file']
-        filename = secure_filename(file.filename)
-        ext = filename.split('.')[-1].lower()
-        if not allowed_file(filename):
-            return jsonify({'error': 'Invalid file type'}), 400
-        path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(path)
-        if ext == 'kml':
-            data = parse_kml(path)
-        elif ext == 'geojson':
-            data = parse_geojson(path)
-        elif ext == 'shp':
-            data = parse_shapefile(path)
-        else:
-            return jsonify({'error': 'Unsupported file type'}), 400
-        preview_features = []
-        for f in data.get("features", []):
-            geom = f.get("geometry")
-            if not geom:
-                continue
-            try:
-                shp = shape(geom).simplify(0.0001)
-                preview_features.append({
-                    "type": "Feature",
-                    "geometry": mapping(shp),
-                    "properties": {}
-                })
-            except:
-                continue
-        return jsonify({
-            "type": "FeatureCollection",
-            "features": preview_features
-        })
+        try:
+            precision, _ = geojson_writer.request_options()
+            tolerance = lod.requested_tolerance(request.args, PREVIEW_TOLERANCE)
+            upload = requested_upload(workdir)
+        except (upload_registry.UploadError, upload_registry.UnknownUpload) as e:
+            return upload_error(e)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        # Without zoom or tolerance the preview is simplified to exactly PREVIEW_TOLERANCE
+        levels = executor.run('geometry', lod.get_levels, upload.handle, upload.geometries, (PREVIEW_TOLERANCE,))
+        level, preview_geometries = levels.geometries(tolerance)
+        features = geojson_writer.encode_features(preview_geometries, [None] * len(preview_geometries), precision=precision)
+        response = geojson_writer.json_response(geojson_writer.collection_start() + b','.join(features) + b']}')
+        response.headers['X-LOD-Tolerance'] = repr(level)
+        return with_handle(response, upload)
+    except executor.ExecutorBusy as e:
+        return busy_response(e)
     except Exception as e:
         return jsonify({'error': f'Preview generation failed: {str(e)}'}), 500
-    finally:
-        if os.path.exists(path):
-            os.remove(path)
 
 @app.route('/')
 def serve_react_app():
-    return send_from_directory('dist', 'index.html')
+    return send_cached(DIST_FOLDER, 'index.html')
 
 @app.route('/<path:path>')
 def serve_static_files(path):
-    return send_from_directory('dist', path)
+    # Vite fingerprints everything under assets/, so those URLs never change content
+    return send_cached(DIST_FOLDER, path, immutable=path.startswith('assets/'))
 
 @app.route('/Uploads/<path:filename>')
 def serve_uploaded_file(filename):
     try:
-        return send_from_directory('Uploads', filename)
+        response = send_cached(UPLOAD_FOLDER, filename, immutable=filename.startswith('cas/'))
+        # Only files that exist; any unauthenticated URL would otherwise add an entry
+        janitor.touch(os.path.join(UPLOAD_FOLDER, filename))
+        return response
+    except RequestedRangeNotSatisfiable:
+        # The file exists; werkzeug's 416 carries the Content-Range the client needs
+        raise
     except Exception as e:
         log_error("Failed to serve file", {"filename": filename, "error": str(e)})
         return jsonify({"status": "error", "message": f"File not found: {filename}"}), 404
-    
+
+def warm_up():
+    """
+    Import every lazily loaded dependency and load the default restricted layer.
+
+    With PRELOAD=1 this runs at import time, so a pre-forking server that
+    imports the app once (gunicorn --preload) shares all of it with its
+    workers copy-on-write, and no request pays for a first import.
+    """
+    timings = lazy.preload()
+    try:
+        restricted_registry.get(DEFAULT_LAYER)
+    except Exception as e:
+        log_error("Failed to preload restricted layer", {"error": str(e)})
+    return timings
+
+setup_process()
+
+startup = {"import_seconds": round(time.perf_counter() - IMPORT_STARTED, 3), "preloaded": False}
+if os.getenv('PRELOAD', '0') == '1':
+    warm_up_started = time.perf_counter()
+    startup["preloaded"] = warm_up()
+    startup["warm_up_seconds"] = round(time.perf_counter() - warm_up_started, 3)
+startup["ready_seconds"] = round(time.perf_counter() - IMPORT_STARTED, 3)
+startup["peak_rss_bytes"] = metrics.peak_rss_bytes()
+log_info("Application ready", startup)
+metrics.register_collector(lambda: [('process_startup_seconds', 'gauge', 'Time from importing the app to ready',
+                                      [('process_startup_seconds', {}, startup["ready_seconds"])])])
+
 if __name__ == '__main__':
-    load_dotenv()
-    init_db()
     app.run(debug=True)
\ No newline at end of file
@@ -0,0 +1,77 @@
+# tests/conftest.py
+import os
+import shutil
+import sys
+import tempfile
+import pytest
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND)
+
+# Settings are read at import time, so they are fixed before the app is imported
+WORKDIR = tempfile.mkdtemp(prefix='backend_tests_')
+API_KEY = 'test-key'
+os.environ.update({
+    'API_KEY': API_KEY,
+    'DATABASE_PATH': os.path.join(WORKDIR, 'data.db'),
+    'UPLOAD_FOLDER': os.path.join(WORKDIR, 'Uploads'),
+    'LOG_FILE': os.path.join(WORKDIR, 'app.log'),
+    'ARTIFACT_JANITOR_INTERVAL': '3600'
+})
+
+
+def pytest_sessionfinish(session, exitstatus):
+    shutil.rmtree(WORKDIR, ignore_errors=True)
+
+
+@pytest.fixture(scope='session')
+def app():
+    import main
+    from utils.restricted_layers import registry, DEFAULT_LAYER
+    # The default layer path is relative to the backend's working directory
+    registry.register(DEFAULT_LAYER, os.path.join(BACKEND, '..', 'data', 'restricted_area.geojson'))
+    main.app.config['TESTING'] = True
+    return main.app
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+@pytest.fixture
+def headers():
+    return {'X-API-Key': API_KEY}
+
+@pytest.fixture
+def collection():
+    """A small FeatureCollection with one feature of each geometry kind and one without a geometry."""
+    return {
+        "type": "FeatureCollection",
+        "features": [
+            {"type": "Feature", "properties": {"name": "zone", "slope": 2.5},
+             "geometry": {"type": "Polygon", "coordinates": [[[75.0, 25.0], [75.01, 25.0], [75.01, 25.01],
+                                                              [75.0, 25.01], [75.0, 25.0]]]}},
+            {"type": "Feature", "properties": {"name": "road", "slope": 1.0},
+             "geometry": {"type": "LineString", "coordinates": [[75.02, 25.02], [75.03, 25.03]]}},
+            {"type": "Feature", "properties": {"name": "well", "slope": 0.5},
+             "geometry": {"type": "Point", "coordinates": [75.04, 25.04]}},
+            {"type": "Feature", "properties": {"name": "unplaced", "slope": 0.0}, "geometry": None}
+        ]
+    }
+
+@pytest.fixture
+def make_geotiff():
+    """Factory for the bytes of a single-band float32 GeoTIFF; ``seed`` varies the content."""
+    pytest.importorskip('rasterio')
+    from rasterio.io import MemoryFile
+    from rasterio.transform import Affine
+    import numpy as np
+
+    def make(seed=0, size=64, origin=(75.0, 25.0), resolution=0.0001):
+        data = np.random.default_rng(seed).uniform(0, 500, (size, size)).astype('float32')
+        profile = {'driver': 'GTiff', 'width': size, 'height': size, 'count': 1, 'dtype': 'float32',
+                   'crs': 'EPSG:4326', 'transform': Affine(resolution, 0, origin[0], 0, -resolution, origin[1])}
+        with MemoryFile() as memfile:
+            with memfile.open(**profile) as dst:
+                dst.write(data, 1)
+            return memfile.read()
+    return make
@@ -0,0 +1,49 @@
+# tests/test_db.py
+import threading
+from utils import db
+
+
+def run_in_thread(fn):
+    result = []
+    thread = threading.Thread(target=lambda: result.append(fn()))
+    thread.start()
+    thread.join()
+    return result[0]
+
+def test_connections_reused_across_threads(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, 'DB_PATH', str(tmp_path / 'pool.db'))
+    pool = db.ConnectionPool(size=2)
+    connections = [run_in_thread(lambda: id(pool.get())) for _ in range(5)]
+    assert len(set(connections)) == 1
+    assert pool.stats()["opened"] == 1 and pool.stats()["reused"] == 4
+
+def test_pooled_connection_keeps_pragmas(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, 'DB_PATH', str(tmp_path / 'pool.db'))
+    pool = db.ConnectionPool(size=2)
+    run_in_thread(pool.get)
+    conn = run_in_thread(pool.get)
+    assert conn.execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+    assert conn.execute('PRAGMA foreign_keys').fetchone()[0] == 1
+
+def test_open_transaction_rolled_back_on_thread_exit(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, 'DB_PATH', str(tmp_path / 'pool.db'))
+    pool = db.ConnectionPool(size=2)
+    run_in_thread(lambda: pool.get().execute('CREATE TABLE t (x)'))
+    run_in_thread(lambda: pool.get().execute('BEGIN') and pool.get().execute('INSERT INTO t VALUES (1)'))
+    conn = run_in_thread(pool.get)
+    assert not conn.in_transaction
+    assert conn.execute('SELECT count(*) FROM t').fetchone()[0] == 0
+
+def test_pool_keeps_at_most_size_idle(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, 'DB_PATH', str(tmp_path / 'pool.db'))
+    pool = db.ConnectionPool(size=1)
+    barrier = threading.Barrier(3)
+    def hold():
+        pool.get()
+        barrier.wait()
+    threads = [threading.Thread(target=hold) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert pool.stats()["opened"] == 3 and pool.stats()["idle"] == 1
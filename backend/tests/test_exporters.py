@@ -0,0 +1,23 @@
+# tests/test_exporters.py
+import pytest
+from utils import exporters, feature_store
+
+
+@pytest.mark.parametrize('format', ['json', 'csv', 'fgb', 'parquet'])
+def test_export_with_null_geometry(app, client, headers, collection, format):
+    if format not in exporters.export_formats():
+        pytest.skip(f"{format} writer not installed")
+    dataset_id = feature_store.store_dataset(collection)
+    response = client.get(f'/api/export?format={format}&dataset={dataset_id}', headers=headers)
+    assert response.status_code == 200
+    assert response.get_data()
+
+def test_flatgeobuf_keeps_features_without_geometry(app, client, headers, collection):
+    fiona = pytest.importorskip('fiona')
+    dataset_id = feature_store.store_dataset(collection)
+    response = client.get(f'/api/export?format=fgb&dataset={dataset_id}', headers=headers)
+    assert response.status_code == 200
+    with fiona.MemoryFile(response.get_data()) as memfile, memfile.open() as src:
+        records = list(src)
+    assert len(records) == len(collection["features"])
+    assert sum(1 for record in records if record.geometry is None) == 1
@@ -0,0 +1,55 @@
+# tests/test_feature_store.py
+import copy
+import json
+from utils import db, exporters, feature_store
+
+
+def test_content_hash_matches_stored_dataset(app, collection):
+    dataset_id = feature_store.store_dataset(collection)
+    stored = feature_store.get_dataset(dataset_id)["content_hash"]
+    assert stored == feature_store.content_hash(collection)
+    assert stored == feature_store.content_hash(feature_store.load_feature_collection(dataset_id))
+
+def test_content_hash_ignores_representation(collection):
+    reordered = copy.deepcopy(collection)
+    point = reordered["features"][2]
+    point["geometry"] = {"coordinates": [float(c) for c in point["geometry"]["coordinates"]], "type": "Point"}
+    point["properties"] = dict(reversed(list(point["properties"].items())))
+    assert feature_store.content_hash(reordered) == feature_store.content_hash(collection)
+    reordered["features"][0]["properties"]["slope"] = 3.0
+    assert feature_store.content_hash(reordered) != feature_store.content_hash(collection)
+
+def test_outdated_hashes_are_recomputed(app, collection):
+    dataset_id = feature_store.store_dataset(collection)
+    expected = feature_store.get_dataset(dataset_id)["content_hash"]
+    with db.transaction(immediate=True) as conn:
+        conn.execute("UPDATE datasets SET content_hash = 'stale', hash_version = 1 WHERE id = ?", (dataset_id,))
+    feature_store.init_store()
+    assert feature_store.get_dataset(dataset_id)["content_hash"] == expected
+
+def test_rtree_rows_point_at_their_features(app, collection):
+    first = feature_store.store_dataset(collection)
+    second = feature_store.store_dataset(collection)
+    conn = db.get_connection()
+    for dataset_id in (first, second):
+        ids = {row[0] for row in conn.execute("SELECT id FROM features WHERE dataset_id = ?", (dataset_id,))}
+        indexed = {row[0] for row in conn.execute(
+            "SELECT r.id FROM features_rtree r JOIN features f ON f.id = r.id WHERE f.dataset_id = ?", (dataset_id,))}
+        # Every feature with a geometry is indexed under its own id
+        assert indexed <= ids and len(indexed) == len(ids) - 1
+    bbox = (75.035, 25.035, 75.045, 25.045)
+    assert [f["properties"]["name"] for f in feature_store.iter_features(second, bbox=bbox)] == ["well"]
+
+def test_unbuildable_geometry_is_kept(app, collection):
+    broken = copy.deepcopy(collection)
+    # A ring of two positions: valid JSON, but Shapely cannot build it
+    ring = {"type": "Polygon", "coordinates": [[[75.0, 25.0], [75.1, 25.1]]]}
+    broken["features"][0]["geometry"] = ring
+    dataset_id = feature_store.store_dataset(broken)
+    assert feature_store.load_feature_collection(dataset_id)["features"][0]["geometry"] == ring
+    exported = json.loads(b''.join(exporters.stream_geojson(dataset_id)))
+    assert exported["features"][0]["geometry"] == ring
+    assert feature_store.get_dataset(dataset_id)["content_hash"] == feature_store.content_hash(broken)
+    other = copy.deepcopy(broken)
+    other["features"][0]["geometry"]["coordinates"][0][1] = [75.2, 25.2]
+    assert feature_store.content_hash(other) != feature_store.content_hash(broken)
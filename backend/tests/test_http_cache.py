@@ -0,0 +1,51 @@
+# tests/test_http_cache.py
+import os
+import pytest
+
+
+@pytest.fixture
+def artifact(app, tmp_path):
+    import main
+    path = tmp_path / 'artifact.bin'
+    path.write_bytes(bytes(range(256)) * 16)
+    published = main.artifact_store.publish(str(path))
+    return main.artifact_store.url(published), open(published, 'rb').read()
+
+def test_range_request(client, artifact):
+    url, content = artifact
+    response = client.get(url, headers={'Range': 'bytes=10-19'})
+    assert response.status_code == 206
+    assert response.data == content[10:20]
+    assert response.headers['Content-Range'] == f'bytes 10-19/{len(content)}'
+    assert response.headers['Accept-Ranges'] == 'bytes'
+
+def test_suffix_range(client, artifact):
+    url, content = artifact
+    response = client.get(url, headers={'Range': 'bytes=-100'})
+    assert response.status_code == 206
+    assert response.data == content[-100:]
+
+def test_unsatisfiable_range(client, artifact):
+    url, content = artifact
+    response = client.get(url, headers={'Range': f'bytes={len(content) + 10}-'})
+    assert response.status_code == 416
+
+def test_if_range_resumes_only_unchanged_content(client, artifact):
+    url, content = artifact
+    etag = client.get(url).headers['ETag']
+    resumed = client.get(url, headers={'Range': 'bytes=100-', 'If-Range': etag})
+    assert resumed.status_code == 206 and resumed.data == content[100:]
+    stale = client.get(url, headers={'Range': 'bytes=100-', 'If-Range': '"stale"'})
+    assert stale.status_code == 200 and stale.data == content
+
+def test_range_on_mutable_upload(app, client):
+    import main
+    path = os.path.join(main.UPLOAD_FOLDER, 'range-test.txt')
+    with open(path, 'wb') as f:
+        f.write(b'0123456789')
+    try:
+        response = client.get('/Uploads/range-test.txt', headers={'Range': 'bytes=2-4'})
+        assert response.status_code == 206 and response.data == b'234'
+        assert response.headers['Cache-Control'] == 'no-cache'
+    finally:
+        os.remove(path)
@@ -0,0 +1,90 @@
+# tests/test_janitor.py
+import json
+import os
+import sqlite3
+import pytest
+from utils.janitor import ArtifactJanitor
+
+
+def test_setup_runs_on_import(app):
+    import main
+    assert main.janitor._thread is not None and main.janitor._thread.is_alive()
+    tables = {row[0] for row in sqlite3.connect(main.db.DB_PATH).execute("SELECT name FROM sqlite_master")}
+    assert {'parsed_data', 'datasets', 'features'} <= tables
+
+@pytest.fixture
+def merged_dem(tmp_path):
+    """A CAS artifact hard-linked to input/merged_dem.tif, old enough to be evicted."""
+    cas_path = tmp_path / 'cas' / 'ab' / 'abcd.tif'
+    installed = tmp_path / 'input' / 'merged_dem.tif'
+    cas_path.parent.mkdir(parents=True)
+    installed.parent.mkdir()
+    cas_path.write_bytes(b'\0' * 4096)
+    os.link(cas_path, installed)
+    for path in (cas_path, installed):
+        os.utime(path, (1, 1))
+    return str(cas_path), str(installed)
+
+def test_hard_links_count_once(tmp_path, merged_dem):
+    janitor = ArtifactJanitor(str(tmp_path), quota=4096)
+    assert janitor.stats()["bytes"] == 4096
+    assert janitor.sweep() == 0
+
+def test_pinned_merge_result_keeps_installed_dem(tmp_path, merged_dem):
+    janitor = ArtifactJanitor(str(tmp_path), quota=0)
+    janitor.add_pin_source(lambda: merged_dem)
+    assert janitor.sweep() == 0
+    assert all(os.path.exists(path) for path in merged_dem)
+
+def test_unpinned_artifacts_are_evicted(tmp_path, merged_dem):
+    janitor = ArtifactJanitor(str(tmp_path), quota=0)
+    assert janitor.sweep() == 2
+    assert not any(os.path.exists(path) for path in merged_dem)
+
+def test_merge_cache_pins_installed_dem(app):
+    import main
+    folder = os.path.join(main.UPLOAD_FOLDER, 'input')
+    result = {'status': 'success', 'merged_dem': os.path.join(main.UPLOAD_FOLDER, 'cas', 'ab', 'abcd.tif'),
+              'preview': None, 'interactive': None, 'slope_map': None}
+    main.merge_cache.put(('hash', folder), result)
+    try:
+        pinned = {os.path.abspath(path) for path in main.pinned_artifacts() if path}
+        assert os.path.abspath(os.path.join(folder, 'merged_dem.tif')) in pinned
+    finally:
+        main.merge_cache.pop(('hash', folder))
+
+def test_upload_paths_share_one_root(app):
+    import main
+    root = os.path.abspath(os.environ['UPLOAD_FOLDER'])
+    assert main.artifact_store.root == main.janitor.root == root
+    for path in (app.config['UPLOAD_FOLDER'], main.RISK_SURFACE_PATH, main.artifact_store.cas_dir):
+        assert os.path.commonpath([root, path]) == root
+
+def test_pins_of_other_processes_are_kept(tmp_path, merged_dem):
+    (tmp_path / 'pins').mkdir()
+    (tmp_path / 'pins' / '999999.json').write_text(json.dumps(list(merged_dem)))
+    janitor = ArtifactJanitor(str(tmp_path), quota=0)
+    assert janitor.sweep() == 0
+    assert all(os.path.exists(path) for path in merged_dem)
+
+def test_pins_of_stopped_processes_expire(tmp_path, merged_dem):
+    pin_file = tmp_path / 'pins' / '999999.json'
+    pin_file.parent.mkdir()
+    pin_file.write_text(json.dumps(list(merged_dem)))
+    os.utime(pin_file, (1, 1))
+    janitor = ArtifactJanitor(str(tmp_path), quota=0)
+    assert janitor.sweep() == 2
+    assert not pin_file.exists()
+
+def test_publish_pins_writes_own_pins(tmp_path, merged_dem):
+    janitor = ArtifactJanitor(str(tmp_path))
+    janitor.add_pin_source(lambda: merged_dem)
+    janitor.publish_pins()
+    published = json.loads((tmp_path / 'pins' / f'{os.getpid()}.json').read_text())
+    assert set(published) == {os.path.abspath(path) for path in merged_dem}
+
+def test_missing_files_are_not_touched(app, client):
+    import main
+    response = client.get('/Uploads/does-not-exist.txt')
+    assert response.status_code == 404
+    assert os.path.join(main.UPLOAD_FOLDER, 'does-not-exist.txt') not in main.janitor._access
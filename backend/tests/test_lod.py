@@ -0,0 +1,29 @@
+# tests/test_lod.py
+import io
+import json
+import numpy as np
+import shapely
+from utils import lod
+
+
+def post_preview(client, headers, collection, query=''):
+    # Distinct content, so the registry does not hand back another test's upload
+    collection = dict(collection, name='lod')
+    return client.post('/api/visual-preview' + query, headers=headers, content_type='multipart/form-data',
+                       data={'file': (io.BytesIO(json.dumps(collection).encode()), 'layer.geojson')})
+
+def test_default_preview_uses_preview_tolerance(app, client, headers, collection):
+    import main
+    response = post_preview(client, headers, collection)
+    assert response.status_code == 200
+    assert float(response.headers['X-LOD-Tolerance']) == main.PREVIEW_TOLERANCE
+
+def test_zoom_preview_uses_zoom_level(app, client, headers, collection):
+    response = post_preview(client, headers, collection, '?zoom=14')
+    assert float(response.headers['X-LOD-Tolerance']) == lod.tolerance_for_zoom(14)
+
+def test_extra_tolerance_is_a_level():
+    line = shapely.LineString(np.column_stack([np.linspace(0, 1, 1000), np.sin(np.linspace(0, 30, 1000)) * 1e-3]))
+    levels = lod.LevelsOfDetail([line], extra_tolerances=(0.0001,))
+    assert levels.level_for(0.0001) == 0.0001
+    assert levels.vertices[0.0001] <= levels.vertices[lod.tolerance_for_zoom(14)]
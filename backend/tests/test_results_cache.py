@@ -0,0 +1,38 @@
+# tests/test_results_cache.py
+import pytest
+from utils import feature_store, results_store
+
+
+@pytest.fixture
+def dataset_id(collection):
+    return feature_store.store_dataset(collection)
+
+def analyze(client, headers, dataset_id, **kwargs):
+    return client.get(f'/api/analyze?dataset={dataset_id}', headers={**headers, **kwargs})
+
+def test_etag_and_not_modified(app, client, headers, dataset_id):
+    first = analyze(client, headers, dataset_id)
+    assert first.status_code == 200 and first.headers['ETag']
+    again = analyze(client, headers, dataset_id, **{'If-None-Match': first.headers['ETag']})
+    assert again.status_code == 304
+    assert not again.get_data()
+
+def test_model_version_invalidates_results(app, client, headers, dataset_id, monkeypatch):
+    import main
+    first = analyze(client, headers, dataset_id)
+    calls = []
+    monkeypatch.setattr(main, 'risk_scores', lambda data, layer: calls.append(data) or [0.0] * len(data["features"]))
+
+    # Same version: served from the results store
+    assert analyze(client, headers, dataset_id).get_json()["scores"] == first.get_json()["scores"]
+    assert not calls
+
+    monkeypatch.setattr(main, 'RISK_MODEL_VERSION', main.RISK_MODEL_VERSION + 1)
+    changed = analyze(client, headers, dataset_id, **{'If-None-Match': first.headers['ETag']})
+    assert changed.status_code == 200
+    assert len(calls) == 1
+    assert changed.headers['ETag'] != first.headers['ETag']
+
+def test_key_includes_version():
+    params = {"weight": 1}
+    assert results_store.result_key('risk', 1, 'd', 'l', params) != results_store.result_key('risk', 2, 'd', 'l', params)
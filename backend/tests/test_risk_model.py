@@ -0,0 +1,34 @@
+# tests/test_risk_model.py
+import numpy as np
+import shapely
+from analysis.risk_model import nearest_distances
+
+
+def random_polygons(rng, count, size, extent):
+    centres = rng.uniform(0, extent, (count, 2))
+    return shapely.buffer(shapely.points(centres), rng.uniform(size / 4, size, count), quad_segs=4)
+
+def test_nearest_distances_match_brute_force():
+    rng = np.random.default_rng(0)
+    geoms = np.concatenate([random_polygons(rng, 300, 50, 10000), [None, shapely.Polygon()]])
+    restricted = random_polygons(rng, 100, 250, 10000)
+    cutoff = 2000
+    expected = np.array([shapely.distance(g, restricted).min() if g is not None and not g.is_empty else np.inf
+                         for g in geoms])
+    expected[expected > cutoff] = np.inf
+    np.testing.assert_array_equal(nearest_distances(geoms, shapely.STRtree(restricted), cutoff), expected)
+
+def test_feature_geometries_fall_back_per_feature():
+    from utils.geometry import feature_geometries
+    features = [
+        {"geometry": {"type": "Polygon", "coordinates": [[[0, 0], [1, 0], [1, 1], [0, 0]]]}},
+        {"geometry": {"type": "Polygon", "coordinates": [[[0, 0, 5], [1, 0, 5], [1, 1, 5], [0, 0, 5]]]}},
+        {"geometry": {"type": "LineString", "coordinates": [[0, 0], [1]]}},
+        {"geometry": {"type": "LineString", "coordinates": [["0.5", 0], [1, 1]]}},
+        {"geometry": None}
+    ]
+    geoms = feature_geometries(features)
+    assert shapely.equals(geoms[0], shapely.Polygon([(0, 0), (1, 0), (1, 1)]))
+    assert shapely.has_z(geoms[1])
+    assert geoms[2] is None and geoms[4] is None
+    assert shapely.get_coordinates(geoms[3]).tolist() == [[0.5, 0.0], [1.0, 1.0]]
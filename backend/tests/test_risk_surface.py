@@ -0,0 +1,49 @@
+# tests/test_risk_surface.py
+import math
+import numpy as np
+import pytest
+
+
+def tile_at(lon, lat, z):
+    n = 2 ** z
+    y = (1 - math.asinh(math.tan(math.radians(lat))) / math.pi) / 2 * n
+    return int((lon + 180) / 360 * n), int(y)
+
+def test_surface_is_published_by_content(app, client, headers, make_geotiff, tmp_path):
+    dem_path = tmp_path / 'dem.tif'
+    dem_path.write_bytes(make_geotiff(seed=5, size=256, origin=(76.99, 28.61), resolution=0.001))
+    responses = [client.post('/api/risk-surface', headers=headers, json={"dem_path": str(dem_path)})
+                 for _ in range(2)]
+    assert all(response.status_code == 200 for response in responses)
+    first, second = (response.get_json() for response in responses)
+    assert first["surface"] == second["surface"]
+    assert first["geotiff"] == f'/Uploads/cas/{first["surface"][:2]}/{first["surface"]}.tif'
+    assert client.get(first["geotiff"]).status_code == 200
+
+    x, y = tile_at(77.05, 28.55, 10)
+    tile = client.get(first["tiles"].format(z=10, x=x, y=y))
+    assert tile.status_code == 200 and tile.mimetype == 'image/png'
+    assert client.get(f'/api/risk-surface/{"0" * 64}/tiles/10/{x}/{y}.png').status_code == 404
+    assert client.get(f'/api/risk-surface/tiles/10/{x}/{y}.png').status_code == 200
+
+def test_surface_slope_on_geographic_dem(app, tmp_path):
+    """A plane rising 3 cm per metre east and 4 cm per metre north has a 5% slope everywhere."""
+    rasterio = pytest.importorskip('rasterio')
+    from rasterio.transform import Affine
+    from analysis.risk_model import SLOPE_WEIGHT
+    from analysis.risk_surface import METERS_PER_DEGREE, build_risk_surface
+    size, resolution, west, north = 32, 0.001, 75.0, 25.0
+    x = np.arange(size) * resolution * METERS_PER_DEGREE * math.cos(math.radians(north))
+    y = -np.arange(size) * resolution * METERS_PER_DEGREE
+    elevation = (0.03 * x[None, :] + 0.04 * y[:, None] + 500).astype('float32')
+    dem_path = tmp_path / 'plane.tif'
+    with rasterio.open(dem_path, 'w', driver='GTiff', width=size, height=size, count=1, dtype='float32',
+                       crs='EPSG:4326', transform=Affine(resolution, 0, west, 0, -resolution, north)) as dst:
+        dst.write(elevation, 1)
+
+    # The restricted layer is hundreds of kilometres away, so only the slope term remains
+    surface_path = build_risk_surface(str(dem_path), str(tmp_path / 'surface.tif'))
+    with rasterio.open(surface_path) as src:
+        risk = src.read(1)
+    expected = SLOPE_WEIGHT * math.degrees(math.atan(0.05))
+    np.testing.assert_allclose(risk, expected, rtol=0.01)
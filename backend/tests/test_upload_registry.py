@@ -0,0 +1,78 @@
+# tests/test_upload_registry.py
+import io
+import json
+import os
+import pytest
+from utils import upload_registry
+from utils.cache import LRUCache
+
+ENDPOINTS = ['/api/parse', '/api/metadata', '/api/metadata/csv', '/api/preview/image', '/api/visual-preview']
+
+
+def test_oversize_value_does_not_flush_cache():
+    cache = LRUCache(max_bytes=10, sizeof=len)
+    cache.put('a', b'12345')
+    cache.put('big', b'x' * 11)
+    assert 'a' in cache and 'big' not in cache
+    assert cache.stats()["rejected"] == 1 and cache.stats()["evictions"] == 0
+
+def test_layer_larger_than_cache_is_rejected(app, client, headers, collection, monkeypatch):
+    monkeypatch.setattr(upload_registry.registry.cache, 'max_bytes', 100)
+    cached = len(upload_registry.registry.cache)
+    # Content no other test uploads, so no layer written earlier can answer for it
+    content = json.dumps(dict(collection, name='oversize')).encode()
+    response = client.post('/api/parse', headers=headers, content_type='multipart/form-data',
+                           data={'file': (io.BytesIO(content), 'layer.geojson')})
+    assert response.status_code == 413
+    assert 'upload cache' in response.get_json()["error"]
+    assert len(upload_registry.registry.cache) == cached
+
+def test_handle_resolves_after_parse(app, client, headers, collection):
+    response = client.post('/api/parse', headers=headers, content_type='multipart/form-data',
+                           data={'file': (io.BytesIO(json.dumps(collection).encode()), 'layer.geojson')})
+    assert response.status_code == 200
+    handle = response.get_json()["handle"]
+    assert client.post('/api/metadata', headers=headers, data={'handle': handle}).status_code == 200
+
+@pytest.mark.parametrize('endpoint', ENDPOINTS)
+def test_file_size_limit_on_every_entry_point(app, client, headers, collection, monkeypatch, endpoint):
+    content = json.dumps(collection).encode()
+    monkeypatch.setattr(upload_registry.registry, 'max_file_size', len(content) - 1)
+    response = client.post(endpoint, headers=headers, content_type='multipart/form-data',
+                           data={'file': (io.BytesIO(content), 'layer.geojson')})
+    assert response.status_code == 413
+    assert 'too large' in response.get_json()["error"]
+
+class Storage:
+    """The part of werkzeug's FileStorage that register reads."""
+
+    def __init__(self, content, filename):
+        self.stream = io.BytesIO(content)
+        self.filename = filename
+
+def test_handle_resolves_in_another_process(collection, tmp_path):
+    directory = str(tmp_path / 'layers')
+    content = json.dumps(dict(collection, name='shared')).encode()
+    workdir = tmp_path / 'work'
+    workdir.mkdir()
+    upload = upload_registry.UploadRegistry(directory=directory).register(
+        {'file': Storage(content, 'layer.geojson')}, str(workdir))
+    # A second registry has its own empty cache, like another worker process
+    other = upload_registry.UploadRegistry(directory=directory)
+    resolved = other.get(upload.handle)
+    assert resolved.filename == 'layer.geojson' and resolved.data() == upload.data()
+    assert len(resolved.geometries()) == len(upload.geometries())
+    with pytest.raises(upload_registry.UnknownUpload):
+        other.get('../' + upload.handle)
+
+def test_stored_layer_expires(collection, tmp_path):
+    directory = str(tmp_path / 'layers')
+    workdir = tmp_path / 'work'
+    workdir.mkdir()
+    upload = upload_registry.UploadRegistry(directory=directory).register(
+        {'file': Storage(json.dumps(collection).encode(), 'layer.geojson')}, str(workdir))
+    other = upload_registry.UploadRegistry(directory=directory, ttl=60)
+    os.utime(other._path(upload.handle), (1, 1))
+    with pytest.raises(upload_registry.UnknownUpload):
+        other.get(upload.handle)
+    assert not os.path.exists(other._path(upload.handle))
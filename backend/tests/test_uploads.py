@@ -0,0 +1,83 @@
+# tests/test_uploads.py
+import glob
+import hashlib
+import io
+import os
+
+
+def upload_tif(client, headers, content, filename):
+    return client.post('/upload-tif', headers=headers,
+                       data={'file': (io.BytesIO(content), filename)}, content_type='multipart/form-data')
+
+def stored_tiles(app):
+    return glob.glob(os.path.join(app.config['UPLOAD_FOLDER'], '*.tif'))
+
+def test_reupload_keeps_one_copy(app, client, headers, make_geotiff):
+    content = make_geotiff(seed=1)
+    first = upload_tif(client, headers, content, 'tile.tif')
+    assert first.status_code == 200
+    before = stored_tiles(app)
+    for filename in ('tile.tif', 'renamed.tif'):
+        response = upload_tif(client, headers, content, filename)
+        assert response.status_code == 200
+        assert response.get_json()["filename"] == first.get_json()["filename"]
+    assert stored_tiles(app) == before
+
+def test_new_version_replaces_tile_with_same_name(app, client, headers, make_geotiff):
+    old = upload_tif(client, headers, make_geotiff(seed=2), 'same.tif').get_json()["filename"]
+    other = upload_tif(client, headers, make_geotiff(seed=5), 'other.tif').get_json()["filename"]
+    new = upload_tif(client, headers, make_geotiff(seed=3), 'same.tif').get_json()["filename"]
+    assert new != old
+    assert not os.path.exists(os.path.join(app.config['UPLOAD_FOLDER'], old))
+    assert all(os.path.exists(os.path.join(app.config['UPLOAD_FOLDER'], name)) for name in (new, other))
+
+def test_invalid_tif_is_not_stored(app, client, headers):
+    before = stored_tiles(app)
+    response = upload_tif(client, headers, b'not a tiff', 'broken.tif')
+    assert response.status_code == 400
+    assert stored_tiles(app) == before
+
+def test_chunked_upload_resumes_missing_parts(app, client, headers, make_geotiff):
+    content = make_geotiff(seed=4, size=600)
+    part_size = 1024 * 1024
+    response = client.post('/upload-tif/uploads', headers=headers, json={
+        "filename": "large.tif", "size": len(content), "part_size": part_size,
+        "sha256": hashlib.sha256(content).hexdigest()})
+    assert response.status_code == 201
+    upload = response.get_json()
+    assert upload["part_count"] == 2
+
+    def put_part(index):
+        return client.put(f'/upload-tif/uploads/{upload["upload_id"]}/parts/{index}', headers=headers,
+                          data=content[index * part_size:(index + 1) * part_size])
+
+    # The connection drops after part 1; the client asks what is missing and resends only that
+    assert put_part(1).status_code == 200
+    assert client.post(f'/upload-tif/uploads/{upload["upload_id"]}/complete', headers=headers).status_code == 400
+    status = client.get(f'/upload-tif/uploads/{upload["upload_id"]}', headers=headers).get_json()
+    assert status["received"] == [1] and status["missing"] == [0]
+    assert put_part(0).status_code == 200
+
+    response = client.post(f'/upload-tif/uploads/{upload["upload_id"]}/complete', headers=headers)
+    assert response.status_code == 200
+    completed = response.get_json()
+    assert completed["sha256"] == hashlib.sha256(content).hexdigest()
+    with open(os.path.join(app.config['UPLOAD_FOLDER'], completed["filename"]), 'rb') as f:
+        assert f.read() == content
+
+    # The same file again through /upload-tif is recognised as already stored
+    again = upload_tif(client, headers, content, 'large.tif')
+    assert again.get_json()["filename"] == completed["filename"]
+
+def test_failed_resend_unmarks_part(app, client, headers, make_geotiff):
+    content = make_geotiff(seed=6, size=600)
+    part_size = 1024 * 1024
+    upload = client.post('/upload-tif/uploads', headers=headers, json={
+        "filename": "resent.tif", "size": len(content), "part_size": part_size}).get_json()
+    url = f'/upload-tif/uploads/{upload["upload_id"]}'
+    assert client.put(f'{url}/parts/1', headers=headers, data=content[part_size:]).status_code == 200
+    # The resend is cut short after overwriting the start of the part
+    assert client.put(f'{url}/parts/1', headers=headers, data=b'\0' * 1000).status_code == 400
+    assert client.get(url, headers=headers).get_json()["received"] == []
+    assert client.put(f'{url}/parts/0', headers=headers, data=content[:part_size]).status_code == 200
+    assert client.post(f'{url}/complete', headers=headers).status_code == 400
@@ -1,18 +1,23 @@
-import rasterio
 import os
 import numpy as np
-from scipy import ndimage
-import matplotlib.pyplot as plt
-import matplotlib.colors as mcolors
+from utils.lazy import lazy_import, pyplot as plt
 
-def generate_slope_map(dem_path, out_path='uploads/slope_map_colored.png'):
+rasterio = lazy_import('rasterio')
+mcolors = lazy_import('matplotlib.colors')
+
+def slope_degrees(elevation, res_x, res_y):
+    """Slope in degrees from an elevation array and the raster resolution."""
+    # Axis 0 runs along rows, so its spacing is the y resolution
+    y, x = np.gradient(elevation, res_y, res_x)
+    slope = np.sqrt(x**2 + y**2)
+    return np.arctan(slope) * (180 / np.pi)
+
+def generate_slope_map(dem_path, out_path='Uploads/slope_map_colored.png'):
     with rasterio.open(dem_path) as src:
         elevation = src.read(1).astype('float64')
         if np.all(elevation == src.nodata) or np.isnan(elevation).all():
             raise ValueError("Input DEM contains only nodata or NaN values")
-        x, y = np.gradient(elevation, src.res[0], src.res[1])
-        slope = np.sqrt(x**2 + y**2)
-        slope = np.arctan(slope) * (180 / np.pi)
+        slope = slope_degrees(elevation, src.res[0], src.res[1])
 
         norm = mcolors.Normalize(vmin=0, vmax=np.percentile(slope, 98))
         cmap = plt.get_cmap('viridis')
@@ -0,0 +1,146 @@
+# utils/artifacts.py
+import glob
+import hashlib
+import os
+import shutil
+import tempfile
+import uuid
+from contextlib import contextmanager
+from utils.logging import log_error, log_info
+
+# Every upload, workspace and published artifact lives under this one directory
+ARTIFACT_ROOT = os.path.abspath(os.getenv(
+    'UPLOAD_FOLDER', os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'Uploads')))
+URL_PREFIX = '/Uploads'
+HASH_BUFFER = 1024 * 1024
+
+
+class ArtifactStore:
+    """
+    Concurrency-safe file outputs under ``root``.
+
+    Each job writes into its own ``workspace`` (``<root>/jobs/<unique>``), so
+    concurrent requests never share a path. Finished files are ``publish``ed
+    into ``<root>/cas/<2 hex>/<sha256><ext>`` with an atomic rename; the name
+    is derived from the content, so a URL always refers to the same bytes and
+    two jobs producing the same output share one file.
+    """
+
+    def __init__(self, root=ARTIFACT_ROOT, url_prefix=URL_PREFIX):
+        self.root = root
+        self.url_prefix = url_prefix
+        self.jobs_dir = os.path.join(root, 'jobs')
+        self.cas_dir = os.path.join(root, 'cas')
+
+    @contextmanager
+    def workspace(self, prefix='job'):
+        """A private directory for one job, removed when the block exits."""
+        os.makedirs(self.jobs_dir, exist_ok=True)
+        path = tempfile.mkdtemp(prefix=f'{prefix}_', dir=self.jobs_dir)
+        try:
+            yield path
+        finally:
+            shutil.rmtree(path, ignore_errors=True)
+
+    def publish(self, path, suffix=None):
+        """
+        Move ``path`` into the content-addressed store and return its new path.
+
+        ``suffix`` defaults to the file's extension. If the content is already
+        stored, the existing file is kept and ``path`` is removed.
+        """
+        digest = file_sha256(path)
+        suffix = os.path.splitext(path)[1] if suffix is None else suffix
+        directory = os.path.join(self.cas_dir, digest[:2])
+        os.makedirs(directory, exist_ok=True)
+        target = os.path.join(directory, digest + suffix)
+        if os.path.exists(target):
+            os.remove(path)
+        else:
+            # Workspaces live under the same root, so this is an atomic rename
+            os.replace(path, target)
+            log_info("Published artifact", {"path": target})
+        return target
+
+    def url(self, path):
+        """Public URL of a file under the root."""
+        relative = os.path.relpath(path, self.root).replace(os.sep, '/')
+        return f'{self.url_prefix}/{relative}'
+
+    def path_for_url(self, url):
+        """Inverse of ``url``; None for URLs outside the store."""
+        if not url or not url.startswith(self.url_prefix + '/'):
+            return None
+        return os.path.join(self.root, *url[len(self.url_prefix) + 1:].split('/'))
+
+    def install(self, path, target):
+        """Atomically make ``target`` a copy (hard link where possible) of ``path``."""
+        # rename() between two links to the same file is a no-op that leaves the source behind
+        if os.path.exists(target) and os.path.samefile(path, target):
+            return target
+        tmp_path = f'{target}.{uuid.uuid4().hex}.tmp'
+        try:
+            os.link(path, tmp_path)
+        except OSError:
+            shutil.copyfile(path, tmp_path)
+        os.replace(tmp_path, target)
+        return target
+
+
+@contextmanager
+def atomic_path(path):
+    """
+    Yield a temporary path next to ``path`` and rename it into place on success.
+
+    Readers see either the previous file or the complete new one, and
+    concurrent writers never write to the same temporary file.
+    """
+    root, ext = os.path.splitext(path)
+    # Keep the extension so format-sniffing writers (GDAL, matplotlib) still work
+    tmp_path = f'{root}.{uuid.uuid4().hex}.tmp{ext}'
+    try:
+        yield tmp_path
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            try:
+                os.remove(tmp_path)
+            except OSError as e:
+                log_error("Failed to remove temporary file", {"file": tmp_path, "error": str(e)})
+        raise
+
+def store_upload(path, dest_dir, filename, digest=None):
+    """
+    Move an uploaded file into ``dest_dir`` and return its new path.
+
+    The name carries the content hash (``name-<16 hex>.ext``). A new version
+    of ``filename`` replaces the one stored before it, as overwriting the file
+    did, so a corrected tile is not merged alongside the old one. If the same
+    content is already stored, under any name, ``path`` is removed and the
+    existing file returned, so re-uploading a tile does not add a second copy.
+    """
+    digest = digest or file_sha256(path)
+    stem, ext = os.path.splitext(filename)
+    versions = glob.glob(os.path.join(glob.escape(dest_dir), f'{glob.escape(stem)}-{"[0-9a-f]" * 16}{glob.escape(ext)}'))
+    for previous in versions:
+        if not previous.endswith(f'-{digest[:16]}{ext}'):
+            os.remove(previous)
+            log_info("Replaced earlier upload", {"path": previous})
+    existing = glob.glob(os.path.join(glob.escape(dest_dir), f'*-{digest[:16]}{ext}'))
+    if existing:
+        os.remove(path)
+        log_info("Upload already stored", {"path": existing[0]})
+        return existing[0]
+    target = os.path.join(dest_dir, f'{stem}-{digest[:16]}{ext}')
+    os.replace(path, target)
+    return target
+
+def file_sha256(path):
+    hasher = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(HASH_BUFFER), b''):
+            hasher.update(block)
+    return hasher.hexdigest()
+
+
+store = ArtifactStore()
@@ -0,0 +1,142 @@
+# utils/cache.py
+import threading
+import time
+from collections import OrderedDict
+
+_MISSING = object()
+
+
+class LRUCache:
+    """
+    Thread-safe LRU cache with optional entry count, byte size and TTL limits.
+
+    ``sizeof(value)`` gives an entry's size in bytes when ``max_bytes`` is set;
+    a value larger than ``max_bytes`` on its own is not stored, rather than
+    evicting every other entry and then itself.
+    ``on_evict(key, value)`` is called for entries dropped by a limit or by
+    expiry (not for ``pop``/``clear``). ``stats()`` reports hits, misses,
+    evictions and current usage.
+    """
+
+    def __init__(self, max_entries=None, max_bytes=None, ttl=None, sizeof=None, on_evict=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.sizeof = sizeof or (lambda value: 0)
+        self.on_evict = on_evict
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.rejected = 0
+
+    def get(self, key, default=None):
+        evicted = []
+        with self._lock:
+            entry = self._entries.get(key, _MISSING)
+            if entry is not _MISSING and self.ttl is not None and time.monotonic() - entry[2] > self.ttl:
+                evicted.append((key, self._remove(key)))
+                entry = _MISSING
+            if entry is _MISSING:
+                self.misses += 1
+                value = default
+            else:
+                self.hits += 1
+                self._entries.move_to_end(key)
+                value = entry[0]
+        self._notify(evicted)
+        return value
+
+    def put(self, key, value):
+        size = self.sizeof(value)
+        evicted = []
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            if self.max_bytes is not None and size > self.max_bytes:
+                self.rejected += 1
+                return value
+            self._entries[key] = (value, size, time.monotonic())
+            self._bytes += size
+            while self._entries and self._over_limit():
+                oldest = next(iter(self._entries))
+                evicted.append((oldest, self._remove(oldest)))
+        self._notify(evicted)
+        return value
+
+    def pop(self, key, default=None):
+        with self._lock:
+            if key not in self._entries:
+                return default
+            return self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def expire(self):
+        """Drop entries older than the TTL; returns how many were dropped."""
+        if self.ttl is None:
+            return 0
+        now = time.monotonic()
+        with self._lock:
+            expired = [key for key, entry in self._entries.items() if now - entry[2] > self.ttl]
+            evicted = [(key, self._remove(key)) for key in expired]
+        self._notify(evicted)
+        return len(evicted)
+
+    def values(self):
+        """Snapshot of the cached values, least recently used first."""
+        with self._lock:
+            return [entry[0] for entry in self._entries.values()]
+
+    def items(self):
+        """Snapshot of the cached (key, value) pairs, least recently used first."""
+        with self._lock:
+            return [(key, entry[0]) for key, entry in self._entries.items()]
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+                "evictions": self.evictions,
+                "rejected": self.rejected
+            }
+
+    def _over_limit(self):
+        if self.max_entries is not None and len(self._entries) > self.max_entries:
+            return True
+        return self.max_bytes is not None and self._bytes > self.max_bytes
+
+    def _remove(self, key):
+        value, size, _ = self._entries.pop(key)
+        self._bytes -= size
+        return value
+
+    def _notify(self, evicted):
+        if not evicted:
+            return
+        with self._lock:
+            self.evictions += len(evicted)
+        # Callbacks run outside the lock so they may use the cache themselves
+        if self.on_evict:
+            for key, value in evicted:
+                self.on_evict(key, value)
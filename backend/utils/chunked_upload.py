@@ -0,0 +1,299 @@
+# utils/chunked_upload.py
+"""
+Resumable chunked uploads of large GeoTIFFs.
+
+An upload is initiated with the file's name, size and (optionally) SHA-256,
+then sent as fixed-size parts in any order and completed once every part is
+on disk. State lives under ``<root>/.partial/<upload_id>/`` (a metadata file,
+the preallocated data file and one marker per received part), so an upload
+survives interrupted connections and server restarts and the client only has
+to resend the parts missing from ``upload_status``.
+
+Part 0 carries the TIFF header: its magic number, sample type and
+georeferencing tags are checked as soon as enough bytes have arrived, and an
+upload that fails the check is discarded before the rest is transferred.
+"""
+import hashlib
+import json
+import os
+import shutil
+import struct
+import time
+import uuid
+from utils.artifacts import atomic_path, store_upload
+from utils.lazy import lazy_import
+from utils.logging import log_error, log_info
+
+rasterio = lazy_import('rasterio')
+
+PARTIAL_DIR = '.partial'
+DEFAULT_PART_SIZE = 8 * 1024 * 1024
+MIN_PART_SIZE = 1024 * 1024
+MAX_PART_SIZE = 64 * 1024 * 1024
+MAX_UPLOAD_SIZE = 10 * 1024 * 1024 * 1024
+COPY_BUFFER = 1024 * 1024
+# The header of part 0 is checked once this many bytes have arrived
+HEADER_PROBE = 64 * 1024
+
+ALLOWED_DTYPES = ('int16', 'float32', 'float64')
+
+# (BitsPerSample, SampleFormat) -> dtype; SampleFormat defaults to 1 (unsigned)
+TIFF_DTYPES = {(8, 1): 'uint8', (16, 1): 'uint16', (16, 2): 'int16', (32, 1): 'uint32', (32, 2): 'int32',
+               (32, 3): 'float32', (64, 3): 'float64'}
+TIFF_TYPE_SIZES = {1: 1, 2: 1, 3: 2, 4: 4, 5: 8, 6: 1, 7: 1, 8: 2, 9: 4, 10: 8, 11: 4, 12: 8, 16: 8, 17: 8, 18: 8}
+TIFF_TYPE_FORMATS = {1: 'B', 3: 'H', 4: 'I', 6: 'b', 8: 'h', 9: 'i', 16: 'Q', 17: 'q', 18: 'Q'}
+TAG_BITS_PER_SAMPLE = 258
+TAG_SAMPLE_FORMAT = 339
+TAG_MODEL_TIEPOINT = 33922
+TAG_MODEL_TRANSFORMATION = 34264
+TAG_GEO_KEY_DIRECTORY = 34735
+
+
+class UploadError(ValueError):
+    """The upload request or its content is invalid."""
+
+
+class UploadNotFound(LookupError):
+    """No upload with the given id is in progress."""
+
+
+def initiate_upload(root, filename, size, sha256=None, part_size=None):
+    """Start an upload session and return its description (see upload_status)."""
+    if not isinstance(size, int) or size <= 0:
+        raise UploadError("size must be a positive integer")
+    if size > MAX_UPLOAD_SIZE:
+        raise UploadError(f"File too large: the limit is {MAX_UPLOAD_SIZE} bytes")
+    part_size = part_size or DEFAULT_PART_SIZE
+    if not isinstance(part_size, int) or not MIN_PART_SIZE <= part_size <= MAX_PART_SIZE:
+        raise UploadError(f"part_size must be between {MIN_PART_SIZE} and {MAX_PART_SIZE} bytes")
+    if sha256 is not None and (len(sha256) != 64 or any(ch not in '0123456789abcdef' for ch in sha256.lower())):
+        raise UploadError("sha256 must be a 64-character hex digest")
+
+    upload_id = uuid.uuid4().hex
+    directory = _upload_dir(root, upload_id)
+    os.makedirs(os.path.join(directory, 'parts'))
+    # Sparse preallocation: parts are written in place at their offsets
+    with open(os.path.join(directory, 'data'), 'wb') as f:
+        f.truncate(size)
+    meta = {
+        "upload_id": upload_id,
+        "filename": filename,
+        "size": size,
+        "part_size": part_size,
+        "part_count": -(-size // part_size),
+        "sha256": sha256.lower() if sha256 else None,
+        "header_probed": False,
+        "created": time.time()
+    }
+    _write_meta(directory, meta)
+    log_info("Upload initiated", {"upload_id": upload_id, "filename": filename, "size": size, "parts": meta["part_count"]})
+    return upload_status(root, upload_id)
+
+def write_part(root, upload_id, index, stream):
+    """
+    Copy part ``index`` from ``stream`` to its offset in the upload's data file.
+
+    The body is streamed to disk in COPY_BUFFER blocks, never held in memory.
+    The part is only marked received once its full length has been written;
+    a short or long body raises UploadError. Returns the part's SHA-256.
+    """
+    directory = _upload_dir(root, upload_id)
+    meta = _read_meta(directory)
+    if not isinstance(index, int) or not 0 <= index < meta["part_count"]:
+        raise UploadError(f"Part index must be between 0 and {meta['part_count'] - 1}")
+    offset = index * meta["part_size"]
+    expected = min(meta["part_size"], meta["size"] - offset)
+    check_header = index == 0 and not meta["header_probed"]
+
+    # A re-sent part overwrites the region its marker vouches for, so the marker
+    # goes first and only returns once the new bytes are all written
+    marker = os.path.join(directory, 'parts', str(index))
+    try:
+        os.remove(marker)
+    except FileNotFoundError:
+        pass
+    hasher = hashlib.sha256()
+    head = bytearray()
+    written = 0
+    with open(os.path.join(directory, 'data'), 'r+b') as f:
+        f.seek(offset)
+        while True:
+            block = stream.read(COPY_BUFFER)
+            if not block:
+                break
+            written += len(block)
+            if written > expected:
+                raise UploadError(f"Part {index} is larger than {expected} bytes")
+            if check_header and len(head) < HEADER_PROBE:
+                head += block[:HEADER_PROBE - len(head)]
+                if len(head) >= min(HEADER_PROBE, expected):
+                    _check_probe(root, upload_id, bytes(head))
+            hasher.update(block)
+            f.write(block)
+    if written != expected:
+        raise UploadError(f"Part {index} should be {expected} bytes, received {written}")
+
+    digest = hasher.hexdigest()
+    with atomic_path(marker) as tmp_path, open(tmp_path, 'w') as f:
+        f.write(digest)
+    if check_header:
+        meta["header_probed"] = True
+        _write_meta(directory, meta)
+    return digest
+
+def upload_status(root, upload_id):
+    """Upload description with the received and still missing part indexes."""
+    directory = _upload_dir(root, upload_id)
+    meta = _read_meta(directory)
+    # Skips the temporary file of a marker being written
+    received = sorted(int(name) for name in os.listdir(os.path.join(directory, 'parts')) if name.isdigit())
+    received_set = set(received)
+    return {
+        **meta,
+        "received": received,
+        "missing": [i for i in range(meta["part_count"]) if i not in received_set]
+    }
+
+def complete_upload(root, upload_id, dest_dir):
+    """
+    Verify a fully received upload and move it to ``dest_dir`` (see store_upload).
+
+    Checks that no parts are missing, that the SHA-256 matches the one given
+    at initiation, and that the file opens as a single-band elevation GeoTIFF.
+    Returns (path, sha256).
+    """
+    status = upload_status(root, upload_id)
+    if status["missing"]:
+        raise UploadError(f"{len(status['missing'])} parts are missing")
+    directory = _upload_dir(root, upload_id)
+    data_path = os.path.join(directory, 'data')
+
+    hasher = hashlib.sha256()
+    with open(data_path, 'rb') as f:
+        for block in iter(lambda: f.read(COPY_BUFFER), b''):
+            hasher.update(block)
+    digest = hasher.hexdigest()
+    if status["sha256"] and digest != status["sha256"]:
+        raise UploadError(f"Checksum mismatch: expected {status['sha256']}, got {digest}")
+
+    with open(data_path, 'rb') as f:
+        check_tiff_header(lambda offset, length: _read_at(f, offset, length))
+    try:
+        with rasterio.open(data_path) as src:
+            if src.count < 1 or src.dtypes[0] not in ALLOWED_DTYPES:
+                raise UploadError("Invalid GeoTIFF: Must contain valid elevation data")
+    except rasterio.errors.RasterioIOError as e:
+        raise UploadError(f"Invalid GeoTIFF: {str(e)}")
+
+    path = store_upload(data_path, dest_dir, status["filename"], digest)
+    shutil.rmtree(directory, ignore_errors=True)
+    log_info("Upload completed", {"upload_id": upload_id, "path": path, "size": status["size"], "sha256": digest})
+    return path, digest
+
+def abort_upload(root, upload_id):
+    directory = _upload_dir(root, upload_id)
+    if not os.path.isdir(directory):
+        raise UploadNotFound(upload_id)
+    shutil.rmtree(directory, ignore_errors=True)
+    log_info("Upload aborted", {"upload_id": upload_id})
+
+def check_tiff_header(read_at):
+    """
+    Validate a GeoTIFF from its header and first IFD.
+
+    ``read_at(offset, length)`` returns the requested bytes, or None when they
+    are not available yet. Raises UploadError for a file that is not a TIFF,
+    has an unsupported sample type or lacks GeoTIFF georeferencing tags.
+    Returns False if the first IFD lies outside the available bytes (nothing
+    beyond the magic number could be checked), True otherwise.
+    """
+    header = read_at(0, 16)
+    if header is None or len(header) < 8:
+        return False
+    order = {b'II': '<', b'MM': '>'}.get(header[:2])
+    if order is None:
+        raise UploadError("Not a TIFF file")
+    version = struct.unpack(order + 'H', header[2:4])[0]
+    if version == 42:
+        ifd_offset = struct.unpack(order + 'I', header[4:8])[0]
+        count_fmt, entry_size, entry_fmt, inline = 'H', 12, 'HHII', 4
+    elif version == 43 and len(header) >= 16:
+        ifd_offset = struct.unpack(order + 'Q', header[8:16])[0]
+        count_fmt, entry_size, entry_fmt, inline = 'Q', 20, 'HHQQ', 8
+    else:
+        raise UploadError("Not a TIFF file")
+
+    count_size = struct.calcsize(count_fmt)
+    raw = read_at(ifd_offset, count_size)
+    if raw is None:
+        return False
+    entry_count = struct.unpack(order + count_fmt, raw)[0]
+    entries = read_at(ifd_offset + count_size, entry_count * entry_size)
+    if entries is None:
+        return False
+
+    tags = {}
+    for i in range(entry_count):
+        entry = entries[i * entry_size:(i + 1) * entry_size]
+        tag, value_type, count, _ = struct.unpack(order + entry_fmt, entry)
+        value_size = TIFF_TYPE_SIZES.get(value_type, 1) * count
+        if value_size <= inline:
+            data = entry[entry_size - inline:entry_size - inline + value_size]
+        else:
+            offset = struct.unpack(order + entry_fmt[-1], entry[entry_size - inline:])[0]
+            data = read_at(offset, value_size) if tag in (TAG_BITS_PER_SAMPLE, TAG_SAMPLE_FORMAT) else b''
+        tags[tag] = (value_type, count, data)
+
+    bits = _first_value(order, tags.get(TAG_BITS_PER_SAMPLE))
+    sample_format = _first_value(order, tags.get(TAG_SAMPLE_FORMAT)) or 1
+    if bits is not None:
+        dtype = TIFF_DTYPES.get((bits, sample_format), f'{bits}-bit format {sample_format}')
+        if dtype not in ALLOWED_DTYPES:
+            raise UploadError(f"Invalid GeoTIFF: {dtype} samples, expected one of {', '.join(ALLOWED_DTYPES)}")
+    georeferenced = TAG_MODEL_TRANSFORMATION in tags or TAG_MODEL_TIEPOINT in tags
+    if not georeferenced or TAG_GEO_KEY_DIRECTORY not in tags:
+        raise UploadError("Invalid GeoTIFF: no georeferencing (GeoKeyDirectory and tiepoint/transformation tags)")
+    return True
+
+def _check_probe(root, upload_id, head):
+    """Check the header of part 0 and discard the upload if it is invalid."""
+    def read_at(offset, length):
+        return head[offset:offset + length] if offset + length <= len(head) else None
+    try:
+        check_tiff_header(read_at)
+    except UploadError as e:
+        log_error("Rejected upload header", {"upload_id": upload_id, "error": str(e)})
+        abort_upload(root, upload_id)
+        raise
+
+def _first_value(order, entry):
+    if entry is None:
+        return None
+    value_type, count, data = entry
+    fmt = TIFF_TYPE_FORMATS.get(value_type)
+    if fmt is None or not data or len(data) < struct.calcsize(fmt):
+        return None
+    return struct.unpack(order + fmt, data[:struct.calcsize(fmt)])[0]
+
+def _read_at(f, offset, length):
+    f.seek(offset)
+    data = f.read(length)
+    return data if len(data) == length else None
+
+def _upload_dir(root, upload_id):
+    if not upload_id or any(ch not in '0123456789abcdef' for ch in upload_id):
+        raise UploadNotFound(upload_id)
+    return os.path.join(root, PARTIAL_DIR, upload_id)
+
+def _read_meta(directory):
+    try:
+        with open(os.path.join(directory, 'meta.json')) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        raise UploadNotFound(os.path.basename(directory))
+
+def _write_meta(directory, meta):
+    tmp_path = os.path.join(directory, 'meta.json.tmp')
+    with open(tmp_path, 'w') as f:
+        json.dump(meta, f)
+    os.replace(tmp_path, os.path.join(directory, 'meta.json'))
@@ -0,0 +1,222 @@
+# utils/db.py
+import os
+import queue
+import sqlite3
+import threading
+import weakref
+from concurrent.futures import Future
+from contextlib import contextmanager
+from utils.logging import log_error, log_info
+
+DB_PATH = os.getenv('DATABASE_PATH', os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data.db'))
+
+# Stored in the database file, so set once per database and process
+DATABASE_PRAGMAS = (
+    'PRAGMA journal_mode=WAL',
+)
+# Per-connection settings, applied when a connection is opened
+PRAGMAS = (
+    'PRAGMA synchronous=NORMAL',
+    'PRAGMA busy_timeout=5000',
+    'PRAGMA cache_size=-20000',
+    'PRAGMA temp_store=MEMORY',
+    'PRAGMA mmap_size=268435456',
+    'PRAGMA foreign_keys=ON'
+)
+
+# Writes queued within this window are committed together in one transaction
+WRITE_BATCH_SIZE = 64
+WRITE_BATCH_WAIT = 0.005
+
+# Idle connections kept for reuse by later threads
+POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '16'))
+
+_configured = set()
+_configure_lock = threading.Lock()
+
+
+def connect(path=None):
+    """Open a new connection with the tuned pragmas applied (and WAL mode, on a database's first connection)."""
+    path = path or DB_PATH
+    # isolation_level=None leaves transaction control to transaction(); connections
+    # move between threads through the pool, but only one thread uses each at a time
+    conn = sqlite3.connect(path, isolation_level=None, cached_statements=256, check_same_thread=False)
+    if (path, os.getpid()) not in _configured:
+        with _configure_lock:
+            if (path, os.getpid()) not in _configured:
+                for pragma in DATABASE_PRAGMAS:
+                    conn.execute(pragma)
+                _configured.add((path, os.getpid()))
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+
+class _Lease:
+    """A thread's hold on a pooled connection; returned to the pool when the thread exits."""
+
+    def __init__(self, conn, path, pid):
+        self.conn = conn
+        self.path = path
+        self.pid = pid
+
+
+class ConnectionPool:
+    """
+    Connections shared across threads, at most ``size`` of them kept idle.
+
+    A thread takes a connection on its first ``get`` and keeps it while it
+    runs. When the thread exits (the threaded development server uses one per
+    request) the connection goes back to the pool for the next thread, so
+    connections are opened and configured once rather than per request.
+    Connections from before a fork or for another DB_PATH are never handed out.
+    """
+
+    def __init__(self, size=POOL_SIZE):
+        self.size = size
+        self._idle = []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.opened = 0
+        self.reused = 0
+
+    def get(self):
+        lease = getattr(self._local, 'lease', None)
+        if lease is None or lease.path != DB_PATH or lease.pid != os.getpid():
+            lease = self._acquire(DB_PATH, os.getpid())
+            finalizer = weakref.finalize(lease, self._release, lease.conn, lease.path, lease.pid)
+            # At interpreter exit there is nothing to return connections to
+            finalizer.atexit = False
+            self._local.lease = lease
+        return lease.conn
+
+    def stats(self):
+        with self._lock:
+            return {"idle": len(self._idle), "size": self.size, "opened": self.opened, "reused": self.reused}
+
+    def _acquire(self, path, pid):
+        with self._lock:
+            for i, (idle_path, idle_pid, conn) in enumerate(self._idle):
+                if idle_path == path and idle_pid == pid:
+                    del self._idle[i]
+                    self.reused += 1
+                    return _Lease(conn, path, pid)
+        conn = connect(path)
+        with self._lock:
+            self.opened += 1
+        return _Lease(conn, path, pid)
+
+    def _release(self, conn, path, pid):
+        if pid != os.getpid():
+            return
+        try:
+            if conn.in_transaction:
+                # The thread ended inside a transaction(); nothing else may commit it
+                conn.execute('ROLLBACK')
+        except sqlite3.Error:
+            conn.close()
+            return
+        with self._lock:
+            if path == DB_PATH and len(self._idle) < self.size:
+                self._idle.append((path, pid, conn))
+                return
+        conn.close()
+
+
+pool = ConnectionPool()
+
+
+def get_connection():
+    """The calling thread's connection, taken from the pool on first use and reused afterwards."""
+    return pool.get()
+
+@contextmanager
+def transaction(conn=None, immediate=False):
+    """Run a block in one transaction on ``conn`` (default: this thread's connection)."""
+    conn = conn or get_connection()
+    conn.execute('BEGIN IMMEDIATE' if immediate else 'BEGIN')
+    try:
+        yield conn
+    except BaseException:
+        conn.execute('ROLLBACK')
+        raise
+    conn.execute('COMMIT')
+
+
+class WriteQueue:
+    """
+    Single writer thread that groups queued writes into shared transactions.
+
+    Each job runs as ``fn(conn, *args, **kwargs)`` inside its own savepoint, so
+    a failing job is rolled back alone while the rest of the batch commits.
+    ``submit`` returns a Future resolved with the job's return value once the
+    batch has been committed.
+    """
+
+    def __init__(self, batch_size=WRITE_BATCH_SIZE, batch_wait=WRITE_BATCH_WAIT):
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait
+        self._queue = queue.Queue()
+        self._thread = None
+        self._path = None
+        self._lock = threading.Lock()
+
+    def submit(self, fn, *args, **kwargs):
+        self._ensure_started()
+        future = Future()
+        self._queue.put((future, fn, args, kwargs))
+        return future
+
+    def _ensure_started(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='db-writer', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        conn = None
+        while True:
+            batch = [self._queue.get()]
+            try:
+                while len(batch) < self.batch_size:
+                    batch.append(self._queue.get(timeout=self.batch_wait))
+            except queue.Empty:
+                pass
+            if conn is None or self._path != DB_PATH:
+                conn = connect()
+                self._path = DB_PATH
+            self._write_batch(conn, batch)
+
+    def _write_batch(self, conn, batch):
+        results = []
+        try:
+            with transaction(conn, immediate=True):
+                for future, fn, args, kwargs in batch:
+                    if not future.set_running_or_notify_cancel():
+                        continue
+                    conn.execute('SAVEPOINT job')
+                    try:
+                        results.append((future, fn(conn, *args, **kwargs), None))
+                        conn.execute('RELEASE job')
+                    except Exception as e:
+                        conn.execute('ROLLBACK TO job')
+                        conn.execute('RELEASE job')
+                        results.append((future, None, e))
+        except Exception as e:
+            log_error("Write batch failed", {"jobs": len(batch), "error": str(e)})
+            for future, _, _, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for future, result, error in results:
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+        if len(batch) > 1:
+            log_info("Committed write batch", {"jobs": len(batch)})
+
+
+write_queue = WriteQueue()
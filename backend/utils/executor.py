@@ -0,0 +1,133 @@
+# utils/executor.py
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from utils.logging import log_info
+
+# Views stay synchronous and hand CPU work to these pools. Flask's async views
+# (asgiref is pinned in requirements.txt) would still run each request's event
+# loop inside a WSGI worker thread, so the heavy calls would block it the same
+# way; bounding each class of work is what keeps DEM merges from starving tiles.
+# Rasterio, Shapely and numpy release the GIL, so threads suffice and nothing is
+# pickled as it would be for process pools.
+
+# Workers per class of CPU-heavy work; override with e.g. EXECUTOR_LIMITS="dem=2,render=4"
+DEFAULT_LIMITS = {
+    'dem': 1,        # DEM merges and their previews
+    'raster': 2,     # rasterio reads: terrain slopes, risk surfaces
+    'geometry': 4,   # Shapely work: risk scores, metadata, levels of detail
+    'parse': 4,      # KML/GeoJSON/shapefile parsing
+    'render': 2,     # matplotlib previews
+    'tiles': 4       # vector and raster tiles
+}
+# Jobs allowed to wait per class before new ones are refused
+MAX_QUEUE = int(os.getenv('EXECUTOR_MAX_QUEUE', '32'))
+# Queue waits above this many seconds are logged
+SLOW_QUEUE_SECONDS = 1.0
+
+
+class ExecutorBusy(RuntimeError):
+    """Raised when a work class already has MAX_QUEUE jobs waiting."""
+
+    def __init__(self, kind):
+        super().__init__(f"Too many queued {kind} jobs, try again later")
+        self.kind = kind
+
+
+class WorkClass:
+    """One bounded pool of worker threads with its queue and timing counters."""
+
+    def __init__(self, kind, workers, max_queue):
+        self.kind = kind
+        self.workers = workers
+        self.max_queue = max_queue
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f'{kind}-worker')
+        self._lock = threading.Lock()
+        self.queued = 0
+        self.running = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.queue_seconds = 0.0
+        self.max_queue_seconds = 0.0
+        self.run_seconds = 0.0
+
+    def submit(self, fn, *args, **kwargs):
+        with self._lock:
+            if self.queued >= self.max_queue:
+                self.rejected += 1
+                raise ExecutorBusy(self.kind)
+            self.queued += 1
+        submitted = time.monotonic()
+
+        def job():
+            started = time.monotonic()
+            waited = started - submitted
+            with self._lock:
+                self.queued -= 1
+                self.running += 1
+                self.queue_seconds += waited
+                self.max_queue_seconds = max(self.max_queue_seconds, waited)
+            if waited > SLOW_QUEUE_SECONDS:
+                log_info("Job waited for a worker", {"kind": self.kind, "queue_seconds": round(waited, 3)})
+            failed = False
+            try:
+                return fn(*args, **kwargs)
+            except BaseException:
+                failed = True
+                raise
+            finally:
+                with self._lock:
+                    self.running -= 1
+                    self.run_seconds += time.monotonic() - started
+                    if failed:
+                        self.failed += 1
+                    else:
+                        self.completed += 1
+
+        return self.pool.submit(job)
+
+    def stats(self):
+        with self._lock:
+            finished = self.completed + self.failed
+            return {
+                "workers": self.workers,
+                "max_queue": self.max_queue,
+                "queued": self.queued,
+                "running": self.running,
+                "completed": self.completed,
+                "failed": self.failed,
+                "rejected": self.rejected,
+                "queue_seconds_total": round(self.queue_seconds, 3),
+                "queue_seconds_max": round(self.max_queue_seconds, 3),
+                "run_seconds_total": round(self.run_seconds, 3),
+                "run_seconds_mean": round(self.run_seconds / finished, 3) if finished else None
+            }
+
+
+def _limits():
+    limits = dict(DEFAULT_LIMITS)
+    for item in filter(None, os.getenv('EXECUTOR_LIMITS', '').split(',')):
+        kind, _, workers = item.partition('=')
+        limits[kind.strip()] = max(1, int(workers))
+    return limits
+
+_classes = {kind: WorkClass(kind, workers, MAX_QUEUE) for kind, workers in _limits().items()}
+
+
+def submit(kind, fn, *args, **kwargs):
+    """
+    Queue ``fn(*args, **kwargs)`` on the pool of work class ``kind`` and return its Future.
+
+    Each class has its own threads, so a backlog of slow DEM jobs never delays
+    a tile render. Raises ExecutorBusy when the class's queue is full.
+    """
+    return _classes[kind].submit(fn, *args, **kwargs)
+
+def run(kind, fn, *args, **kwargs):
+    """``submit`` and wait for the result; exceptions raised by ``fn`` propagate to the caller."""
+    return submit(kind, fn, *args, **kwargs).result()
+
+def stats():
+    return {kind: work_class.stats() for kind, work_class in _classes.items()}
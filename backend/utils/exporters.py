@@ -0,0 +1,176 @@
+# utils/exporters.py
+import csv
+import io
+import json
+import os
+import tempfile
+import shapely
+from shapely.geometry import mapping
+from utils import feature_store, geojson_writer
+from utils.lazy import lazy_import
+from utils.logging import log_error, log_info
+
+# Optional writers, None when not installed; imported on the first export
+fiona = lazy_import('fiona', optional=True)
+pa = lazy_import('pyarrow', optional=True)
+pq = lazy_import('pyarrow.parquet', optional=True)
+
+READ_CHUNK_SIZE = 1024 * 1024
+
+
+def export_formats():
+    """Export formats usable in this environment, mapped to (mimetype, file extension)."""
+    formats = {
+        'json': ('application/json', 'json'),
+        'csv': ('text/csv', 'csv')
+    }
+    if fiona is not None:
+        formats['fgb'] = ('application/octet-stream', 'fgb')
+    if pa is not None:
+        formats['parquet'] = ('application/vnd.apache.parquet', 'parquet')
+    return formats
+
+def stream_geojson(dataset_id, bbox=None, limit=None, offset=0, precision=None, keys=None):
+    """
+    Yield a dataset as a GeoJSON FeatureCollection, one batch of features per chunk.
+
+    Stored property JSON is passed through as-is (unless ``keys`` selects a
+    subset) and geometries are written straight from WKB, rounded to
+    ``precision`` decimals when given, so only one batch is held in memory
+    at a time.
+    """
+    dataset = feature_store.get_dataset(dataset_id)
+    yield geojson_writer.collection_start(dataset["metadata"] if dataset else None)
+    first = True
+    for rows in feature_store.iter_row_batches(dataset_id, bbox=bbox, limit=limit, offset=offset, raw_geometry=True):
+        features = geojson_writer.encode_features(
+            shapely.from_wkb([row[1] for row in rows]),
+            [row[2] for row in rows],
+            ids=[row[0] for row in rows],
+            precision=precision, keys=keys,
+            raw_geometries=[row[3] for row in rows]
+        )
+        yield (b'' if first else b',') + b','.join(features)
+        first = False
+    yield b']}'
+
+def stream_csv(dataset_id, columns, bbox=None, limit=None, offset=0):
+    """Yield a dataset's properties as CSV with one column per key in ``columns``."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for rows in feature_store.iter_row_batches(dataset_id, bbox=bbox, limit=limit, offset=offset):
+        for _, _, properties in rows:
+            values = json.loads(properties) if properties else {}
+            writer.writerow([_csv_value(values.get(key)) for key in columns])
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+def write_flatgeobuf(dataset_id, schema, bbox=None, limit=None, offset=0):
+    """Write a dataset to a temporary FlatGeobuf file batch by batch; returns its path."""
+    if fiona is None:
+        raise RuntimeError("FlatGeobuf export requires fiona")
+    fiona_schema = {
+        "geometry": "Unknown",
+        # Column types share fiona's names: int, float, bool, str
+        "properties": dict(schema)
+    }
+    # GDAL's packed R-tree cannot hold features without a geometry
+    options = {'SPATIAL_INDEX': 'NO'} if feature_store.has_null_geometries(dataset_id) else {}
+    path = _temp_path('.fgb')
+    try:
+        with fiona.open(path, 'w', driver='FlatGeobuf', schema=fiona_schema, crs='EPSG:4326', **options) as dst:
+            for rows in feature_store.iter_row_batches(dataset_id, bbox=bbox, limit=limit, offset=offset):
+                geoms = shapely.from_wkb([row[1] for row in rows])
+                records = []
+                for (_, _, properties), geom in zip(rows, geoms):
+                    values = json.loads(properties) if properties else {}
+                    records.append({
+                        "geometry": mapping(geom) if geom is not None else None,
+                        "properties": {key: _column_value(values.get(key), kind) for key, kind in schema}
+                    })
+                dst.writerecords(records)
+    except Exception:
+        _remove(path)
+        raise
+    log_info("Wrote FlatGeobuf export", {"dataset_id": dataset_id, "path": path})
+    return path
+
+def write_geoparquet(dataset_id, schema, bbox=None, limit=None, offset=0):
+    """
+    Write a dataset to a temporary GeoParquet file; returns its path.
+
+    Geometries are copied as stored WKB into the ``geometry`` column, with one
+    row group per fetched batch.
+    """
+    if pa is None:
+        raise RuntimeError("GeoParquet export requires pyarrow")
+    arrow_types = {'int': pa.int64(), 'float': pa.float64(), 'bool': pa.bool_(), 'str': pa.string()}
+    # A property may itself be called "geometry"
+    geometry_name = 'geometry' if 'geometry' not in {key for key, _ in schema} else '__geometry'
+    geo = {
+        "version": "1.0.0",
+        "primary_column": geometry_name,
+        "columns": {geometry_name: {"encoding": "WKB", "geometry_types": feature_store.geometry_types(dataset_id)}}
+    }
+    fields = [pa.field(key, arrow_types[kind]) for key, kind in schema]
+    arrow_schema = pa.schema(fields + [pa.field(geometry_name, pa.binary())],
+                             metadata={b"geo": json.dumps(geo).encode('utf-8')})
+
+    path = _temp_path('.parquet')
+    try:
+        with pq.ParquetWriter(path, arrow_schema, compression='zstd') as writer:
+            for rows in feature_store.iter_row_batches(dataset_id, bbox=bbox, limit=limit, offset=offset):
+                values = [json.loads(row[2]) if row[2] else {} for row in rows]
+                columns = [[_column_value(v.get(key), kind) for v in values] for key, kind in schema]
+                columns.append([row[1] for row in rows])
+                writer.write_table(pa.Table.from_arrays(columns, schema=arrow_schema))
+    except Exception:
+        _remove(path)
+        raise
+    log_info("Wrote GeoParquet export", {"dataset_id": dataset_id, "path": path})
+    return path
+
+def stream_file(path, remove=True):
+    """Yield a file in READ_CHUNK_SIZE chunks, deleting it afterwards when ``remove`` is set."""
+    try:
+        with open(path, 'rb') as f:
+            while True:
+                chunk = f.read(READ_CHUNK_SIZE)
+                if not chunk:
+                    break
+                yield chunk
+    finally:
+        if remove:
+            _remove(path)
+
+def _csv_value(value):
+    if value is None:
+        return ''
+    if isinstance(value, (dict, list)):
+        return json.dumps(value)
+    return value
+
+def _column_value(value, kind):
+    """Coerce a property value to its column type; mixed columns are stored as text."""
+    if value is None or kind != 'str' or isinstance(value, str):
+        return value
+    return json.dumps(value)
+
+def _temp_path(suffix):
+    fd, path = tempfile.mkstemp(prefix='export_', suffix=suffix)
+    os.close(fd)
+    # The OGR drivers refuse to overwrite an existing file
+    os.remove(path)
+    return path
+
+def _remove(path):
+    if not os.path.exists(path):
+        return
+    try:
+        os.remove(path)
+    except OSError as e:
+        log_error("Failed to remove export file", {"path": path, "error": str(e)})
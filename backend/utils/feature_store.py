@@ -0,0 +1,333 @@
+# utils/feature_store.py
+import hashlib
+import json
+import numpy as np
+import shapely
+from shapely.geometry import mapping
+from utils import db
+from utils.geometry import feature_geometries
+from utils.logging import log_error, log_info
+
+FETCH_SIZE = 1000
+# Version of the canonical form content_hash digests; stored hashes of other
+# versions are recomputed at startup
+HASH_VERSION = 3
+
+SCHEMA = [
+    '''CREATE TABLE IF NOT EXISTS datasets
+       (id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT,
+        feature_count INTEGER NOT NULL DEFAULT 0,
+        metadata TEXT,
+        legacy_id INTEGER UNIQUE,
+        content_hash TEXT,
+        hash_version INTEGER,
+        timestamp DATETIME DEFAULT CURRENT_TIMESTAMP)''',
+    '''CREATE TABLE IF NOT EXISTS features
+       (id INTEGER PRIMARY KEY AUTOINCREMENT,
+        dataset_id INTEGER NOT NULL REFERENCES datasets(id) ON DELETE CASCADE,
+        seq INTEGER NOT NULL,
+        feature_id TEXT,
+        geometry_type TEXT,
+        geometry BLOB,
+        properties TEXT,
+        raw_geometry TEXT)''',
+    'CREATE INDEX IF NOT EXISTS idx_features_dataset ON features(dataset_id, seq)',
+    'CREATE VIRTUAL TABLE IF NOT EXISTS features_rtree USING rtree(id, min_x, max_x, min_y, max_y)'
+]
+
+
+def init_store():
+    """Create the dataset/feature tables and import any legacy ``parsed_data`` blobs."""
+    conn = db.get_connection()
+    with db.transaction(conn, immediate=True):
+        c = conn.cursor()
+        for statement in SCHEMA:
+            c.execute(statement)
+        if 'raw_geometry' not in [row[1] for row in c.execute("PRAGMA table_info(features)")]:
+            c.execute("ALTER TABLE features ADD COLUMN raw_geometry TEXT")
+        _migrate_content_hash(c)
+        c.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='parsed_data'")
+        if c.fetchone():
+            c.execute('''SELECT id, data FROM parsed_data
+                         WHERE id NOT IN (SELECT legacy_id FROM datasets WHERE legacy_id IS NOT NULL)
+                         ORDER BY id''')
+            for legacy_id, blob in c.fetchall():
+                try:
+                    _insert_dataset(conn, json.loads(blob), legacy_id=legacy_id)
+                    log_info("Migrated legacy dataset", {"legacy_id": legacy_id})
+                except Exception as e:
+                    log_error("Failed to migrate legacy dataset", {"legacy_id": legacy_id, "error": str(e)})
+
+def _migrate_content_hash(c):
+    """Add the content hash columns to stores created before them and compute missing or outdated hashes."""
+    columns = [row[1] for row in c.execute("PRAGMA table_info(datasets)")]
+    if 'content_hash' not in columns:
+        c.execute("ALTER TABLE datasets ADD COLUMN content_hash TEXT")
+    if 'hash_version' not in columns:
+        c.execute("ALTER TABLE datasets ADD COLUMN hash_version INTEGER")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_datasets_hash ON datasets(content_hash)")
+    outdated = c.execute("SELECT id FROM datasets WHERE content_hash IS NULL OR hash_version IS NOT ?",
+                         (HASH_VERSION,)).fetchall()
+    for (dataset_id,) in outdated:
+        c.execute("UPDATE datasets SET content_hash = ?, hash_version = ? WHERE id = ?",
+                  (_stored_content_hash(dataset_id), HASH_VERSION, dataset_id))
+        log_info("Computed dataset content hash", {"dataset_id": dataset_id})
+
+def content_hash(data):
+    """
+    SHA-256 of a FeatureCollection in the canonical form it is stored in.
+
+    The digest covers the collection's metadata and, per feature, its id, its
+    geometry as WKB (or as JSON, if Shapely cannot build it) and its
+    properties, with JSON values in sorted compact
+    form. A collection and the dataset stored from it therefore hash the same
+    (see _stored_content_hash), and datasets with the same content share a
+    hash whatever their id, so results computed for one apply to all of them.
+    """
+    features = data.get("features", [])
+    wkb = shapely.to_wkb(feature_geometries(features))
+    return _hash_rows(_metadata(data), ((_feature_id(feature), wkb[seq], _raw_geometry(feature, wkb[seq]),
+                                         feature.get("properties") or {}) for seq, feature in enumerate(features)))
+
+def _stored_content_hash(dataset_id):
+    """content_hash of a stored dataset, computed from its rows without decoding geometries."""
+    rows = ((feature_id, geometry, raw, json.loads(properties) if properties else {})
+            for batch in iter_row_batches(dataset_id, raw_geometry=True)
+            for feature_id, geometry, properties, raw in batch)
+    return _hash_rows(get_dataset(dataset_id)["metadata"], rows)
+
+def _hash_rows(metadata, rows):
+    """SHA-256 over ``metadata`` and (feature id JSON, WKB, raw geometry JSON, properties) rows, each part length-prefixed."""
+    hasher = hashlib.sha256()
+
+    def update(part):
+        hasher.update(len(part).to_bytes(8, 'big'))
+        hasher.update(part)
+
+    update(_canonical_json(metadata))
+    for feature_id, wkb, raw, properties in rows:
+        update((feature_id or '').encode('utf-8'))
+        # A missing geometry hashes as an empty part; WKB is never empty and
+        # never starts with the '{' of a raw geometry
+        update(wkb or (raw or '').encode('utf-8'))
+        update(_canonical_json(properties))
+    return hasher.hexdigest()
+
+def _canonical_json(value):
+    return json.dumps(value, sort_keys=True, separators=(',', ':')).encode('utf-8')
+
+def _metadata(data):
+    return {k: v for k, v in data.items() if k not in ("type", "features")}
+
+def _raw_geometry(feature, wkb):
+    """Canonical JSON of a geometry Shapely could not build, kept so the data is not lost; else None."""
+    geometry = feature.get("geometry") if isinstance(feature, dict) else None
+    return _canonical_json(geometry).decode('utf-8') if wkb is None and geometry is not None else None
+
+def _feature_id(feature):
+    """A feature's id as stored: JSON, or None without one."""
+    return None if feature.get("id") is None else json.dumps(feature["id"])
+
+def store_dataset(data, name=None, timeout=60):
+    """
+    Store a GeoJSON FeatureCollection as one dataset row plus one row per feature.
+
+    Geometries are stored as WKB and their bounding boxes are added to the
+    R*Tree index; a geometry Shapely cannot build is kept as its GeoJSON in
+    ``raw_geometry`` (with a NULL WKB), so it is read back unchanged. The
+    insert goes through the shared write queue, so concurrent uploads are
+    committed together. Returns the new dataset id.
+    """
+    return db.write_queue.submit(_insert_dataset, data, name=name).result(timeout=timeout)
+
+def _insert_dataset(conn, data, name=None, legacy_id=None):
+    features = data.get("features", [])
+    metadata = _metadata(data)
+    geoms = feature_geometries(features)
+    wkb = shapely.to_wkb(geoms)
+    bounds = shapely.bounds(geoms)
+    raw = [_raw_geometry(feature, wkb[seq]) for seq, feature in enumerate(features)]
+    digest = _hash_rows(metadata, ((_feature_id(feature), wkb[seq], raw[seq], feature.get("properties") or {})
+                                   for seq, feature in enumerate(features)))
+
+    c = conn.cursor()
+    c.execute('''INSERT INTO datasets (name, feature_count, metadata, legacy_id, content_hash, hash_version)
+                 VALUES (?, ?, ?, ?, ?, ?)''',
+              (name, len(features), json.dumps(metadata) if metadata else None, legacy_id, digest, HASH_VERSION))
+    dataset_id = c.lastrowid
+
+    rows = []
+    for seq, feature in enumerate(features):
+        geometry = feature.get("geometry") if isinstance(feature, dict) else None
+        rows.append((
+            dataset_id,
+            seq,
+            _feature_id(feature),
+            geometry.get("type") if isinstance(geometry, dict) else None,
+            wkb[seq],
+            json.dumps(feature.get("properties") or {}),
+            raw[seq]
+        ))
+    c.executemany('''INSERT INTO features (dataset_id, seq, feature_id, geometry_type, geometry, properties, raw_geometry)
+                     VALUES (?, ?, ?, ?, ?, ?, ?)''', rows)
+    # Ids come from AUTOINCREMENT; executemany leaves no lastrowid, so they are
+    # read back through the (dataset_id, seq) index rather than one insert per row
+    ids = [row[0] for row in c.execute("SELECT id FROM features WHERE dataset_id = ? ORDER BY seq", (dataset_id,))]
+    indexed = np.flatnonzero(np.isfinite(bounds).all(axis=1))
+    c.executemany("INSERT INTO features_rtree (id, min_x, max_x, min_y, max_y) VALUES (?, ?, ?, ?, ?)",
+                  ((ids[i], bounds[i, 0], bounds[i, 2], bounds[i, 1], bounds[i, 3]) for i in indexed))
+    log_info("Stored dataset", {"dataset_id": dataset_id, "features": len(features), "indexed": int(indexed.size),
+                                "raw_geometries": sum(r is not None for r in raw)})
+    return dataset_id
+
+def latest_dataset_id():
+    row = db.get_connection().execute("SELECT id FROM datasets ORDER BY id DESC LIMIT 1").fetchone()
+    return row[0] if row else None
+
+def resolve_dataset(ref):
+    """
+    Id of the dataset named by ``ref``: a dataset id, or a content hash (or a
+    prefix of at least 8 hex digits), which resolves to the newest dataset with
+    that content. Returns None if nothing matches.
+    """
+    ref = str(ref).strip().lower()
+    conn = db.get_connection()
+    if ref.isdigit():
+        row = conn.execute("SELECT id FROM datasets WHERE id = ?", (int(ref),)).fetchone()
+    elif len(ref) >= 8 and all(ch in '0123456789abcdef' for ch in ref):
+        row = conn.execute("SELECT id FROM datasets WHERE content_hash >= ? AND content_hash < ? ORDER BY id DESC LIMIT 1",
+                           (ref, ref + 'g')).fetchone()
+    else:
+        row = None
+    return row[0] if row else None
+
+def list_datasets():
+    """Summary rows of all stored datasets, newest first."""
+    rows = db.get_connection().execute(
+        "SELECT id, name, feature_count, content_hash, timestamp FROM datasets ORDER BY id DESC"
+    ).fetchall()
+    return [{"id": r[0], "name": r[1], "feature_count": r[2], "content_hash": r[3], "timestamp": r[4]} for r in rows]
+
+def get_dataset(dataset_id):
+    """Dataset row as a dict, or None if it does not exist."""
+    row = db.get_connection().execute(
+        "SELECT id, name, feature_count, metadata, content_hash, timestamp FROM datasets WHERE id = ?", (dataset_id,)
+    ).fetchone()
+    if not row:
+        return None
+    return {
+        "id": row[0],
+        "name": row[1],
+        "feature_count": row[2],
+        "metadata": json.loads(row[3]) if row[3] else {},
+        "content_hash": row[4],
+        "timestamp": row[5]
+    }
+
+def iter_row_batches(dataset_id, bbox=None, limit=None, offset=0, raw_geometry=False):
+    """
+    Yield the stored rows of a dataset in storage order, FETCH_SIZE at a time.
+
+    Each row is (feature_id JSON, geometry WKB, properties JSON), undecoded,
+    followed by the raw geometry JSON (see store_dataset) if ``raw_geometry``.
+    With ``bbox`` = (min_x, min_y, max_x, max_y) only features whose bounding
+    box intersects it are read, through the R*Tree index.
+    """
+    params = [dataset_id]
+    extra = ', raw_geometry' if raw_geometry else ''
+    if bbox is None:
+        sql = f'''SELECT feature_id, geometry, properties{extra} FROM features
+                  WHERE dataset_id = ? ORDER BY seq'''
+    else:
+        # CROSS JOIN keeps the R*Tree as the outer loop; a plain JOIN lets the
+        # planner scan every feature of the dataset instead
+        sql = f'''SELECT f.feature_id, f.geometry, f.properties{extra} FROM features_rtree r
+                  CROSS JOIN features f ON f.id = r.id
+                  WHERE f.dataset_id = ? AND r.min_x <= ? AND r.max_x >= ? AND r.min_y <= ? AND r.max_y >= ?
+                  ORDER BY f.seq'''
+        params += [bbox[2], bbox[0], bbox[3], bbox[1]]
+    if limit is not None or offset:
+        sql += ' LIMIT ? OFFSET ?'
+        params += [-1 if limit is None else limit, offset or 0]
+
+    c = db.get_connection().cursor()
+    try:
+        c.execute(sql, params)
+        while True:
+            rows = c.fetchmany(FETCH_SIZE)
+            if not rows:
+                break
+            yield rows
+    finally:
+        c.close()
+
+def iter_features(dataset_id, bbox=None, limit=None, offset=0):
+    """Yield the GeoJSON features of a dataset in storage order (see iter_row_batches)."""
+    for rows in iter_row_batches(dataset_id, bbox=bbox, limit=limit, offset=offset, raw_geometry=True):
+        geoms = shapely.from_wkb([row[1] for row in rows])
+        for (feature_id, _, properties, raw), geom in zip(rows, geoms):
+            feature = {
+                "type": "Feature",
+                "geometry": mapping(geom) if geom is not None else (json.loads(raw) if raw else None),
+                "properties": json.loads(properties) if properties else {}
+            }
+            if feature_id is not None:
+                feature["id"] = json.loads(feature_id)
+            yield feature
+
+def property_schema(dataset_id):
+    """
+    Union of the property keys of a dataset with a column type for each.
+
+    Computed in SQL with json_each, without decoding features in Python.
+    Keys are ordered by first appearance; the type is 'int', 'float', 'bool'
+    or 'str' (mixed, text or nested values). Returns a list of (key, type).
+    """
+    rows = db.get_connection().execute('''
+        SELECT j.key, j.type, MIN(f.seq * 1000000 + j.id)
+        FROM features f, json_each(f.properties) j
+        WHERE f.dataset_id = ?
+        GROUP BY j.key, j.type''', (dataset_id,)).fetchall()
+    first_seen, types = {}, {}
+    for key, value_type, order in rows:
+        first_seen[key] = min(order, first_seen.get(key, order))
+        types.setdefault(key, set()).add(value_type)
+    return [(key, _column_type(types[key])) for key in sorted(first_seen, key=first_seen.get)]
+
+def _column_type(value_types):
+    value_types = value_types - {'null'}
+    if not value_types or not value_types <= {'integer', 'real', 'true', 'false'}:
+        return 'str'
+    if value_types <= {'true', 'false'}:
+        return 'bool'
+    if value_types == {'integer'}:
+        return 'int'
+    if value_types <= {'integer', 'real'}:
+        return 'float'
+    return 'str'
+
+def geometry_types(dataset_id):
+    """Sorted GeoJSON geometry types present in a dataset."""
+    rows = db.get_connection().execute(
+        "SELECT DISTINCT geometry_type FROM features WHERE dataset_id = ? AND geometry_type IS NOT NULL", (dataset_id,)
+    ).fetchall()
+    return sorted(row[0] for row in rows)
+
+def has_null_geometries(dataset_id):
+    """Whether any feature of a dataset has no geometry."""
+    row = db.get_connection().execute(
+        "SELECT 1 FROM features WHERE dataset_id = ? AND geometry IS NULL LIMIT 1", (dataset_id,)
+    ).fetchone()
+    return row is not None
+
+def load_feature_collection(dataset_id, bbox=None, limit=None, offset=0):
+    """Read (part of) a dataset as a GeoJSON FeatureCollection with its stored metadata."""
+    collection = {"type": "FeatureCollection"}
+    dataset = get_dataset(dataset_id) if dataset_id is not None else None
+    if dataset:
+        collection.update(dataset["metadata"])
+        collection["features"] = list(iter_features(dataset_id, bbox=bbox, limit=limit, offset=offset))
+    else:
+        collection["features"] = []
+    return collection
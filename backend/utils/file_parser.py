@@ -1,50 +1,26 @@
 import json
-import logging
 import os
-import shapely.geometry
-from lxml import etree
-from shapely.geometry import shape, Polygon, Point, LineString, GeometryCollection, mapping
-import aiofiles
+from shapely.geometry import shape, Polygon, Point, LineString, GeometryCollection
 import asyncio
-import rasterio
-from rasterio.merge import merge
 import glob
-import pyproj
-import shapefile
 from shapely.ops import transform
+from collections import Counter
+from utils.lazy import lazy_import
+from utils.logging import log_error, log_info
+from utils.metrics import traced
 
-# Configure logging to match main.py
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s %(levelname)s %(message)s',
-    handlers=[
-        logging.StreamHandler(),
-        logging.FileHandler('app.log')
-    ]
-)
-
-def log_error(message, extra=None):
-    def serialize_value(v):
-        if isinstance(v, (shapely.geometry.base.BaseGeometry)):
-            return mapping(v)  # Convert geometry to dict
-        try:
-            json.dumps(v)
-            return v
-        except TypeError:
-            return str(v)
-
-    safe_extra = {k: serialize_value(v) for k, v in (extra or {}).items()}
-    logging.error(json.dumps({"error": message, **safe_extra}))
+etree = lazy_import('lxml.etree')
+rasterio = lazy_import('rasterio')
+rasterio_merge = lazy_import('rasterio.merge')
+shapefile = lazy_import('shapefile')
 
 
-def log_info(message, extra=None):
-    logging.info(json.dumps({"message": message, **(extra or {})}))
-
-async def parse_geojson(file_path):
-    """Parse a GeoJSON file asynchronously."""
+@traced('parse.geojson')
+def parse_geojson_sync(file_path):
+    """Parse a GeoJSON FeatureCollection file."""
     try:
-        async with aiofiles.open(file_path, 'r', encoding='utf-8') as f:
-            data = json.loads(await f.read())
+        with open(file_path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
         if data.get('type') != 'FeatureCollection':
             log_error("Invalid GeoJSON", {"file_path": file_path})
             raise ValueError("GeoJSON must be a FeatureCollection")
@@ -54,17 +30,18 @@ async def parse_geojson(file_path):
         log_error("Error parsing GeoJSON", {"file_path": file_path, "error": str(e)})
         raise
 
-def parse_geojson_sync(file_path):
-    """Synchronous wrapper for parse_geojson."""
-    return asyncio.run(parse_geojson(file_path))
+async def parse_geojson(file_path):
+    """Coroutine version of parse_geojson_sync, run in a worker thread so it does not block the event loop."""
+    return await asyncio.to_thread(parse_geojson_sync, file_path)
 
-async def parse_kml(path):
-    """Parse a KML file asynchronously and convert to GeoJSON."""
+@traced('parse.kml')
+def sync_parse_kml(path):
+    """Parse a KML file and convert it to a GeoJSON FeatureCollection."""
     try:
         # Normalize path for Windows compatibility
         path = os.path.normpath(path)
-        async with aiofiles.open(path, 'r', encoding='utf-8') as f:
-            content = await f.read()
+        with open(path, 'r', encoding='utf-8') as f:
+            content = f.read()
         if '<kml' not in content:
             log_error("Invalid KML file", {"file_path": path})
             raise ValueError("Invalid KML file: Missing <kml> tag")
@@ -80,6 +57,8 @@ async def parse_kml(path):
         ns = {'kml': 'http://www.opengis.net/kml/2.2'}
         geojson_features = []
         placemark_count = 0
+        # Problems are counted per reason and logged once, not once per placemark
+        skipped = Counter()
 
         for placemark in root.findall('.//kml:Placemark', namespaces=ns):
             placemark_count += 1
@@ -103,7 +82,7 @@ async def parse_kml(path):
                 if placemark.find('kml:Polygon', namespaces=ns) is not None:
                     geom = placemark.find('kml:Polygon/kml:outerBoundaryIs/kml:LinearRing/kml:coordinates', namespaces=ns)
                     if geom is None:
-                        log_error("Missing coordinates in Polygon", {"placemark": properties.get("name")})
+                        skipped["Missing coordinates in Polygon"] += 1
                         continue
                     coords = []
                     for coord in geom.text.strip().split('\n'):
@@ -111,29 +90,29 @@ async def parse_kml(path):
                             lon, lat, *_ = map(float, coord.strip().split(','))
                             coords.append([lon, lat])
                         except ValueError:
-                            log_error("Invalid coordinate format in Polygon", {"placemark": properties.get("name")})
+                            skipped["Invalid coordinate format in Polygon"] += 1
                             continue
                     if len(coords) < 3:
-                        log_error("Invalid Polygon: Too few coordinates", {"placemark": properties.get("name")})
+                        skipped["Invalid Polygon: Too few coordinates"] += 1
                         continue
                     geom_type = "Polygon"
                     geom_coords = [coords]
                 elif placemark.find('kml:Point', namespaces=ns) is not None:
                     geom = placemark.find('kml:Point/kml:coordinates', namespaces=ns)
                     if geom is None:
-                        log_error("Missing coordinates in Point", {"placemark": properties.get("name")})
+                        skipped["Missing coordinates in Point"] += 1
                         continue
                     try:
                         lon, lat, *_ = map(float, geom.text.strip().split(','))
                         geom_type = "Point"
                         geom_coords = [lon, lat]
                     except ValueError:
-                        log_error("Invalid coordinate format in Point", {"placemark": properties.get("name")})
+                        skipped["Invalid coordinate format in Point"] += 1
                         continue
                 elif placemark.find('kml:LineString', namespaces=ns) is not None:
                     geom = placemark.find('kml:LineString/kml:coordinates', namespaces=ns)
                     if geom is None:
-                        log_error("Missing coordinates in LineString", {"placemark": properties.get("name")})
+                        skipped["Missing coordinates in LineString"] += 1
                         continue
                     coords = []
                     for coord in geom.text.strip().split('\n'):
@@ -141,10 +120,10 @@ async def parse_kml(path):
                             lon, lat, *_ = map(float, coord.strip().split(','))
                             coords.append([lon, lat])
                         except ValueError:
-                            log_error("Invalid coordinate format in LineString", {"placemark": properties.get("name")})
+                            skipped["Invalid coordinate format in LineString"] += 1
                             continue
                     if len(coords) < 2:
-                        log_error("Invalid LineString: Too few coordinates", {"placemark": properties.get("name")})
+                        skipped["Invalid LineString: Too few coordinates"] += 1
                         continue
                     geom_type = "LineString"
                     geom_coords = coords
@@ -157,48 +136,48 @@ async def parse_kml(path):
                             coords = []
                             coord_elem = geom.find('kml:outerBoundaryIs/kml:LinearRing/kml:coordinates', namespaces=ns)
                             if coord_elem is None:
-                                log_error("Missing coordinates in MultiGeometry Polygon", {"placemark": properties.get("name")})
+                                skipped["Missing coordinates in MultiGeometry Polygon"] += 1
                                 continue
                             for coord in coord_elem.text.strip().split('\n'):
                                 try:
                                     lon, lat, *_ = map(float, coord.strip().split(','))
                                     coords.append([lon, lat])
                                 except ValueError:
-                                    log_error("Invalid coordinate in MultiGeometry Polygon", {"placemark": properties.get("name")})
+                                    skipped["Invalid coordinate in MultiGeometry Polygon"] += 1
                                     continue
                             if len(coords) >= 3:
                                 geom_coords.append({"type": "Polygon", "coordinates": [coords]})
                         elif geom.tag.endswith('Point'):
                             coord_elem = geom.find('kml:coordinates', namespaces=ns)
                             if coord_elem is None:
-                                log_error("Missing coordinates in MultiGeometry Point", {"placemark": properties.get("name")})
+                                skipped["Missing coordinates in MultiGeometry Point"] += 1
                                 continue
                             try:
                                 lon, lat, *_ = map(float, coord_elem.text.strip().split(','))
                                 geom_coords.append({"type": "Point", "coordinates": [lon, lat]})
                             except ValueError:
-                                log_error("Invalid coordinate in MultiGeometry Point", {"placemark": properties.get("name")})
+                                skipped["Invalid coordinate in MultiGeometry Point"] += 1
                                 continue
                         elif geom.tag.endswith('LineString'):
                             coords = []
                             coord_elem = geom.find('kml:coordinates', namespaces=ns)
                             if coord_elem is None:
-                                log_error("Missing coordinates in MultiGeometry LineString", {"placemark": properties.get("name")})
+                                skipped["Missing coordinates in MultiGeometry LineString"] += 1
                                 continue
                             for coord in coord_elem.text.strip().split('\n'):
                                 try:
                                     lon, lat, *_ = map(float, coord.strip().split(','))
                                     coords.append([lon, lat])
                                 except ValueError:
-                                    log_error("Invalid coordinate in MultiGeometry LineString", {"placemark": properties.get("name")})
+                                    skipped["Invalid coordinate in MultiGeometry LineString"] += 1
                                     continue
                             if len(coords) >= 2:
                                 geom_coords.append({"type": "LineString", "coordinates": coords})
                         else:
-                            log_error("Unsupported geometry in MultiGeometry", {"placemark": properties.get("name"), "geometry": geom.tag})
+                            skipped["Unsupported geometry in MultiGeometry"] += 1
                             continue
                 else:
-                    log_error("Unsupported geometry", {"placemark": properties.get("name")})
+                    skipped["Unsupported geometry"] += 1
                     continue
 
                 # Validate geometry with Shapely
@@ -211,8 +190,8 @@ async def parse_kml(path):
                         shape(LineString(geom_coords))
                     elif geom_type == "GeometryCollection":
                         shape(GeometryCollection([shape({"type": g["type"], "coordinates": g["coordinates"]}) for g in geom_coords]))
-                except Exception as e:
-                    log_error("Invalid geometry", {"placemark": properties.get("name"), "error": str(e)})
+                except Exception:
+                    skipped["Invalid geometry"] += 1
                     continue
 
                 geojson_features.append({
@@ -224,14 +203,16 @@ async def parse_kml(path):
                     "properties": properties
                 })
 
-            except Exception as e:
-                log_error("Error processing placemark", {"placemark": properties.get("name"), "error": str(e)})
+            except Exception:
+                skipped["Error processing placemark"] += 1
                 continue
 
         result = {
             "type": "FeatureCollection",
             "features": geojson_features
         }
+        if skipped:
+            log_error("Ignored invalid KML content", {"file_path": path, "counts": dict(skipped)})
         log_info("Parsed KML", {"file_path": path, "placemarks": placemark_count, "features": len(geojson_features)})
         return result
 
@@ -239,9 +220,9 @@ async def parse_kml(path):
         log_error("Error parsing KML", {"file_path": path, "error": str(e)})
         raise
 
-def sync_parse_kml(path):
-    """Synchronous wrapper for parse_kml for compatibility with synchronous code."""
-    return asyncio.run(parse_kml(path))
+async def parse_kml(path):
+    """Coroutine version of sync_parse_kml, run in a worker thread so it does not block the event loop."""
+    return await asyncio.to_thread(sync_parse_kml, path)
 
 def merge_and_save_dem(folder_path):
     search_path = os.path.join(folder_path, "*.tif")
@@ -251,7 +232,7 @@ def merge_and_save_dem(folder_path):
         raise FileNotFoundError("No .tif files found in the specified folder.")
 
     src_files = [rasterio.open(fp) for fp in tif_files]
-    merged_array, transform = merge(src_files)
+    merged_array, transform = rasterio_merge.merge(src_files)
     crs = src_files[0].crs  # use CRS from first file
 
     for src in src_files:
@@ -274,6 +255,7 @@ def merge_and_save_dem(folder_path):
     return temp_tif_path
 
 
+@traced('parse.shapefile')
 def parse_shapefile(upload_folder):
     try:
         shp_path = os.path.join(upload_folder, 'uploaded.shp')
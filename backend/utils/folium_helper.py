@@ -1,6 +1,6 @@
-import folium
-from branca.element import Template, MacroElement
-from folium import Map, features
+from utils.lazy import lazy_import
+
+folium = lazy_import('folium')
 
 def add_legend_and_stats(folium_map, stats):
     legend_html = f'''
@@ -0,0 +1,224 @@
+# utils/geojson_writer.py
+import json
+import os
+import zlib
+import numpy as np
+import shapely
+from flask import Response, request, stream_with_context
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Decimal places kept in coordinates; 6 decimals of a degree is about 0.1 m
+DEFAULT_PRECISION = int(os.getenv('GEOJSON_PRECISION', '6'))
+MAX_PRECISION = 15
+# Smaller bodies are not worth the compression overhead
+MIN_COMPRESS_SIZE = 1024
+GZIP_LEVEL = 6
+ZSTD_LEVEL = 3
+BROTLI_QUALITY = 5
+
+
+def dumps(obj):
+    """Compact JSON as bytes, with orjson when it is installed."""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(obj, separators=(',', ':'), default=_json_default).encode()
+
+def loads(data):
+    return orjson.loads(data) if orjson is not None else json.loads(data)
+
+def quantize(geometries, precision):
+    """Round every coordinate (including Z) to ``precision`` decimals; None keeps them as they are."""
+    if precision is None:
+        return geometries
+    return shapely.transform(geometries, lambda coords: np.round(coords, precision), include_z=None)
+
+def encode_features(geometries, properties, ids=None, precision=None, keys=None, raw_geometries=None):
+    """
+    Encode GeoJSON Feature objects, one bytes value per geometry.
+
+    Geometries are written by GEOS in one vectorized call. ``properties`` and
+    ``ids`` may be Python values or, as ``str``/``bytes``, JSON that is
+    already encoded (as stored in the feature store), which is copied as-is
+    unless ``keys`` restricts the properties to a subset. Where a geometry is
+    None, ``raw_geometries`` may give its GeoJSON to copy as-is instead of null.
+    """
+    geometries = np.asarray(geometries, dtype=object)
+    encoded = shapely.to_geojson(quantize(geometries, precision)) if len(geometries) else []
+    features = []
+    for i, (geometry, props) in enumerate(zip(encoded, properties)):
+        raw = raw_geometries[i] if raw_geometries is not None and geometry is None else None
+        feature = b'{"type":"Feature","geometry":' + (
+            geometry.encode() if geometry is not None else _raw_json(raw) if raw is not None else b'null')
+        feature += b',"properties":' + _properties_json(props, keys)
+        feature_id = ids[i] if ids is not None else None
+        if feature_id is not None:
+            feature += b',"id":' + _raw_json(feature_id)
+        features.append(feature + b'}')
+    return features
+
+def encode_collection(data, precision=None, keys=None):
+    """
+    Serialize a GeoJSON FeatureCollection dict to bytes.
+
+    Coordinates are rounded with numpy one coordinate array at a time and
+    written by the JSON encoder, so the dict never goes through GEOS.
+    """
+    if precision is None and keys is None:
+        return dumps(data)
+    features = []
+    for feature in data.get('features') or []:
+        feature = dict(feature)
+        if precision is not None and feature.get('geometry'):
+            feature['geometry'] = quantize_geometry(feature['geometry'], precision)
+        if keys is not None:
+            feature['properties'] = {key: value for key, value in (feature.get('properties') or {}).items() if key in keys}
+        features.append(feature)
+    return dumps({**data, 'features': features})
+
+def quantize_geometry(geometry, precision):
+    """Copy of a GeoJSON geometry dict with coordinates rounded to ``precision`` decimals."""
+    if geometry.get('type') == 'GeometryCollection':
+        return {**geometry, 'geometries': [quantize_geometry(g, precision) for g in geometry.get('geometries') or []]}
+    if 'coordinates' not in geometry:
+        return geometry
+    return {**geometry, 'coordinates': _round_coordinates(geometry['coordinates'], precision)}
+
+def collection_start(header=None):
+    """Opening bytes of a FeatureCollection with ``header`` members, up to the features array."""
+    header = {"type": "FeatureCollection", **(header or {})}
+    return dumps(header)[:-1] + b',"features":['
+
+def request_options(default_precision=DEFAULT_PRECISION):
+    """
+    ``(precision, keys)`` from the ``precision`` and ``properties`` query parameters.
+
+    ``precision`` is a number of decimals or ``full``; ``properties`` is a
+    comma-separated list of keys to keep (empty keeps none). Raises
+    ValueError for invalid values.
+    """
+    value = request.args.get('precision')
+    if value is None:
+        precision = default_precision
+    elif value == 'full':
+        precision = None
+    else:
+        try:
+            precision = int(value)
+        except ValueError:
+            raise ValueError("precision must be a number of decimals or 'full'")
+        if not 0 <= precision <= MAX_PRECISION:
+            raise ValueError(f"precision must be between 0 and {MAX_PRECISION}")
+    keys = request.args.get('properties')
+    if keys is not None:
+        keys = [key for key in keys.split(',') if key]
+    return precision, keys
+
+def available_encodings():
+    """Content codings this server can produce, in order of preference."""
+    encodings = []
+    if brotli is not None:
+        encodings.append('br')
+    if zstandard is not None:
+        encodings.append('zstd')
+    return encodings + ['gzip']
+
+def negotiate_encoding():
+    """Best content coding accepted by the client, or None for identity."""
+    return request.accept_encodings.best_match(available_encodings())
+
+def compress(data, encoding):
+    if encoding == 'br':
+        return brotli.compress(data, quality=BROTLI_QUALITY)
+    if encoding == 'zstd':
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+    if encoding == 'gzip':
+        compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+        return compressor.compress(data) + compressor.flush()
+    return data
+
+def compress_stream(chunks, encoding):
+    """Compress an iterable of str/bytes chunks incrementally."""
+    if encoding == 'br':
+        compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+        compress_chunk, finish = compressor.process, compressor.finish
+    elif encoding == 'zstd':
+        compressor = zstandard.ZstdCompressor(level=ZSTD_LEVEL).compressobj()
+        compress_chunk, finish = compressor.compress, compressor.flush
+    elif encoding == 'gzip':
+        compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+        compress_chunk, finish = compressor.compress, compressor.flush
+    else:
+        for chunk in chunks:
+            yield chunk.encode() if isinstance(chunk, str) else chunk
+        return
+    for chunk in chunks:
+        data = compress_chunk(chunk.encode() if isinstance(chunk, str) else chunk)
+        if data:
+            yield data
+    yield finish()
+
+def json_response(payload, status=200):
+    """A JSON response for an already-encoded body, compressed as negotiated."""
+    return compressed_response(payload, 'application/json', status=status)
+
+def compressed_response(payload, mimetype, status=200):
+    encoding = negotiate_encoding() if len(payload) >= MIN_COMPRESS_SIZE else None
+    response = Response(compress(payload, encoding), status=status, mimetype=mimetype)
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    return response
+
+def streamed_response(chunks, mimetype='application/json'):
+    """A streamed response whose chunks are compressed as negotiated."""
+    encoding = negotiate_encoding()
+    response = Response(stream_with_context(compress_stream(chunks, encoding)), mimetype=mimetype)
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    return response
+
+def _round_coordinates(coordinates, precision):
+    if not isinstance(coordinates, (list, tuple)):
+        return coordinates
+    try:
+        return np.round(np.asarray(coordinates, dtype=float), precision)
+    except (TypeError, ValueError):
+        # Ragged nesting (rings of different lengths) or mixed 2D/3D positions
+        return [_round_coordinates(c, precision) for c in coordinates]
+
+def _properties_json(props, keys):
+    if keys is None:
+        return _raw_json(props) if props is not None else b'{}'
+    if isinstance(props, (str, bytes)):
+        props = loads(props)
+    props = props or {}
+    return dumps({key: props[key] for key in keys if key in props})
+
+def _raw_json(value):
+    if isinstance(value, bytes):
+        return value
+    if isinstance(value, str):
+        return value.encode()
+    return dumps(value)
+
+def _json_default(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
@@ -0,0 +1,73 @@
+# utils/geometry.py
+from itertools import chain
+import numpy as np
+import shapely
+from shapely.geometry import shape
+from utils.logging import log_error
+
+
+def feature_geometries(features):
+    """
+    Convert GeoJSON features to a Shapely geometry array.
+
+    Points, LineStrings and Polygons are built with one vectorized Shapely call
+    per type, from coordinates flattened into a single array; other geometry
+    types go through ``shape``. Features whose
+    geometry cannot be built map to None.
+    """
+    geoms = np.empty(len(features), dtype=object)
+    points, lines, rings = ([], [], []), ([], [], []), ([], [], [], [])
+    failed = []
+    for i, feature in enumerate(features):
+        try:
+            geometry = feature["geometry"]
+            geom_type = geometry.get("type")
+            if geom_type == "Point":
+                coords = geometry["coordinates"]
+                points[0].append(i)
+                points[1].append(float(coords[0]))
+                points[2].append(float(coords[1]))
+            elif geom_type == "LineString" and _is_xy_sequence(geometry["coordinates"], 2):
+                coords = geometry["coordinates"]
+                lines[0].append(i)
+                lines[1].extend(coords)
+                lines[2].append(len(coords))
+            elif geom_type == "Polygon" and geometry["coordinates"] and all(
+                    _is_xy_sequence(ring, 4) for ring in geometry["coordinates"]):
+                for ring in geometry["coordinates"]:
+                    rings[0].append(i)
+                    rings[1].extend(ring)
+                    rings[2].append(len(ring))
+            else:
+                geoms[i] = shape(geometry)
+        except Exception as e:
+            failed.append({"feature_name": _feature_name(feature), "error": str(e)})
+    if failed:
+        # One line per call rather than per feature; a few examples are enough to diagnose
+        log_error("Error processing features", {"count": len(failed), "examples": failed[:5]})
+    if points[0]:
+        geoms[points[0]] = shapely.points(points[1], points[2])
+    if lines[0]:
+        geoms[lines[0]] = shapely.linestrings(
+            _xy_array(lines[1]), indices=np.repeat(np.arange(len(lines[0])), lines[2])
+        )
+    if rings[0]:
+        ring_owner = np.asarray(rings[0])
+        ring_geoms = shapely.linearrings(
+            _xy_array(rings[1]), indices=np.repeat(np.arange(len(ring_owner)), rings[2])
+        )
+        # Rings of one feature are contiguous; the first one is the shell
+        owners, polygon_idx = np.unique(ring_owner, return_inverse=True)
+        geoms[owners] = shapely.polygons(ring_geoms, indices=polygon_idx)
+    return geoms
+
+def _is_xy_sequence(coords, min_length):
+    return len(coords) >= min_length and set(map(len, coords)) == {2}
+
+def _xy_array(coords):
+    """(n, 2) float array from a list of [x, y] pairs; much faster than np.asarray on nested lists."""
+    return np.fromiter(chain.from_iterable(coords), dtype=float, count=2 * len(coords)).reshape(-1, 2)
+
+def _feature_name(feature):
+    properties = feature.get("properties") if isinstance(feature, dict) else None
+    return (properties or {}).get("name", "Unnamed")
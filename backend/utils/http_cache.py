@@ -0,0 +1,129 @@
+# utils/http_cache.py
+import gzip
+import mimetypes
+import os
+import re
+import shutil
+import sys
+from flask import request, send_file
+from werkzeug.exceptions import NotFound
+from werkzeug.security import safe_join
+from utils.artifacts import atomic_path, file_sha256
+from utils.cache import LRUCache
+from utils.logging import log_error, log_info
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+IMMUTABLE = 'public, max-age=31536000, immutable'
+REVALIDATE = 'no-cache'
+
+# Types worth compressing; images and GeoTIFFs are already compressed
+COMPRESSIBLE_EXTENSIONS = {'.html', '.js', '.mjs', '.css', '.json', '.geojson', '.svg', '.txt', '.csv', '.xml', '.map'}
+MIN_COMPRESS_SIZE = 1024
+
+# Artifact store names are the file's SHA-256, which doubles as its ETag
+CAS_NAME = re.compile(r'^[0-9a-f]{64}$')
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+_etags = LRUCache(max_entries=4096)
+
+
+def send_cached(directory, filename, immutable=False):
+    """
+    Serve ``directory/filename`` with a content-hash ETag, 304 and Range support.
+
+    A precompressed ``.br`` or ``.gz`` sibling is sent instead when the client
+    accepts it and the sibling is at least as new as the file. ``immutable``
+    files (content-addressed URLs) are cached for a year; everything else must
+    be revalidated, which costs a 304 when unchanged.
+    """
+    path = safe_join(directory, filename)
+    if path is None or not os.path.isfile(path):
+        raise NotFound()
+    etag = content_etag(path)
+    mimetype = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+
+    send_path, encoding = _encoded_variant(path)
+    if encoding:
+        etag = f'{etag}-{encoding}'
+    response = send_file(send_path, mimetype=mimetype, download_name=os.path.basename(path),
+                         conditional=True, etag=etag, max_age=31536000 if immutable else None)
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    if any(os.path.exists(path + suffix) for _, suffix in ENCODINGS):
+        response.vary.add('Accept-Encoding')
+    response.headers['Cache-Control'] = IMMUTABLE if immutable else REVALIDATE
+    return response
+
+def content_etag(path):
+    """Strong ETag from the file's SHA-256; hashed once per (mtime, size)."""
+    stem = os.path.splitext(os.path.basename(path))[0]
+    if CAS_NAME.match(stem):
+        return stem[:32]
+    st = os.stat(path)
+    key = (path, st.st_mtime_ns, st.st_size)
+    etag = _etags.get(key)
+    if etag is None:
+        etag = _etags.put(key, file_sha256(path)[:32])
+    return etag
+
+def precompress(path):
+    """
+    Write ``.gz`` (and ``.br`` if brotli is installed) siblings for a compressible file.
+
+    Siblings that are already up to date are left alone. Returns the paths written.
+    """
+    ext = os.path.splitext(path)[1].lower()
+    if ext not in COMPRESSIBLE_EXTENSIONS or os.path.getsize(path) < MIN_COMPRESS_SIZE:
+        return []
+    written = []
+    mtime = os.path.getmtime(path)
+    if not _fresh(path + '.gz', mtime):
+        with open(path, 'rb') as src, atomic_path(path + '.gz') as tmp_path:
+            with gzip.GzipFile(tmp_path, 'wb', compresslevel=9, mtime=0) as dst:
+                shutil.copyfileobj(src, dst)
+        written.append(path + '.gz')
+    if brotli is not None and not _fresh(path + '.br', mtime):
+        with open(path, 'rb') as src:
+            data = brotli.compress(src.read(), quality=11)
+        with atomic_path(path + '.br') as tmp_path, open(tmp_path, 'wb') as dst:
+            dst.write(data)
+        written.append(path + '.br')
+    return written
+
+def precompress_tree(directory):
+    """Precompress every compressible file under ``directory`` (e.g. the ``dist`` build)."""
+    written = 0
+    for root, _, names in os.walk(directory):
+        for name in names:
+            if name.endswith(tuple(suffix for _, suffix in ENCODINGS)):
+                continue
+            try:
+                written += len(precompress(os.path.join(root, name)))
+            except OSError as e:
+                log_error("Failed to precompress file", {"file": os.path.join(root, name), "error": str(e)})
+    log_info("Precompressed static files", {"directory": directory, "written": written})
+    return written
+
+def _encoded_variant(path):
+    accepted = request.accept_encodings
+    mtime = os.path.getmtime(path)
+    for encoding, suffix in ENCODINGS:
+        if accepted[encoding] and _fresh(path + suffix, mtime):
+            return path + suffix, encoding
+    return path, None
+
+def _fresh(path, mtime):
+    try:
+        return os.path.getmtime(path) >= mtime
+    except OSError:
+        return False
+
+
+if __name__ == '__main__':
+    # Build step: python utils/http_cache.py dist
+    for target in sys.argv[1:] or ['dist']:
+        precompress_tree(target)
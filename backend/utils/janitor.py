@@ -0,0 +1,257 @@
+# utils/janitor.py
+import fnmatch
+import glob
+import json
+import os
+import shutil
+import threading
+import time
+from utils.artifacts import atomic_path
+from utils.logging import log_error, log_info
+
+# Generated files under the artifact root, relative to it. Everything else
+# (notably uploaded source DEMs in input/) is never touched.
+ARTIFACT_PATTERNS = ('*.png', '*.html', '*.tif', 'input/merged_dem.tif', 'cas/*/*', 'layers/*/*.json')
+# Intermediate files that are deleted once older than TEMP_MAX_AGE regardless of quota
+TEMP_PATTERNS = ('input/*_small.tif',)
+# Precompressed variants written next to an artifact; they share its lifetime
+COMPRESSED_SUFFIXES = ('.gz', '.br')
+PARTIAL_UPLOAD_DIR = os.path.join('input', '.partial')
+# Per-job workspaces are removed by their job; leftovers come from crashed workers
+JOBS_DIR = 'jobs'
+# Each worker process lists its pinned paths in <pid>.json here for the other processes' janitors
+PINS_DIR = 'pins'
+# Pin files not refreshed for this many sweep intervals belong to a process that has stopped
+PIN_FILE_INTERVALS = 3
+
+DEFAULT_QUOTA = int(os.getenv('ARTIFACT_QUOTA_MB', '2048')) * 1024 * 1024
+DEFAULT_INTERVAL = float(os.getenv('ARTIFACT_JANITOR_INTERVAL', '300'))
+TEMP_MAX_AGE = 3600
+PARTIAL_UPLOAD_MAX_AGE = 24 * 3600
+# Files modified this recently may still be being written
+MIN_AGE = 60
+
+
+class ArtifactJanitor:
+    """
+    Background cleanup of generated artifacts under ``root``.
+
+    Each sweep lists the artifacts matching ARTIFACT_PATTERNS with their size
+    and last access time (recorded through ``touch``, falling back to the
+    modification time), deletes expired temporaries and abandoned partial
+    uploads, and then evicts least recently used artifacts until the total is
+    within ``quota`` bytes. Paths returned by the registered pin sources, the
+    artifacts referenced by live cache entries, are never deleted.
+
+    Caches are per process, so with several worker processes each one writes
+    its pins to PINS_DIR (``publish_pins``, at every sweep and whenever a
+    source changes) and every janitor honours the pins of all of them.
+    """
+
+    def __init__(self, root, quota=DEFAULT_QUOTA, interval=DEFAULT_INTERVAL):
+        self.root = os.path.abspath(root)
+        self.quota = quota
+        self.interval = interval
+        self._access = {}
+        self._pin_sources = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._last_sweep = None
+        self._evicted = 0
+        self._evicted_bytes = 0
+
+    def touch(self, path):
+        """Record an access to ``path`` (e.g. once it has been served); entries for missing files are dropped by sweeps."""
+        self._access[os.path.abspath(path)] = time.time()
+
+    def add_pin_source(self, source):
+        """Register ``source()``, returning paths that must be kept."""
+        self._pin_sources.append(source)
+
+    def publish_pins(self):
+        """Write this process's pinned paths where the janitors of other worker processes read them."""
+        path = os.path.join(self.root, PINS_DIR, f'{os.getpid()}.json')
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with atomic_path(path) as tmp_path, open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(sorted(self._own_pins()), f)
+        except OSError as e:
+            log_error("Failed to publish pinned artifacts", {"file": path, "error": str(e)})
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self.publish_pins()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='artifact-janitor', daemon=True)
+        self._thread.start()
+        log_info("Artifact janitor started", {"root": self.root, "quota": self.quota, "interval": self.interval})
+
+    def stop(self):
+        self._stop.set()
+
+    def artifacts(self):
+        """Tracked artifacts as dicts of path, size, last_access and pinned, least recently used first."""
+        pinned = self._pinned()
+        entries = []
+        for pattern in ARTIFACT_PATTERNS + TEMP_PATTERNS:
+            for path in glob.glob(os.path.join(self.root, pattern)):
+                if path.endswith(COMPRESSED_SUFFIXES):
+                    continue
+                try:
+                    st = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                if not os.path.isfile(path):
+                    continue
+                entries.append({
+                    "path": path,
+                    "size": st.st_size + sum(_size(path + suffix) for suffix in COMPRESSED_SUFFIXES),
+                    "modified": st.st_mtime,
+                    # Hard links (an installed merged_dem.tif and its CAS copy) share one inode
+                    "inode": (st.st_dev, st.st_ino),
+                    "last_access": max(self._access.get(path, 0), st.st_mtime),
+                    "pinned": path in pinned,
+                    "temporary": any(fnmatch.fnmatch(path, os.path.join(self.root, p)) for p in TEMP_PATTERNS)
+                })
+        unique = {entry["path"]: entry for entry in entries}
+        return sorted(unique.values(), key=lambda entry: entry["last_access"])
+
+    def sweep(self):
+        """Run one cleanup pass; returns the number of files deleted."""
+        self.publish_pins()
+        with self._lock:
+            now = time.time()
+            deleted = self._remove_stale_dirs(os.path.join(self.root, PARTIAL_UPLOAD_DIR), 'parts', PARTIAL_UPLOAD_MAX_AGE, now)
+            deleted += self._remove_stale_dirs(os.path.join(self.root, JOBS_DIR), None, TEMP_MAX_AGE, now)
+            artifacts = self.artifacts()
+            tracked = {entry["path"] for entry in artifacts}
+            self._access = {path: when for path, when in self._access.items() if path in tracked}
+            kept = []
+            for entry in artifacts:
+                if entry["temporary"] and now - entry["modified"] > TEMP_MAX_AGE and not entry["pinned"]:
+                    deleted += self._delete(entry)
+                else:
+                    kept.append(entry)
+
+            total = _total_size(kept)
+            links = {}
+            for entry in kept:
+                links[entry["inode"]] = links.get(entry["inode"], 0) + 1
+            for entry in kept:
+                if total <= self.quota:
+                    break
+                if entry["pinned"] or now - entry["modified"] < MIN_AGE:
+                    continue
+                if self._delete(entry):
+                    deleted += 1
+                    links[entry["inode"]] -= 1
+                    # Space is only freed once the last link is gone
+                    if not links[entry["inode"]]:
+                        total -= entry["size"]
+            if total > self.quota:
+                log_error("Artifact quota exceeded by pinned or recent files", {"bytes": total, "quota": self.quota})
+            self._last_sweep = now
+            return deleted
+
+    def stats(self):
+        artifacts = self.artifacts()
+        return {
+            "root": self.root,
+            "quota": self.quota,
+            "bytes": _total_size(artifacts),
+            "files": len(artifacts),
+            "pinned": sum(1 for entry in artifacts if entry["pinned"]),
+            "evicted_files": self._evicted,
+            "evicted_bytes": self._evicted_bytes,
+            "last_sweep": self._last_sweep,
+            "interval": self.interval
+        }
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                deleted = self.sweep()
+                if deleted:
+                    log_info("Artifact janitor sweep", {"deleted": deleted})
+            except Exception as e:
+                log_error("Artifact janitor sweep failed", {"error": str(e)})
+
+    def _pinned(self):
+        """Paths pinned by this process and by the other worker processes sharing the root."""
+        pinned = self._own_pins()
+        now = time.time()
+        own_file = f'{os.getpid()}.json'
+        for path in glob.glob(os.path.join(self.root, PINS_DIR, '*.json')):
+            if os.path.basename(path) == own_file:
+                continue
+            try:
+                if now - os.path.getmtime(path) > PIN_FILE_INTERVALS * self.interval:
+                    os.remove(path)
+                    continue
+                with open(path, encoding='utf-8') as f:
+                    pinned.update(json.load(f))
+            except (OSError, ValueError):
+                continue
+        return pinned
+
+    def _own_pins(self):
+        pinned = set()
+        for source in self._pin_sources:
+            try:
+                pinned.update(os.path.abspath(path) for path in source() if path)
+            except Exception as e:
+                log_error("Failed to read pinned artifacts", {"error": str(e)})
+        return pinned
+
+    def _delete(self, entry):
+        try:
+            os.remove(entry["path"])
+        except FileNotFoundError:
+            return 0
+        except OSError as e:
+            log_error("Failed to remove artifact", {"file": entry["path"], "error": str(e)})
+            return 0
+        for suffix in COMPRESSED_SUFFIXES:
+            try:
+                os.remove(entry["path"] + suffix)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                log_error("Failed to remove compressed artifact", {"file": entry["path"] + suffix, "error": str(e)})
+        self._access.pop(entry["path"], None)
+        self._evicted += 1
+        self._evicted_bytes += entry["size"]
+        log_info("Removed artifact", {"file": entry["path"], "size": entry["size"]})
+        return 1
+
+    def _remove_stale_dirs(self, directory, marker, max_age, now):
+        """Remove subdirectories of ``directory`` whose ``marker`` (or themselves) are older than ``max_age``."""
+        try:
+            names = os.listdir(directory)
+        except FileNotFoundError:
+            return 0
+        deleted = 0
+        for name in names:
+            path = os.path.join(directory, name)
+            try:
+                # For partial uploads, receiving a part adds a marker file, which updates parts/
+                age = now - os.path.getmtime(os.path.join(path, marker) if marker else path)
+            except OSError:
+                age = now - os.path.getmtime(path)
+            if age > max_age:
+                shutil.rmtree(path, ignore_errors=True)
+                log_info("Removed stale directory", {"path": path})
+                deleted += 1
+        return deleted
+
+def _total_size(entries):
+    """Bytes used by ``entries``, counting files linked more than once a single time."""
+    return sum({entry["inode"]: entry["size"] for entry in entries}.values())
+
+def _size(path):
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
@@ -0,0 +1,101 @@
+# utils/lazy.py
+import importlib
+import importlib.util
+import sys
+import threading
+import time
+
+_modules = {}
+_lock = threading.Lock()
+
+
+class LazyModule:
+    """
+    Stand-in for a module that is imported on first attribute access.
+
+    Modules keep their usual ``rasterio.open(...)`` style while heavy
+    dependencies only load in the processes and requests that use them.
+    ``setup`` runs once, just before the import.
+    """
+
+    def __init__(self, name, setup=None):
+        self._name = name
+        self._setup = setup
+        self._module = None
+        self._seconds = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        if self._module is None:
+            with self._lock:
+                if self._module is None:
+                    start = time.perf_counter()
+                    if self._setup is not None:
+                        self._setup()
+                    module = importlib.import_module(self._name)
+                    self._seconds = time.perf_counter() - start
+                    self._module = module
+        return self._module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __repr__(self):
+        state = 'loaded' if self._module is not None else 'not loaded'
+        return f'<lazy module {self._name!r} ({state})>'
+
+
+def lazy_import(name, setup=None, optional=False):
+    """
+    A LazyModule for ``name``, shared by every caller.
+
+    With ``optional`` the result is None when the package is not installed,
+    the same contract as an ``import`` guarded by ``except ImportError``;
+    only the package's spec is looked up, nothing is imported.
+    """
+    if optional and importlib.util.find_spec(name.partition('.')[0]) is None:
+        return None
+    with _lock:
+        module = _modules.get(name)
+        if module is None:
+            module = _modules[name] = LazyModule(name, setup)
+    return module
+
+def _use_agg():
+    import matplotlib
+    matplotlib.use('Agg')  # Non-interactive backend
+
+# Shared so that every pyplot user gets the Agg backend, whichever imports it first
+pyplot = lazy_import('matplotlib.pyplot', setup=_use_agg)
+
+
+def preload(names=None):
+    """
+    Import lazily registered modules now; all of them by default.
+
+    Called before workers fork so they share the imported code copy-on-write.
+    Returns {module: seconds} for the modules this call imported; modules
+    that fail to import are skipped, as they would fail at first use anyway.
+    """
+    with _lock:
+        pending = [module for name, module in _modules.items()
+                   if module._module is None and (names is None or name in names)]
+    timings = {}
+    for module in pending:
+        try:
+            module._load()
+        except ImportError:
+            continue
+        timings[module._name] = round(module._seconds, 3)
+    return timings
+
+def stats():
+    """Import state of every lazy module, plus how many modules the process has imported in total."""
+    with _lock:
+        modules = dict(_modules)
+    return {
+        "lazy": {name: {"loaded": module._module is not None,
+                        "seconds": round(module._seconds, 3) if module._seconds is not None else None}
+                 for name, module in sorted(modules.items())},
+        "imported_modules": len(sys.modules)
+    }
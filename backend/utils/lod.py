@@ -0,0 +1,107 @@
+# utils/lod.py
+import os
+import numpy as np
+import shapely
+from utils.cache import LRUCache
+from utils.logging import log_info
+
+# Zooms with a precomputed level, each simplified to half a screen pixel; a
+# request between two levels gets the finer one, and anything finer than the
+# last level (about 0.3 m) gets the original geometries
+ZOOM_LEVELS = tuple(range(0, 19, 2))
+TILE_SIZE = 256
+MAX_ZOOM = 22
+
+
+def tolerance_for_zoom(zoom):
+    """Half the width of a screen pixel at ``zoom``, in degrees of longitude."""
+    return 360.0 / (TILE_SIZE * 2 ** zoom) / 2
+
+
+class LevelsOfDetail:
+    """
+    Simplifications of one set of geometries at every ZOOM_LEVELS tolerance,
+    plus any ``extra_tolerances`` (such as a route's default).
+
+    Levels are built from the finest to the coarsest, each from the previous
+    one, so every level is one vectorized Douglas-Peucker pass over an already
+    reduced input; that bounds the deviation from the original by twice the
+    level's tolerance. Geometries that this pass makes invalid, empty or
+    self-intersecting are redone with the topology-preserving variant, which
+    is much slower and so only used where needed. Levels are kept as WKB to
+    keep the cache small.
+    """
+
+    def __init__(self, geometries, extra_tolerances=()):
+        geometries = np.asarray(geometries, dtype=object)
+        self.original = shapely.to_wkb(geometries)
+        self.levels = {}
+        self.vertices = {0.0: int(shapely.get_num_coordinates(geometries).sum())}
+        current, encoded, previous = geometries, self.original, 0.0
+        for tolerance in sorted({tolerance_for_zoom(zoom) for zoom in ZOOM_LEVELS} | set(extra_tolerances)):
+            current = simplify(current, tolerance)
+            self.vertices[tolerance] = int(shapely.get_num_coordinates(current).sum())
+            # Fine levels often remove nothing; those share the finer level's WKB
+            if self.vertices[tolerance] != self.vertices[previous]:
+                encoded = shapely.to_wkb(current)
+            self.levels[tolerance], previous = encoded, tolerance
+
+    def level_for(self, tolerance):
+        """Coarsest precomputed tolerance that is not coarser than ``tolerance`` (0.0 is the original)."""
+        candidates = [t for t in self.levels if t <= tolerance]
+        return max(candidates) if candidates else 0.0
+
+    def geometries(self, tolerance):
+        """(level tolerance, geometries) for a requested tolerance in degrees."""
+        level = self.level_for(tolerance)
+        return level, shapely.from_wkb(self.levels[level] if level else self.original)
+
+    def nbytes(self):
+        arrays = {id(level): level for level in [self.original, *self.levels.values()]}
+        return sum(len(wkb) for level in arrays.values() for wkb in level if wkb is not None)
+
+
+def simplify(geometries, tolerance):
+    """Vectorized simplification that falls back to preserving topology where plain Douglas-Peucker breaks it."""
+    simplified = shapely.simplify(geometries, tolerance, preserve_topology=False)
+    broken = ((~shapely.is_valid(simplified) & shapely.is_valid(geometries))
+              | (shapely.is_empty(simplified) & ~shapely.is_empty(geometries))
+              | (~shapely.is_simple(simplified) & shapely.is_simple(geometries)))
+    if broken.any():
+        simplified[broken] = shapely.simplify(geometries[broken], tolerance, preserve_topology=True)
+    return simplified
+
+
+# Levels by content hash of the source data
+lod_cache = LRUCache(max_bytes=int(os.getenv('LOD_CACHE_MB', '256')) * 1024 * 1024, sizeof=lambda lod: lod.nbytes())
+
+
+def get_levels(key, load, extra_tolerances=()):
+    """Levels for the geometries returned by ``load()``, built once per ``key`` (a content hash of their source)."""
+    key = (key, tuple(sorted(extra_tolerances)))
+    lod = lod_cache.get(key)
+    if lod is None:
+        lod = lod_cache.put(key, LevelsOfDetail(load(), extra_tolerances))
+        log_info("Built levels of detail", {"key": key, "features": len(lod.original), "vertices": lod.vertices[0.0],
+                                             "coarsest_vertices": lod.vertices[max(lod.levels)]})
+    return lod
+
+def requested_tolerance(args, default):
+    """
+    Tolerance in degrees from ``zoom`` or ``tolerance`` request arguments.
+
+    Raises ValueError for values that are not numbers or are out of range.
+    """
+    tolerance = args.get('tolerance', type=float)
+    zoom = args.get('zoom', type=float)
+    if (args.get('tolerance') is not None and tolerance is None) or (args.get('zoom') is not None and zoom is None):
+        raise ValueError("zoom and tolerance must be numbers")
+    if tolerance is not None:
+        if not 0 <= tolerance < 180:
+            raise ValueError("tolerance must be between 0 and 180 degrees")
+        return tolerance
+    if zoom is not None:
+        if not 0 <= zoom <= MAX_ZOOM:
+            raise ValueError(f"zoom must be between 0 and {MAX_ZOOM}")
+        return tolerance_for_zoom(zoom)
+    return default
@@ -1,28 +1,173 @@
 # utils/logging.py
+import atexit
 import json
 import logging
+import os
+import queue
+import threading
+import time
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+import numpy as np
 import shapely
-from shapely.geometry import mapping
 
-# Configure logging to match main.py
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s %(levelname)s %(message)s',
-    handlers=[logging.StreamHandler(), logging.FileHandler('app.log')]
-)
+LOG_FILE = os.getenv('LOG_FILE', 'app.log')
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+LOG_MAX_BYTES = int(os.getenv('LOG_MAX_MB', '10')) * 1024 * 1024
+LOG_BACKUPS = int(os.getenv('LOG_BACKUPS', '5'))
+LOG_FORMAT = '%(asctime)s %(levelname)s %(message)s'
+# Records waiting for the writer thread; beyond this they are dropped rather than blocking a request
+QUEUE_SIZE = int(os.getenv('LOG_QUEUE_SIZE', '10000'))
+# Records per message text per window; the rest are counted and reported with the next one let through
+RATE_LIMIT = int(os.getenv('LOG_RATE_LIMIT', '50'))
+RATE_WINDOW = 10.0
+# Payload caps: list/array items and dict keys kept, string length, nesting depth
+MAX_ITEMS = 20
+MAX_STRING = 2000
+MAX_DEPTH = 4
 
-def log_error(message, extra=None):
-    def serialize_value(v):
-        if isinstance(v, (shapely.geometry.base.BaseGeometry)):
-            return mapping(v)  # Convert geometry to dict
+
+class StructuredMessage:
+    """A JSON log payload, serialized only when a handler formats it, on the writer thread."""
+
+    __slots__ = ('key', 'message', 'extra')
+
+    def __init__(self, key, message, extra):
+        self.key = key
+        self.message = message
+        self.extra = extra
+
+    def __str__(self):
+        return json.dumps({self.key: self.message, **self.extra}, default=str)
+
+
+class _QueueHandler(QueueHandler):
+    """Hands records to the writer thread as they are; the queue never leaves the process, so nothing is pre-formatted."""
+
+    def __init__(self, record_queue):
+        super().__init__(record_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        return record
+
+    def enqueue(self, record):
         try:
-            json.dumps(v)
-            return v
-        except TypeError:
-            return str(v)
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class _RateLimiter:
+    def __init__(self, limit, window):
+        self.limit = limit
+        self.window = window
+        self.suppressed_total = 0
+        self._windows = {}
+        self._lock = threading.Lock()
 
-    safe_extra = {k: serialize_value(v) for k, v in (extra or {}).items()}
-    logging.error(json.dumps({"error": message, **safe_extra}))
+    def allow(self, key):
+        """None if a record for ``key`` should be dropped, else how many were dropped since the last one."""
+        now = time.monotonic()
+        with self._lock:
+            start, count, suppressed = self._windows.get(key, (now, 0, 0))
+            if now - start >= self.window:
+                start, count = now, 0
+            if count >= self.limit:
+                self._windows[key] = (start, count, suppressed + 1)
+                self.suppressed_total += 1
+                return None
+            if len(self._windows) > 4096:
+                # Messages are mostly fixed strings; this only guards against unbounded growth
+                self._windows.clear()
+            self._windows[key] = (start, count + 1, 0)
+            return suppressed
+
+
+_logger = logging.getLogger()
+_limiter = _RateLimiter(RATE_LIMIT, RATE_WINDOW)
+_handler = None
+_listener = None
+_configure_lock = threading.Lock()
+
+
+def configure():
+    """
+    Route all logging through one queue to a console and a rotating file handler.
+
+    Log calls only append to the queue; a listener thread formats and writes
+    the records. Safe to call more than once.
+    """
+    global _handler, _listener
+    with _configure_lock:
+        if _listener is not None:
+            return
+        formatter = logging.Formatter(LOG_FORMAT)
+        handlers = [logging.StreamHandler(),
+                    RotatingFileHandler(LOG_FILE, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUPS, encoding='utf-8')]
+        for handler in handlers:
+            handler.setFormatter(formatter)
+        _handler = _QueueHandler(queue.Queue(QUEUE_SIZE))
+        _logger.handlers[:] = [_handler]
+        _logger.setLevel(LOG_LEVEL)
+        _listener = QueueListener(_handler.queue, *handlers, respect_handler_level=True)
+        _listener.start()
+        # Write out what is still queued when the process exits
+        atexit.register(_listener.stop)
+
+def log_error(message, extra=None):
+    _log(logging.ERROR, "error", message, extra)
 
 def log_info(message, extra=None):
-    logging.info(json.dumps({"message": message, **(extra or {})}))
\ No newline at end of file
+    _log(logging.INFO, "message", message, extra)
+
+def stats():
+    return {
+        "queued": _handler.queue.qsize() if _handler else 0,
+        "dropped": _handler.dropped if _handler else 0,
+        "suppressed": _limiter.suppressed_total
+    }
+
+def _log(level, key, message, extra):
+    if not _logger.isEnabledFor(level):
+        return
+    suppressed = _limiter.allow(message)
+    if suppressed is None:
+        return
+    # Capping is bounded work and copies what could change before the writer thread serializes it
+    payload = {k: _capped(v) for k, v in (extra or {}).items()}
+    if suppressed:
+        payload["suppressed"] = suppressed
+    _logger.log(level, StructuredMessage(key, message, payload))
+
+def _capped(value, depth=0):
+    """A JSON-ready copy of ``value`` with long sequences, strings and geometries summarized."""
+    if value is None or isinstance(value, (bool, int, float)):
+        return value
+    if isinstance(value, str):
+        return value if len(value) <= MAX_STRING else f'{value[:MAX_STRING]}... ({len(value)} chars)'
+    if isinstance(value, shapely.Geometry):
+        return {"geometry_type": value.geom_type, "bounds": list(value.bounds),
+                "coordinates": int(shapely.get_num_coordinates(value))}
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        items = value.ravel()
+        if items.size <= MAX_ITEMS:
+            return items.tolist()
+        return {"count": int(items.size), "head": items[:MAX_ITEMS].tolist()}
+    if depth >= MAX_DEPTH:
+        return _capped(str(value))
+    if isinstance(value, dict):
+        capped = {str(k): _capped(v, depth + 1) for k, v in list(value.items())[:MAX_ITEMS]}
+        if len(value) > MAX_ITEMS:
+            capped["..."] = f"{len(value) - MAX_ITEMS} more keys"
+        return capped
+    if isinstance(value, (list, tuple, set)):
+        items = list(value) if isinstance(value, set) else value
+        if len(items) <= MAX_ITEMS:
+            return [_capped(v, depth + 1) for v in items]
+        return {"count": len(items), "head": [_capped(v, depth + 1) for v in items[:MAX_ITEMS]]}
+    return _capped(str(value))
+
+
+configure()
@@ -1,31 +1,32 @@
 import os
 from glob import glob
 import numpy as np
-import numpy.ma as ma
-import rasterio
-
-import matplotlib
-matplotlib.use('Agg')  # Non-interactive backend
-import matplotlib.pyplot as plt
-from rasterio.merge import merge
-from rasterio.enums import Resampling
-from rasterio.plot import show
-from rasterio.plot import reshape_as_image
-from rasterio.plot import show_hist
-from rasterio.warp import calculate_default_transform, reproject, Resampling
-import matplotlib.pyplot as plt
-from matplotlib.ticker import MaxNLocator
-import folium
-import branca.colormap as cm
-from matplotlib.colors import LightSource
+from utils.lazy import lazy_import, pyplot as plt
 from utils.logging import log_error, log_info
 
+# Imported on first use; most workers never render a DEM
+rasterio = lazy_import('rasterio')
+rasterio_merge = lazy_import('rasterio.merge')
+rasterio_warp = lazy_import('rasterio.warp')
+mpl_figure = lazy_import('matplotlib.figure')
+mpl_ticker = lazy_import('matplotlib.ticker')
+folium = lazy_import('folium')
+cm = lazy_import('branca.colormap')
 
 
-def merge_and_save_dem(folder_path):
+
+def merge_and_save_dem(folder_path, workdir=None):
+    """
+    Merge the DEM tiles of ``folder_path`` into ``merged_dem.tif``.
+
+    With ``workdir`` the downsampled intermediates and the merged output are
+    written there instead of next to the inputs, so concurrent merges of the
+    same folder do not interfere.
+    """
     # Remove redundant "input" from path
     base_path = folder_path if folder_path.endswith('input') else os.path.join(folder_path, 'input')
-    tif_files = [f for f in glob(os.path.join(base_path, "*.tif")) if not f.endswith("merged_dem.tif")]
+    tif_files = [f for f in glob(os.path.join(base_path, "*.tif"))
+                 if not f.endswith("merged_dem.tif") and not f.endswith("_small.tif")]
     log_info("Found TIFF files", {"files": tif_files, "folder_path": base_path})
     if not tif_files:
         log_error("No .tif files found in the specified folder.", {"folder_path": base_path})
@@ -38,7 +39,7 @@ def merge_and_save_dem(folder_path):
             scale_factor = 8
             data = src.read(
                 out_shape=(src.count, src.height // scale_factor, src.width // scale_factor),
-                resampling=Resampling.bilinear
+                resampling=rasterio_warp.Resampling.bilinear
             )
             if np.all(data == src.nodata) or np.isnan(data).all():
                 log_error("Invalid input DEM: contains only nodata or NaN", {"file": fp})
@@ -51,6 +52,8 @@ def merge_and_save_dem(folder_path):
                 (src.height / data.shape[1])
             )
             temp_fp = fp.replace(".tif", "_small.tif")
+            if workdir:
+                temp_fp = os.path.join(workdir, os.path.basename(temp_fp))
             out_meta = src.meta.copy()
             out_meta.update({
                 "height": data.shape[1],
@@ -68,7 +71,7 @@ def merge_and_save_dem(folder_path):
         raise ValueError("No valid DEM files after processing")
 
     src_files_to_mosaic = [rasterio.open(fp) for fp in downsampled_paths]
-    mosaic, out_transform = merge(src_files_to_mosaic)
+    mosaic, out_transform = rasterio_merge.merge(src_files_to_mosaic)
 
     if np.all(mosaic == src_files_to_mosaic[0].nodata) or np.isnan(mosaic).all():
         for src in src_files_to_mosaic:
@@ -76,7 +79,7 @@ def merge_and_save_dem(folder_path):
         log_error("Merged DEM contains only nodata or NaN values", {"folder_path": folder_path})
         raise ValueError("Merged DEM contains only nodata or NaN values")
 
-    out_fp = os.path.join(folder_path, "merged_dem.tif")
+    out_fp = os.path.join(workdir or folder_path, "merged_dem.tif")
     out_meta = src_files_to_mosaic[0].meta.copy()
     out_meta.update({
         "height": mosaic.shape[1],
@@ -122,36 +125,37 @@ def generate_hillshade(input, out_path='Uploads/hillshade.png'):
     shaded = (255 * (shaded - shaded.min()) / (shaded.max() - shaded.min())).astype(np.uint8)
 
     # Save the hillshade image to file
-    plt.imsave(out_path, shaded, cmap='gray')
+    if out_path:
+        plt.imsave(out_path, shaded, cmap='gray')
     # Return the shaded array instead of the file path
     return shaded
 
-def generate_static_preview(tif_path):
+def generate_static_preview(tif_path, output_path=os.path.join('Uploads', 'merged_dem_with_hillshade.png')):
     with rasterio.open(tif_path) as src:
         dem = src.read(1)
         dem = np.ma.masked_equal(dem, src.nodata)
-        hillshade = generate_hillshade(tif_path)  # Now returns the shaded array
+        hillshade = generate_hillshade(tif_path, out_path=None)  # Now returns the shaded array
 
-        fig, ax = plt.subplots(figsize=(12, 10))
+        # A standalone Figure keeps concurrent renders off pyplot's global state
+        fig = mpl_figure.Figure(figsize=(12, 10))
+        ax = fig.subplots()
         ax.imshow(hillshade, cmap='gray', alpha=1)  # Use the shaded array
         terrain = ax.imshow(dem, cmap='terrain', alpha=0.6)
-        plt.colorbar(terrain, ax=ax, label="Elevation (m)")
+        fig.colorbar(terrain, ax=ax, label="Elevation (m)")
         ax.set_title("Hillshaded DEM with Elevation Overlay")
         ax.grid(True, color='white', linestyle='--', linewidth=0.3)
         ax.set_xlabel("X (Columns)")
         ax.set_ylabel("Y (Rows)")
-        ax.xaxis.set_major_locator(MaxNLocator(integer=True))
-        ax.yaxis.set_major_locator(MaxNLocator(integer=True))
+        ax.xaxis.set_major_locator(mpl_ticker.MaxNLocator(integer=True))
+        ax.yaxis.set_major_locator(mpl_ticker.MaxNLocator(integer=True))
 
-        plt.tight_layout()
-        output_path = os.path.join('Uploads', 'merged_dem_with_hillshade.png')
-        plt.savefig(output_path, dpi=300)
-        plt.close()
+        fig.tight_layout()
+        fig.savefig(output_path, dpi=300)
     return output_path
 
 def reproject_to_wgs84(input_path, output_path):
     with rasterio.open(input_path) as src:
-        transform, width, height = calculate_default_transform(
+        transform, width, height = rasterio_warp.calculate_default_transform(
             src.crs, 'EPSG:4326', src.width, src.height, *src.bounds)
         kwargs = src.meta.copy()
         kwargs.update({
@@ -163,14 +167,14 @@ def reproject_to_wgs84(input_path, output_path):
 
         with rasterio.open(output_path, 'w', **kwargs) as dst:
             for i in range(1, src.count + 1):
-                reproject(
+                rasterio_warp.reproject(
                     source=rasterio.band(src, i),
                     destination=rasterio.band(dst, i),
                     src_transform=src.transform,
                     src_crs=src.crs,
                     dst_transform=transform,
                     dst_crs='EPSG:4326',
-                    resampling=Resampling.nearest)
+                    resampling=rasterio_warp.Resampling.nearest)
 
     return output_path
 
@@ -240,9 +244,6 @@ def export_to_folium(input_path, output_path='Uploads/interactive_map.html'):
 
 
 def extract_elevation_stats(tif_path):
-    import rasterio
-    import numpy as np
-
     with rasterio.open(tif_path) as src:
         band = src.read(1)
         band = band[band != src.nodata]
@@ -0,0 +1,156 @@
+# utils/metadata.py
+import csv
+import io
+from itertools import islice
+import numpy as np
+import shapely
+from utils.geojson_writer import dumps
+
+BATCH_SIZE = 5000
+CSV_COLUMNS = ["feature_id", "geometry_type", "centroid", "bbox"]
+
+
+class MetadataAccumulator:
+    """
+    Layer statistics computed batch by batch with vectorized Shapely calls.
+
+    ``add`` takes any batch of GeoJSON features, so it can be fed while a
+    parser is still producing them. The centroid is the area-weighted mean of
+    the polygon centroids, falling back to length-weighted line centroids and
+    then to the mean of the points, like the centroid of the geometries'
+    union but without computing the union.
+    """
+
+    def __init__(self):
+        self.total_features = 0
+        self.geometry_types = {}
+        self.unreadable = 0
+        self.invalid = 0
+        self.vertices = 0
+        self.bounds = [np.inf, np.inf, -np.inf, -np.inf]
+        # Per dimension (points, lines, polygons): total weight and weighted x, y sums
+        self.weights = np.zeros((3, 3))
+
+    def add(self, features):
+        """Add a batch of features."""
+        features = list(features)
+        self.total_features += len(features)
+        raw = [f.get("geometry") for f in features]
+        geometries = parse_geometries(raw)
+        readable = ~shapely.is_missing(geometries)
+        for geom, ok in zip(raw, readable):
+            if ok:
+                geom_type = geom.get("type", "Unknown")
+                self.geometry_types[geom_type] = self.geometry_types.get(geom_type, 0) + 1
+            elif geom:
+                self.unreadable += 1
+
+        present = geometries[readable & ~shapely.is_empty(geometries)]
+        if not len(present):
+            return
+        self.invalid += int((~shapely.is_valid(present)).sum())
+        self.vertices += int(shapely.get_num_coordinates(present).sum())
+        bounds = shapely.bounds(present)
+        self.bounds = [min(self.bounds[0], bounds[:, 0].min()), min(self.bounds[1], bounds[:, 1].min()),
+                       max(self.bounds[2], bounds[:, 2].max()), max(self.bounds[3], bounds[:, 3].max())]
+
+        parts = explode(present)
+        parts = parts[~shapely.is_empty(parts)]
+        dimensions = shapely.get_dimensions(parts)
+        centroids = shapely.centroid(parts)
+        x, y = shapely.get_x(centroids), shapely.get_y(centroids)
+        weights = np.select([dimensions == 2, dimensions == 1], [shapely.area(parts), shapely.length(parts)], 1.0)
+        for dimension in range(3):
+            mask = dimensions == dimension
+            if mask.any():
+                w = weights[mask]
+                self.weights[dimension] += [w.sum(), (w * x[mask]).sum(), (w * y[mask]).sum()]
+
+    def centroid(self):
+        for dimension in (2, 1, 0):
+            weight, x, y = self.weights[dimension]
+            if weight > 0:
+                return (float(x / weight), float(y / weight))
+        return None
+
+    def result(self):
+        has_bounds = np.isfinite(self.bounds[0])
+        return {
+            "total_features": self.total_features,
+            "geometry_types": self.geometry_types,
+            "bounding_box": tuple(float(v) for v in self.bounds) if has_bounds else None,
+            "centroid": self.centroid(),
+            "vertex_count": self.vertices,
+            "invalid_geometries": self.invalid,
+            "unreadable_geometries": self.unreadable
+        }
+
+
+def parse_geometries(raw):
+    """Shapely geometries for GeoJSON geometry dicts in one call; None where missing or unreadable."""
+    return shapely.from_geojson([dumps(geom) if geom else None for geom in raw], on_invalid='ignore')
+
+def explode(geometries):
+    """Single-part geometries of ``geometries``, including the members of (nested) collections."""
+    parts = np.asarray(geometries, dtype=object)
+    while True:
+        # Members of a collection may themselves be multipart or collections
+        multi = np.isin(shapely.get_type_id(parts), (4, 5, 6, 7))
+        if not multi.any():
+            return parts
+        parts = np.concatenate([parts[~multi], shapely.get_parts(parts[multi])])
+
+def batches(features, size=BATCH_SIZE):
+    iterator = iter(features)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+def summarize(features, batch_size=BATCH_SIZE):
+    """Metadata of an iterable of features, consumed ``batch_size`` at a time."""
+    accumulator = MetadataAccumulator()
+    for batch in batches(features, batch_size):
+        accumulator.add(batch)
+    return accumulator.result()
+
+def feature_rows(features, batch_size=BATCH_SIZE):
+    """
+    Yield lists of per-feature CSV rows (see CSV_COLUMNS), one list per batch.
+
+    Features are numbered from 1 in input order; those without a readable
+    geometry are skipped. Centroids and bounds are computed per batch.
+    """
+    feature_id = 1
+    for batch in batches(features, batch_size):
+        raw = [f.get("geometry") for f in batch]
+        geometries = parse_geometries(raw)
+        empty = shapely.is_empty(geometries)
+        # get_x raises on empty points, so empty geometries get no centroid
+        centroids = shapely.centroid(np.where(empty, None, geometries))
+        x, y = shapely.get_x(centroids).tolist(), shapely.get_y(centroids).tolist()
+        bounds = shapely.bounds(geometries).tolist()
+        rows = []
+        for i, (geom, shp) in enumerate(zip(raw, geometries)):
+            if shp is None:
+                continue
+            if empty[i]:
+                rows.append([feature_id + i, geom.get("type", "Unknown"), None, None])
+            else:
+                rows.append([feature_id + i, geom.get("type", "Unknown"), (x[i], y[i]), tuple(bounds[i])])
+        feature_id += len(batch)
+        yield rows
+
+def stream_csv(row_batches):
+    """Yield CSV text for batches of rows from ``feature_rows``, with a header first."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(CSV_COLUMNS)
+    for rows in row_batches:
+        writer.writerows(rows)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
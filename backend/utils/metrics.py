@@ -0,0 +1,241 @@
+# utils/metrics.py
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+from utils.logging import log_info
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# Seconds; covers fast API calls up to long DEM merges
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+# Spans shorter than this are only counted, not logged, so hot paths stay quiet
+SPAN_LOG_SECONDS = float(os.getenv('SPAN_LOG_SECONDS', '0.25'))
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+class Counter:
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1.0, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def collect(self):
+        with self._lock:
+            samples = [(self.name, dict(zip(self.labelnames, key)), value) for key, value in self._values.items()]
+        return [(self.name, 'counter', self.help, samples)]
+
+
+class Histogram:
+    def __init__(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            # Bucket counts are cumulative, as the exposition format expects
+            buckets, total, count = self._values.get(key, ([0] * len(self.buckets), 0.0, 0))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    buckets[i] += 1
+            self._values[key] = (buckets, total + value, count + 1)
+
+    def collect(self):
+        samples = []
+        with self._lock:
+            for key, (buckets, total, count) in self._values.items():
+                labels = dict(zip(self.labelnames, key))
+                for bound, bucket in zip(self.buckets, buckets):
+                    samples.append((f'{self.name}_bucket', {**labels, 'le': _format_value(bound)}, bucket))
+                samples.append((f'{self.name}_bucket', {**labels, 'le': '+Inf'}, count))
+                samples.append((f'{self.name}_sum', labels, total))
+                samples.append((f'{self.name}_count', labels, count))
+        return [(self.name, 'histogram', self.help, samples)]
+
+
+_metrics = []
+_collectors = []
+_registry_lock = threading.Lock()
+
+
+def counter(name, help, labelnames=()):
+    metric = Counter(name, help, labelnames)
+    with _registry_lock:
+        _metrics.append(metric)
+    return metric
+
+def histogram(name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+    metric = Histogram(name, help, labelnames, buckets)
+    with _registry_lock:
+        _metrics.append(metric)
+    return metric
+
+def register_stats(prefix, label, stats, counters=(), help=''):
+    """
+    Export a ``stats()`` callable returning ``{label value: {field: number}}`` at every scrape.
+
+    Each numeric field becomes ``<prefix>_<field>{<label>="..."}``; fields in
+    ``counters`` are exported as counters (with a ``_total`` suffix), the rest
+    as gauges. None and non-numeric values are skipped.
+    """
+    def collect():
+        families = {}
+        for value, fields in stats().items():
+            for field, number in fields.items():
+                if isinstance(number, bool) or not isinstance(number, (int, float)):
+                    continue
+                is_counter = field in counters
+                name = f'{prefix}_{field}' + ('_total' if is_counter and not field.endswith('_total') else '')
+                family = families.setdefault(name, (name, 'counter' if is_counter else 'gauge', help, []))
+                family[3].append((name, {label: value}, number))
+        return list(families.values())
+    register_collector(collect)
+
+def register_collector(collect):
+    """Add a callable returning [(name, type, help, [(sample name, labels, value)])], called at every scrape."""
+    with _registry_lock:
+        _collectors.append(collect)
+
+def register_cache(name, cache):
+    """Export the hit, miss, eviction and rejection counters and the size of an LRUCache."""
+    register_stats('cache', 'cache', lambda: {name: cache.stats()}, counters=('hits', 'misses', 'evictions', 'rejected'),
+                   help='LRU cache statistics')
+
+def render():
+    """All metrics in the Prometheus text exposition format."""
+    families = {}
+    with _registry_lock:
+        sources = [metric.collect for metric in _metrics] + list(_collectors)
+    for collect in sources:
+        for name, kind, help, samples in collect():
+            family = families.setdefault(name, (kind, help, []))
+            family[2].extend(samples)
+    lines = []
+    for name, (kind, help, samples) in families.items():
+        if help:
+            lines.append(f'# HELP {name} {help}')
+        lines.append(f'# TYPE {name} {kind}')
+        for sample_name, labels, value in samples:
+            label_text = ','.join(f'{key}="{_escape(val)}"' for key, val in labels.items())
+            lines.append(f'{sample_name}{{{label_text}}} {_format_value(value)}' if label_text
+                         else f'{sample_name} {_format_value(value)}')
+    return '\n'.join(lines) + '\n'
+
+
+REQUEST_SECONDS = histogram('http_request_duration_seconds', 'Time to build the response, per endpoint',
+                            ('endpoint', 'method', 'status'))
+STAGE_SECONDS = histogram('pipeline_stage_duration_seconds', 'Wall time of pipeline stages', ('stage',))
+STAGE_CPU = counter('pipeline_stage_cpu_seconds_total', 'CPU time of the thread running each stage', ('stage',))
+STAGE_READ = counter('pipeline_stage_read_bytes_total', 'Bytes read by the thread running each stage', ('stage',))
+STAGE_WRITTEN = counter('pipeline_stage_written_bytes_total', 'Bytes written by the thread running each stage',
+                        ('stage',))
+STAGE_ERRORS = counter('pipeline_stage_errors_total', 'Pipeline stages that raised', ('stage',))
+
+
+def observe_request(endpoint, method, status, seconds):
+    REQUEST_SECONDS.observe(seconds, endpoint=endpoint or 'unmatched', method=method, status=status)
+
+@contextmanager
+def span(stage, **fields):
+    """
+    Time one pipeline stage: wall time, thread CPU time, bytes read and written, and peak RSS.
+
+    Figures go to the ``pipeline_stage_*`` metrics; spans longer than
+    SPAN_LOG_SECONDS are also logged with ``fields``. I/O is counted per
+    thread from /proc where available, so concurrent requests do not mix.
+    """
+    io_before = _thread_io()
+    cpu_start = time.thread_time()
+    start = time.perf_counter()
+    failed = False
+    try:
+        yield
+    except BaseException:
+        failed = True
+        raise
+    finally:
+        seconds = time.perf_counter() - start
+        cpu = time.thread_time() - cpu_start
+        io_after = _thread_io()
+        STAGE_SECONDS.observe(seconds, stage=stage)
+        STAGE_CPU.inc(cpu, stage=stage)
+        read = written = None
+        if io_before and io_after:
+            read, written = io_after[0] - io_before[0], io_after[1] - io_before[1]
+            STAGE_READ.inc(read, stage=stage)
+            STAGE_WRITTEN.inc(written, stage=stage)
+        if failed:
+            STAGE_ERRORS.inc(stage=stage)
+        if seconds >= SPAN_LOG_SECONDS or failed:
+            log_info("Stage finished", {"stage": stage, "seconds": round(seconds, 3), "cpu_seconds": round(cpu, 3),
+                                        "read_bytes": read, "written_bytes": written,
+                                        "peak_rss_mb": _peak_rss_mb(), "failed": failed, **fields})
+
+def traced(stage):
+    """Decorator running the function inside ``span(stage)``."""
+    def decorator(f):
+        @wraps(f)
+        def decorated(*args, **kwargs):
+            with span(stage):
+                return f(*args, **kwargs)
+        return decorated
+    return decorator
+
+def peak_rss_bytes():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+def _collect_process():
+    if resource is None:
+        return []
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return [('process_cpu_seconds_total', 'counter', 'User and system CPU time of the server process',
+             [('process_cpu_seconds_total', {}, usage.ru_utime + usage.ru_stime)]),
+            ('process_peak_rss_bytes', 'gauge', 'Peak resident set size of the server process',
+             [('process_peak_rss_bytes', {}, peak_rss_bytes())])]
+
+register_collector(_collect_process)
+
+
+def _peak_rss_mb():
+    peak = peak_rss_bytes()
+    return round(peak / 1024 / 1024, 1) if peak is not None else None
+
+def _thread_io():
+    """(bytes read, bytes written) by the calling thread's read/write calls, or None off Linux."""
+    try:
+        with open('/proc/thread-self/io', 'rb') as f:
+            values = dict(line.split(b': ') for line in f.read().splitlines())
+        return int(values[b'rchar']), int(values[b'wchar'])
+    except (OSError, KeyError, ValueError):
+        return None
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer() and abs(value) < 1e15:
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
@@ -0,0 +1,47 @@
+# utils/projection.py
+from functools import lru_cache
+import numpy as np
+import shapely
+from utils.lazy import lazy_import
+
+pyproj = lazy_import('pyproj')
+
+WGS84 = 'EPSG:4326'
+
+
+@lru_cache(maxsize=64)
+def get_transformer(src_crs, dst_crs):
+    """Cached always_xy Transformer for a CRS pair."""
+    return pyproj.Transformer.from_crs(src_crs, dst_crs, always_xy=True)
+
+def utm_epsg(lon, lat):
+    """UTM EPSG codes for arrays of WGS84 longitudes and latitudes."""
+    lon = np.asarray(lon, dtype=float)
+    lat = np.asarray(lat, dtype=float)
+    zone = np.clip(np.floor((lon + 180.0) / 6.0).astype(int) + 1, 1, 60)
+    return np.where(lat >= 0, 32600, 32700) + zone
+
+def utm_zone_bounds(epsg, margin=0.0):
+    """Longitude/latitude box covered by a UTM zone, grown by ``margin`` degrees."""
+    zone = int(epsg) % 100
+    west = -180.0 + (zone - 1) * 6.0
+    south, north = (0.0, 84.0) if int(epsg) < 32700 else (-80.0, 0.0)
+    return (west - margin, south - margin, west + 6.0 + margin, north + margin)
+
+def transform_geometries(geometries, src_crs, dst_crs):
+    """
+    Reproject a geometry array in one batch.
+
+    All coordinates of all geometries are passed to pyproj as a single pair of
+    arrays. Geometries that end up with non-finite coordinates map to None.
+    """
+    transformer = get_transformer(src_crs, dst_crs)
+
+    def _transform(coords):
+        x, y = transformer.transform(coords[:, 0], coords[:, 1])
+        return np.column_stack((x, y))
+
+    projected = shapely.transform(geometries, _transform)
+    bounds = shapely.bounds(projected)
+    projected[~np.isfinite(bounds).all(axis=1) & ~shapely.is_empty(projected)] = None
+    return projected
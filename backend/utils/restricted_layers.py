@@ -0,0 +1,150 @@
+# utils/restricted_layers.py
+import hashlib
+import json
+import os
+import threading
+import numpy as np
+import shapely
+from shapely import STRtree
+from shapely.geometry import shape
+from utils.logging import log_error, log_info
+from utils.projection import WGS84, transform_geometries, utm_zone_bounds
+
+DEFAULT_LAYER = 'restricted'
+DEFAULT_LAYER_PATH = os.path.join('data', 'restricted_area.geojson')
+
+# Restricted areas this many degrees outside a UTM zone are still projected into
+# it, so features near a zone edge see neighbours across the boundary.
+ZONE_MARGIN = 3.0
+
+
+class RestrictedLayer:
+    """A loaded restricted-area layer: prepared geometries, index and response body."""
+
+    def __init__(self, name, path, stat, content_hash, geojson, geometries):
+        self.name = name
+        self.path = path
+        self.stat = stat
+        self.content_hash = content_hash
+        self.etag = content_hash[:32]
+        self.geometries = geometries
+        shapely.prepare(self.geometries)
+        self.tree = STRtree(self.geometries)
+        self.body = json.dumps({"geojson": geojson}).encode('utf-8')
+        self.feature_count = len(geojson.get("features", []))
+        self._projected = {}
+
+    def projected_tree(self, epsg):
+        """STRtree over the layer's geometries projected to ``epsg``, built once per CRS."""
+        tree = self._projected.get(epsg)
+        if tree is None:
+            nearby = self.tree.query(shapely.box(*utm_zone_bounds(epsg, margin=ZONE_MARGIN)))
+            geometries = transform_geometries(self.geometries[np.sort(nearby)], WGS84, f'EPSG:{epsg}')
+            geometries = geometries[~shapely.is_missing(geometries)]
+            shapely.prepare(geometries)
+            tree = STRtree(geometries)
+            self._projected[epsg] = tree
+        return tree
+
+
+class RestrictedLayerRegistry:
+    """
+    Process-wide cache of named restricted-area layers.
+
+    A layer is parsed once and kept until its file changes. Each lookup only
+    stats the file; the content is re-hashed when mtime or size differ, and the
+    layer is rebuilt only when the hash differs too.
+    """
+
+    def __init__(self):
+        self._paths = {}
+        self._layers = {}
+        self._lock = threading.Lock()
+
+    def register(self, name, path):
+        with self._lock:
+            if self._paths.get(name) != path:
+                self._paths[name] = path
+                self._layers.pop(name, None)
+
+    def names(self):
+        return sorted(self._paths)
+
+    def get(self, name=DEFAULT_LAYER):
+        """Return the current RestrictedLayer for ``name``, reloading it if the file changed."""
+        path = self._paths.get(name)
+        if path is None:
+            raise KeyError(f"Unknown restricted layer: {name}")
+        if not os.path.exists(path):
+            log_error("Restricted area file not found", {"path": path})
+            raise FileNotFoundError(f"Restricted area file not found: {path}")
+
+        stat = _file_stat(path)
+        layer = self._layers.get(name)
+        if layer is not None and layer.stat == stat:
+            return layer
+
+        with self._lock:
+            layer = self._layers.get(name)
+            if layer is not None and layer.stat == stat:
+                return layer
+            with open(path, 'rb') as f:
+                content = f.read()
+            content_hash = hashlib.sha256(content).hexdigest()
+            if layer is not None and layer.content_hash == content_hash:
+                layer.stat = stat
+                return layer
+            layer = _load_layer(name, path, stat, content, content_hash)
+            self._layers[name] = layer
+            log_info("Loaded restricted layer", {"name": name, "path": path, "features": layer.feature_count})
+            return layer
+
+    def get_path(self, path):
+        """Return the layer for ``path``, registering it under its path if needed."""
+        for name, registered in list(self._paths.items()):
+            if registered == path:
+                return self.get(name)
+        self.register(path, path)
+        return self.get(path)
+
+
+def _file_stat(path):
+    st = os.stat(path)
+    return (st.st_mtime_ns, st.st_size)
+
+def _load_layer(name, path, stat, content, content_hash):
+    restricted = json.loads(content)
+    if restricted.get("type") != "FeatureCollection":
+        log_error("Invalid restricted area GeoJSON", {"path": path})
+        raise ValueError("Restricted area must be a GeoJSON FeatureCollection")
+
+    restricted_shapes = []
+    for feature in restricted.get("features", []):
+        try:
+            restricted_shapes.append(shape(feature["geometry"]))
+        except Exception as e:
+            log_error("Invalid geometry in restricted area", {"path": path, "error": str(e)})
+            continue
+
+    if not restricted_shapes:
+        log_error("No valid geometries in restricted area", {"path": path})
+        raise ValueError("No valid geometries found in restricted area")
+
+    geometries = np.empty(len(restricted_shapes), dtype=object)
+    geometries[:] = restricted_shapes
+    return RestrictedLayer(name, path, stat, content_hash, restricted, geometries)
+
+def _configured_layers():
+    """Extra layers from RESTRICTED_LAYERS, formatted as ``name=path,name=path``."""
+    layers = {}
+    for entry in os.getenv('RESTRICTED_LAYERS', '').split(','):
+        name, sep, path = entry.partition('=')
+        if sep and name.strip() and path.strip():
+            layers[name.strip()] = path.strip()
+    return layers
+
+
+registry = RestrictedLayerRegistry()
+registry.register(DEFAULT_LAYER, DEFAULT_LAYER_PATH)
+for _name, _path in _configured_layers().items():
+    registry.register(_name, _path)
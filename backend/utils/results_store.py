@@ -0,0 +1,69 @@
+# utils/results_store.py
+import hashlib
+import json
+from utils import db
+from utils.logging import log_error, log_info
+
+SCHEMA = [
+    '''CREATE TABLE IF NOT EXISTS analysis_results
+       (kind TEXT NOT NULL,
+        version TEXT NOT NULL,
+        dataset_hash TEXT NOT NULL,
+        layer_hash TEXT NOT NULL,
+        params_hash TEXT NOT NULL,
+        params TEXT,
+        result TEXT NOT NULL,
+        timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (kind, version, dataset_hash, layer_hash, params_hash))'''
+]
+
+
+def init_store():
+    with db.transaction(immediate=True) as conn:
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(analysis_results)")}
+        if columns and 'version' not in columns:
+            # Results from before versioned keys cannot be attributed to a model; they are recomputed on demand
+            conn.execute("DROP TABLE analysis_results")
+            log_info("Dropped unversioned analysis results")
+        for statement in SCHEMA:
+            conn.execute(statement)
+
+def params_hash(params):
+    """Stable hash of a JSON-serializable parameter dict."""
+    return hashlib.sha256(json.dumps(params, sort_keys=True, separators=(',', ':')).encode('utf-8')).hexdigest()
+
+def result_key(kind, version, dataset_hash, layer_hash, params):
+    """
+    Key of a result: (kind, version, dataset hash, layer hash, parameter hash).
+
+    ``version`` identifies the code that computed the result, e.g.
+    risk_model.MODEL_VERSION, so a changed algorithm never serves old results.
+    """
+    return (kind, str(version), dataset_hash, layer_hash or '', params_hash(params))
+
+def result_etag(key):
+    """ETag for a result; it changes whenever any part of the key does."""
+    return hashlib.sha256('|'.join(key).encode('utf-8')).hexdigest()[:32]
+
+def get_result(key):
+    """Stored result for ``key``, or None."""
+    row = db.get_connection().execute(
+        '''SELECT result FROM analysis_results
+           WHERE kind = ? AND version = ? AND dataset_hash = ? AND layer_hash = ? AND params_hash = ?''', key
+    ).fetchone()
+    return json.loads(row[0]) if row else None
+
+def store_result(key, params, result, timeout=60):
+    """Store ``result`` under ``key``, replacing any previous result."""
+    try:
+        db.write_queue.submit(_insert_result, key, params, result).result(timeout=timeout)
+    except Exception as e:
+        # A result that cannot be cached is still returned to the caller
+        log_error("Failed to store analysis result", {"kind": key[0], "error": str(e)})
+
+def _insert_result(conn, key, params, result):
+    conn.execute('''INSERT OR REPLACE INTO analysis_results
+                    (kind, version, dataset_hash, layer_hash, params_hash, params, result)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)''',
+                 (*key, json.dumps(params, sort_keys=True), json.dumps(result)))
+    log_info("Stored analysis result", {"kind": key[0], "version": key[1], "dataset_hash": key[2][:12]})
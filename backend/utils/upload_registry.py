@@ -0,0 +1,208 @@
+# utils/upload_registry.py
+import hashlib
+import os
+import re
+import time
+import numpy as np
+import shapely
+from werkzeug.utils import secure_filename
+from utils import executor
+from utils.artifacts import ARTIFACT_ROOT, atomic_path
+from utils.cache import LRUCache
+from utils.file_parser import parse_geojson_sync, parse_shapefile, sync_parse_kml
+from utils.geojson_writer import dumps, loads
+from utils.logging import log_info
+from utils.metadata import parse_geometries
+
+HASH_BUFFER = 1024 * 1024
+# Parsed uploads are dropped after UPLOAD_TTL seconds or when the cache outgrows UPLOAD_CACHE_MB
+UPLOAD_TTL = int(os.getenv('UPLOAD_TTL', '3600'))
+UPLOAD_CACHE_MB = int(os.getenv('UPLOAD_CACHE_MB', '256'))
+# Largest upload accepted, summed over a shapefile's components
+MAX_FILE_SIZE = 10 * 1024 * 1024
+SHAPEFILE_COMPONENTS = ('shp', 'shx', 'dbf')
+# Parsed layers are also written here, so a handle issued by one worker process resolves in the others
+LAYER_DIR = os.path.join(ARTIFACT_ROOT, 'layers')
+HANDLE = re.compile(r'^[0-9a-f]{64}$')
+
+
+class UploadError(ValueError):
+    """The request names no parsable file."""
+
+
+class UploadTooLarge(UploadError):
+    """The file, or the layer parsed from it, exceeds a size limit."""
+
+
+class UnknownUpload(LookupError):
+    """A handle that was never issued or whose layer has been evicted."""
+
+
+class ParsedUpload:
+    """
+    One parsed layer: the FeatureCollection as compact JSON and its geometries as WKB.
+
+    Both forms are far smaller than the parsed Python objects and decode much
+    faster than the source file parses; ``data()`` returns a fresh copy, so
+    callers may modify it.
+    """
+
+    def __init__(self, handle, filename, data):
+        self.handle = handle
+        self.filename = filename
+        self.payload = dumps(data)
+        features = data.get("features") or []
+        self.feature_count = len(features)
+        geometries = parse_geometries([f.get("geometry") for f in features])
+        self.wkb = shapely.to_wkb(geometries[~shapely.is_missing(geometries)])
+
+    def data(self):
+        return loads(self.payload)
+
+    def geometries(self):
+        """Shapely geometries of the features that have a readable geometry."""
+        return shapely.from_wkb(self.wkb) if len(self.wkb) else np.empty(0, dtype=object)
+
+    def nbytes(self):
+        return len(self.payload) + sum(len(wkb) for wkb in self.wkb)
+
+
+class UploadRegistry:
+    """
+    Parsed uploads by content hash, so a file is parsed once however many endpoints it is sent to.
+
+    ``register`` saves and hashes an upload in one pass and only parses it on a
+    cache miss. The hash is the layer's handle: later requests can pass it
+    instead of the file, or re-upload the file and hit the cache.
+
+    Each parsed layer is also written to ``directory`` (the artifact janitor
+    keeps it within the quota). The cache is per process, so on a miss the
+    layer is read back from there, and a handle works on every worker of a
+    multi-process server. Written layers expire after ``ttl`` like cached ones.
+    """
+
+    def __init__(self, max_bytes=UPLOAD_CACHE_MB * 1024 * 1024, ttl=UPLOAD_TTL, max_file_size=MAX_FILE_SIZE,
+                 directory=LAYER_DIR):
+        self.cache = LRUCache(max_bytes=max_bytes, ttl=ttl, sizeof=lambda upload: upload.nbytes())
+        self.ttl = ttl
+        self.max_file_size = max_file_size
+        self.directory = directory
+
+    def get(self, handle):
+        upload = self.cache.get(handle) or self._load(handle)
+        if upload is None:
+            raise UnknownUpload(f"Unknown or expired upload handle: {handle}")
+        return upload
+
+    def register(self, files, workdir):
+        """
+        Parse the layer in ``files`` (a request's files), or return the cached parse of the same content.
+
+        The layer is the ``file`` part (.geojson, .kml or .shp) or a shapefile
+        given as ``shp``/``shx``/``dbf`` parts; shapefile components are hashed
+        together. Raises UploadError when no supported file was sent,
+        UploadTooLarge when the files exceed ``max_file_size`` or the parsed
+        layer could not be kept for its handle, and executor.ExecutorBusy when
+        the parse queue is full.
+        """
+        file = files.get('file')
+        if file and file.filename:
+            filename = secure_filename(file.filename)
+            ext = filename.rsplit('.', 1)[-1].lower() if '.' in filename else ''
+        elif 'shp' in files:
+            file, filename, ext = files['shp'], 'uploaded.shp', 'shp'
+        else:
+            raise UploadError("No file uploaded")
+        if ext not in ('geojson', 'kml', 'shp'):
+            raise UploadError("Invalid file type")
+
+        if ext == 'shp':
+            # parse_shapefile reads uploaded.shp/.shx/.dbf from a directory
+            parts = {'shp': file, **{e: files[e] for e in SHAPEFILE_COMPONENTS[1:] if e in files}}
+            digests = []
+            remaining = self.max_file_size
+            for e, part in parts.items():
+                digest, size = _save(part, os.path.join(workdir, f'uploaded.{e}'), remaining)
+                if digest is None:
+                    break
+                digests.append(f"{e}:{digest}")
+                remaining -= size
+            handle = hashlib.sha256(','.join(digests).encode()).hexdigest() if digest else None
+        else:
+            path = os.path.join(workdir, filename)
+            handle, _ = _save(file, path, self.max_file_size)
+        if handle is None:
+            raise UploadTooLarge(f"File too large. Max {self.max_file_size // (1024 * 1024)}MB allowed")
+
+        upload = self.cache.get(handle) or self._load(handle)
+        if upload is not None:
+            return upload
+        self.cache.expire()
+        if ext == 'shp':
+            data = executor.run('parse', parse_shapefile, workdir)
+        elif ext == 'kml':
+            data = executor.run('parse', sync_parse_kml, path)
+        else:
+            data = executor.run('parse', parse_geojson_sync, path)
+        if not isinstance(data, dict):
+            raise UploadError("File did not parse to a FeatureCollection")
+        upload = ParsedUpload(handle, filename, data)
+        if upload.nbytes() > self.cache.max_bytes:
+            # The cache would drop it at once and its handle would never resolve
+            raise UploadTooLarge(f"Parsed layer is {upload.nbytes()} bytes, more than the {self.cache.max_bytes}-byte "
+                                 f"upload cache; split the file into smaller layers")
+        self.cache.put(handle, upload)
+        self._store(upload)
+        log_info("Parsed upload", {"handle": handle, "filename": filename, "features": upload.feature_count,
+                                   "bytes": upload.nbytes()})
+        return upload
+
+    def _path(self, handle):
+        return os.path.join(self.directory, handle[:2], f'{handle}.json')
+
+    def _store(self, upload):
+        if self.directory is None:
+            return
+        path = self._path(upload.handle)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with atomic_path(path) as tmp_path, open(tmp_path, 'wb') as f:
+            f.write(b'{"filename":' + dumps(upload.filename) + b',"data":' + upload.payload + b'}')
+
+    def _load(self, handle):
+        """The layer another process (or an earlier cache entry) wrote for ``handle``; None if missing or expired."""
+        if self.directory is None or not HANDLE.match(handle or ''):
+            return None
+        path = self._path(handle)
+        try:
+            if self.ttl is not None and time.time() - os.path.getmtime(path) > self.ttl:
+                os.remove(path)
+                return None
+            with open(path, 'rb') as f:
+                stored = loads(f.read())
+        except (OSError, ValueError):
+            return None
+        upload = ParsedUpload(handle, stored["filename"], stored["data"])
+        self.cache.put(handle, upload)
+        return upload
+
+
+def _save(storage, path, max_size):
+    """
+    Write an uploaded file to ``path``, reading it once; returns (SHA-256, size).
+
+    Stops as soon as more than ``max_size`` bytes have arrived and returns
+    None for the hash.
+    """
+    hasher = hashlib.sha256()
+    size = 0
+    with open(path, 'wb') as f:
+        for block in iter(lambda: storage.stream.read(HASH_BUFFER), b''):
+            size += len(block)
+            if size > max_size:
+                return None, size
+            hasher.update(block)
+            f.write(block)
+    return hasher.hexdigest(), size
+
+
+registry = UploadRegistry()
@@ -0,0 +1,228 @@
+# utils/vector_tiles.py
+import json
+import math
+import os
+import struct
+import numpy as np
+import shapely
+from utils import feature_store
+from utils.cache import LRUCache
+
+# Tile coordinate space and the margin kept around it so that strokes and
+# labels do not end abruptly at tile edges
+EXTENT = 4096
+BUFFER = 64
+# Douglas-Peucker tolerance in tile units; EXTENT / 256 units are one screen pixel
+SIMPLIFY_TOLERANCE = 4
+MAX_ZOOM = 22
+LAYER_NAME = 'zones'
+MAX_LATITUDE = 85.0511287798
+
+# Tiles of a dataset never change, so entries are keyed by its content hash
+tile_cache = LRUCache(max_bytes=int(os.getenv('VECTOR_TILE_CACHE_MB', '64')) * 1024 * 1024, sizeof=len)
+
+# MVT geometry commands and feature types
+MOVE_TO, LINE_TO, CLOSE_PATH = 1, 2, 7
+POINT, LINESTRING, POLYGON = 1, 2, 3
+
+
+def tile_bounds(z, x, y):
+    """(west, south, east, north) of a Web Mercator tile in degrees."""
+    n = 2 ** z
+    west = x / n * 360.0 - 180.0
+    east = (x + 1) / n * 360.0 - 180.0
+    north = math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * y / n))))
+    south = math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * (y + 1) / n))))
+    return west, south, east, north
+
+def get_tile(dataset, z, x, y):
+    """
+    Encoded tile for a stored dataset (a feature_store.get_dataset dict), cached by content hash.
+
+    An empty bytes value is a valid tile with no features.
+    """
+    key = (dataset["content_hash"] or dataset["id"], z, x, y)
+    tile = tile_cache.get(key)
+    if tile is None:
+        tile = tile_cache.put(key, render_tile(dataset["id"], z, x, y))
+    return tile
+
+def render_tile(dataset_id, z, x, y, layer_name=LAYER_NAME):
+    """
+    Cut the features of a dataset into one Mapbox Vector Tile (spec v2).
+
+    Only features whose bounding box meets the buffered tile are read, through
+    the R*Tree index. Geometries are projected to tile coordinates, clipped to
+    the buffer, snapped to the integer grid (which drops features smaller than
+    a tile unit at this zoom), simplified and oriented as MVT requires.
+    """
+    west, south, east, north = tile_bounds(z, x, y)
+    margin_x = (east - west) * BUFFER / EXTENT
+    margin_y = (north - south) * BUFFER / EXTENT
+    bbox = (west - margin_x, max(south - margin_y, -90.0), east + margin_x, min(north + margin_y, 90.0))
+
+    layer = _LayerBuilder(layer_name)
+    for rows in feature_store.iter_row_batches(dataset_id, bbox=bbox):
+        geoms = shapely.from_wkb([row[1] for row in rows])
+        geoms = shapely.transform(geoms, lambda coords: _to_tile(coords, z, x, y))
+        geoms = shapely.clip_by_rect(geoms, -BUFFER, -BUFFER, EXTENT + BUFFER, EXTENT + BUFFER)
+        # Snapping first collapses dense vertices, which leaves far less to simplify;
+        # simplification only drops vertices, so the result stays on the grid
+        geoms = shapely.set_precision(geoms, 1.0)
+        geoms = shapely.orient_polygons(shapely.simplify(geoms, SIMPLIFY_TOLERANCE, preserve_topology=True))
+        for (feature_id, _, properties), geom in zip(rows, geoms):
+            if geom is None or shapely.is_empty(geom):
+                continue
+            layer.add(geom, json.loads(properties) if properties else {}, _feature_id(feature_id))
+    return layer.encode() if layer.features else b''
+
+def _to_tile(coords, z, x, y):
+    """Longitude/latitude to tile coordinates (y down) in one vectorized step."""
+    n = 2 ** z
+    lon = coords[:, 0]
+    lat = np.radians(np.clip(coords[:, 1], -MAX_LATITUDE, MAX_LATITUDE))
+    world_x = (lon + 180.0) / 360.0
+    world_y = (1.0 - np.log(np.tan(lat) + 1.0 / np.cos(lat)) / math.pi) / 2.0
+    return np.column_stack(((world_x * n - x) * EXTENT, (world_y * n - y) * EXTENT))
+
+def _feature_id(raw):
+    """MVT ids are unsigned integers; other stored ids are left out."""
+    if raw is None:
+        return None
+    value = json.loads(raw)
+    return value if isinstance(value, int) and not isinstance(value, bool) and value >= 0 else None
+
+
+class _LayerBuilder:
+    """Accumulates features of one layer, interning property keys and values."""
+
+    def __init__(self, name):
+        self.name = name
+        self.features = []
+        self.keys = {}
+        self.values = {}
+
+    def add(self, geom, properties, feature_id=None):
+        tags = []
+        for key, value in properties.items():
+            if value is None:
+                continue
+            if isinstance(value, (dict, list)):
+                value = json.dumps(value)
+            tags.append(self.keys.setdefault(key, len(self.keys)))
+            # bool is kept apart from int, where True == 1 would share a slot
+            tags.append(self.values.setdefault((type(value), value), len(self.values)))
+        for geom_type, commands in _geometry_commands(geom):
+            feature = b''
+            if feature_id is not None:
+                feature += _field_varint(1, feature_id)
+            if tags:
+                feature += _field_packed(2, tags)
+            feature += _field_varint(3, geom_type) + _field_packed(4, commands)
+            self.features.append(feature)
+
+    def encode(self):
+        layer = _field_varint(15, 2) + _field_bytes(1, self.name.encode())
+        layer += b''.join(_field_bytes(2, feature) for feature in self.features)
+        layer += b''.join(_field_bytes(3, key.encode()) for key in self.keys)
+        layer += b''.join(_field_bytes(4, _encode_value(value)) for _, value in self.values)
+        layer += _field_varint(5, EXTENT)
+        # Tile.layers is field 3
+        return _field_bytes(3, layer)
+
+
+def _geometry_commands(geom):
+    """Yield (MVT geometry type, command integers) for each encodable part of ``geom``."""
+    geom_type = shapely.get_type_id(geom)
+    if geom_type in (0, 4):  # Point, MultiPoint
+        points = shapely.get_coordinates(geom).astype(np.int64)
+        commands = [_command(MOVE_TO, len(points))]
+        cursor = np.zeros(2, dtype=np.int64)
+        for point in points:
+            commands += [_zigzag(point[0] - cursor[0]), _zigzag(point[1] - cursor[1])]
+            cursor = point
+        yield POINT, commands
+    elif geom_type in (1, 2, 5):  # LineString, LinearRing, MultiLineString
+        cursor = [0, 0]
+        commands = []
+        for line in shapely.get_parts(geom):
+            coords = _dedupe(shapely.get_coordinates(line).astype(np.int64))
+            if len(coords) >= 2:
+                commands += _path(coords, cursor, close=False)
+        if commands:
+            yield LINESTRING, commands
+    elif geom_type in (3, 6):  # Polygon, MultiPolygon
+        cursor = [0, 0]
+        commands = []
+        for polygon in shapely.get_parts(geom):
+            for ring in [polygon.exterior, *polygon.interiors]:
+                # The closing point is implied by ClosePath
+                coords = _dedupe(shapely.get_coordinates(ring).astype(np.int64))[:-1]
+                if len(coords) >= 3:
+                    commands += _path(coords, cursor, close=True)
+        if commands:
+            yield POLYGON, commands
+    elif geom_type == 7:  # GeometryCollection: one feature per part
+        for part in shapely.get_parts(geom):
+            yield from _geometry_commands(part)
+
+def _path(coords, cursor, close):
+    commands = [_command(MOVE_TO, 1), _zigzag(coords[0][0] - cursor[0]), _zigzag(coords[0][1] - cursor[1])]
+    deltas = np.diff(coords, axis=0)
+    commands.append(_command(LINE_TO, len(deltas)))
+    for dx, dy in deltas:
+        commands += [_zigzag(dx), _zigzag(dy)]
+    cursor[0], cursor[1] = coords[-1]
+    if close:
+        commands.append(_command(CLOSE_PATH, 1))
+    return commands
+
+def _dedupe(coords):
+    """Drop consecutive repeated points, which snapping to the grid produces."""
+    if len(coords) < 2:
+        return coords
+    keep = np.concatenate(([True], np.any(np.diff(coords, axis=0) != 0, axis=1)))
+    return coords[keep]
+
+def _command(command, count):
+    return (command & 0x7) | (count << 3)
+
+def _zigzag(n):
+    n = int(n)
+    return (n << 1) ^ (n >> 63)
+
+def _encode_value(value):
+    if isinstance(value, bool):
+        return _field_varint(7, int(value))
+    if isinstance(value, int) and -2 ** 63 <= value < 2 ** 63:
+        return _field_varint(6, _zigzag(value))
+    if isinstance(value, float):
+        return _field_tag(3, 1) + struct.pack('<d', value)
+    return _field_bytes(1, str(value).encode())
+
+_SMALL_VARINTS = [bytes([value]) for value in range(0x80)]
+
+def _varint(value):
+    if value < 0x80:
+        return _SMALL_VARINTS[value]
+    out = bytearray()
+    while True:
+        bits = value & 0x7F
+        value >>= 7
+        if value:
+            out.append(bits | 0x80)
+        else:
+            out.append(bits)
+            return bytes(out)
+
+def _field_tag(field, wire_type):
+    return _varint((field << 3) | wire_type)
+
+def _field_varint(field, value):
+    return _field_tag(field, 0) + _varint(value)
+
+def _field_bytes(field, data):
+    return _field_tag(field, 2) + _varint(len(data)) + data
+
+def _field_packed(field, values):
+    return _field_bytes(field, b''.join(_varint(value) for value in values))